@@ -11,15 +11,30 @@ the Free Software Foundation; either version 2 of the License, or
 (at your option) any later version.
 
 '''
-import sys
+import sys, time
+startTime = time.perf_counter()
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
 import specanalyzer
+from specanalyzer.startup import StartupProfile
 
+# --profile-startup: print the time of each startup step
 def main():
+    profile = None
+    if '--profile-startup' in sys.argv:
+        sys.argv.remove('--profile-startup')
+        profile = StartupProfile(startTime)
+        profile.mark("package and configuration")
     try:
         app = QApplication(sys.argv)
-        form = specanalyzer.mainWindow.MainWindow()
+        from specanalyzer import mainWindow
+        if profile is not None:
+            profile.mark("main window modules")
+        form = mainWindow.MainWindow()
         form.show()
+        if profile is not None:
+            profile.mark("main window")
+            QTimer.singleShot(0, profile.endStartup)
         app.exec_()
     finally:
         print("App is closing!")
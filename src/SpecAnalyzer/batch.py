@@ -0,0 +1,199 @@
+#! /usr/bin/env python3
+'''
+Spectrum Analyzer with Tracking - Batch acquisition
+-----------------------------------------------------
+Headless acquisition from a recipe file (json). PyQt5 and
+matplotlib are not needed.
+
+Usage:
+    specanalyzer-batch <recipe.json> [-f <folder>]
+    specanalyzer-batch -t > recipe.json   (template recipe)
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import os, sys, json, argparse, threading
+from .specanalyzer import config, logger
+from .specanalyzer.engine import *
+from .specanalyzer.instruments import *
+from .specanalyzer.dataIO import *
+
+# Acquisition parameters use the names of the configuration file (section Acquisition).
+# Missing parameters are taken from the configuration file.
+# instrument: sourcemeter, one of sourcemeterNames.
+# resource: VISA resource of the sourcemeter (default from configuration).
+# parallel: devices are acquired at the same time, each on its own sourcemeter
+# (the 'resource' of each device).
+recipeTemplate = {
+    'instrument' : 'Keithley 2400',
+    'resource' : None,
+    'parallel' : False,
+    'tracking' : False,
+    'acquisition' : {v : None for v in acqParamsConfig.values()},
+    'devices' : [
+        {'device' : 'device1', 'area' : 1., 'comments' : '', 'resource' : None},
+        {'device' : 'device2', 'area' : 1., 'comments' : '', 'resource' : None, 'tracking' : True},
+        ],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='SpecAnalyzer: headless batch acquisition')
+    parser.add_argument('recipe', nargs='?', help='recipe file (json)')
+    parser.add_argument('-f', '--folder', default=None,
+            help='folder for saved files (default: csvSavingFolder from configuration)')
+    parser.add_argument('-t', '--template', action='store_true',
+            help='print a template recipe and exit')
+    args = parser.parse_args()
+
+    if args.template:
+        template = dict(recipeTemplate)
+        template['acquisition'] = {v : getattr(config, v) for v in acqParamsConfig.values()}
+        print(json.dumps(template, indent=4))
+        return 0
+    if args.recipe is None:
+        parser.print_help()
+        return 1
+
+    with open(args.recipe) as f:
+        recipe = json.load(f)
+    folder = args.folder if args.folder is not None else config.csvSavingFolder
+    failed = runBatch(recipe, folder)
+    if failed > 0:
+        printMsg(str(failed)+" of "+str(len(recipe['devices']))+" devices failed")
+        return 1
+    return 0
+
+# Show message on log and terminal
+def printMsg(msg):
+    print(msg)
+    logger.info(msg)
+
+# Acquisition parameters for a device: recipe values override the configuration
+def getAcqParameters(recipe, device):
+    acqRecipe = recipe.get('acquisition', {})
+    params = {}
+    for col, key in acqParamsConfig.items():
+        value = acqRecipe.get(key)
+        params[col] = getattr(config, key) if value is None else value
+    params['Device Area'] = device.get('area', config.deviceArea)
+    params['Comments'] = device.get('comments', recipe.get('comments', ''))
+    return makeAcqParameters(params, deviceID = device['device'],
+                enableTracking = device.get('tracking', recipe.get('tracking', False)),
+                powerIn = config.irradiance1Sun)
+
+# Open and switch on a sourcemeter. Returns None if not available.
+def activateSourcemeter(instrument, resource = None):
+    printMsg("Activating sourcemeter "+getResource(instrument, config, resource)+"...")
+    try:
+        source_meter = getSourcemeter(instrument, config, resource)
+        source_meter.set_limit(voltage=20., current=1.)
+        source_meter.on()
+    except Exception as e:
+        printMsg(" Sourcemeter not activated: no acquisition possible ("+str(e)+")")
+        return None
+    printMsg(" Sourcemeter activated.")
+    return source_meter
+
+def deactivateSourcemeter(source_meter):
+    source_meter.off()
+    printMsg("Sourcemeter deactivated")
+
+# Run the same sequence of acqThread for one device.
+# Returns True if the acquisition was successful and all data was saved.
+def runDevice(source_meter, recipe, device, folder):
+    acqParams = getAcqParameters(recipe, device)
+    dfAcqParams = acqParams.toDataFrame()
+    notSaved = []
+    def save(JV, perfData, deviceID):
+        filename = saveDevice(deviceID, dfAcqParams, perfData, JV, folder, config.saveFormat)
+        if filename is None:
+            notSaved.append(deviceID)
+        return filename
+    def saveTracking(JV, perfData, deviceID, setupTable, saveData, partialFile):
+        if saveData is True and save(JV, perfData, deviceID) is not None:
+            removePartialFile(partialFile)
+    engine = AcquisitionEngine(acqParams, source_meter, onMsg = printMsg,
+            onJVComplete = save, onTracking = saveTracking, streamFolder = folder)
+    try:
+        success = engine.run()
+    except Exception as e:
+        printMsg(" Device "+device['device']+" acquisition failed: "+str(e))
+        return False
+    if notSaved:
+        printMsg(" Device "+device['device']+": data not saved ("+", ".join(notSaved)+")")
+        return False
+    return success
+
+# Sourcemeter of the recipe: name (as in sourcemeterNames) or index.
+# Returns its index, None if not valid.
+def getInstrument(recipe):
+    instrument = recipe.get('instrument', sourcemeterNames[1])
+    if instrument in sourcemeterNames:
+        return sourcemeterNames.index(instrument)
+    if isinstance(instrument, int) and not isinstance(instrument, bool) and \
+            0 <= instrument < len(sourcemeterNames):
+        return instrument
+    printMsg(" Unknown instrument: "+str(instrument)+". Valid instruments: "+ \
+            ", ".join(sourcemeterNames))
+    return None
+
+# Run the acquisition for all devices in recipe.
+# Returns the number of failed devices.
+def runBatch(recipe, folder):
+    try:
+        os.makedirs(folder, exist_ok = True)
+    except OSError as e:
+        printMsg(" Folder for saved files not available: "+folder+" ("+str(e)+")")
+        return len(recipe['devices'])
+    instrument = getInstrument(recipe)
+    if instrument is None:
+        return len(recipe['devices'])
+    if recipe.get('parallel', False):
+        return runParallel(instrument, recipe, folder)
+
+    source_meter = activateSourcemeter(instrument, recipe.get('resource'))
+    if source_meter is None:
+        return len(recipe['devices'])
+    failed = 0
+    try:
+        for device in recipe['devices']:
+            if not runDevice(source_meter, recipe, device, folder):
+                failed += 1
+    finally:
+        deactivateSourcemeter(source_meter)
+    return failed
+
+# Acquire all devices at the same time. Each device has its own sourcemeter
+# (VISA 'resource') driven by a separate thread, so that hold times on one
+# instrument overlap with readback on the others.
+def runParallel(instrument, recipe, folder):
+    devices = recipe['devices']
+    resources = [getResource(instrument, config, d.get('resource')) for d in devices]
+    if len(set(resources)) < len(resources):
+        printMsg(" Each device needs its own sourcemeter resource")
+        return len(devices)
+
+    results = [False]*len(devices)
+    def acquireDevice(i):
+        source_meter = activateSourcemeter(instrument, resources[i])
+        if source_meter is None:
+            return
+        try:
+            results[i] = runDevice(source_meter, recipe, devices[i], folder)
+        finally:
+            deactivateSourcemeter(source_meter)
+
+    threads = [threading.Thread(target=acquireDevice, args=(i,)) for i in range(len(devices))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results.count(False)
+
+if __name__ == "__main__":
+    sys.exit(main())
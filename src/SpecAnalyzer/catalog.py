@@ -0,0 +1,58 @@
+#! /usr/bin/env python3
+'''
+Spectrum Analyzer with Tracking - Catalog of saved data
+-----------------------------------------------------
+Search saved device data and index data folders into the
+catalog. PyQt5 and matplotlib are not needed.
+
+Usage:
+    specanalyzer-catalog [cell*] [pce>15] [since:2026-09-01] [until:...] [tracking|jv]
+    specanalyzer-catalog -r [<folder or file> ...]   (index, default: csvSavingFolder)
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import sys, os, argparse
+from .specanalyzer import config, logger
+from .specanalyzer.catalog import *
+
+def main():
+    parser = argparse.ArgumentParser(description='SpecAnalyzer: catalog of saved data')
+    parser.add_argument('query', nargs='*',
+            help='search terms: device ID (* as wildcard), pce>x, pce<x, since:date, until:date, tracking, jv')
+    parser.add_argument('-r', '--rebuild', nargs='*', metavar='folder', default=None,
+            help='index new and modified files in folders (default: csvSavingFolder)')
+    parser.add_argument('-n', '--limit', type=int, default=None,
+            help='maximum number of results')
+    args = parser.parse_args()
+
+    catalog = getCatalog()
+    if args.rebuild is not None:
+        for folder in args.rebuild or [config.csvSavingFolder]:
+            msg = "Indexing "+folder+"..."
+            print(msg)
+            logger.info(msg)
+            if os.path.isfile(folder):
+                catalog.addFile(folder)
+                indexed, unchanged, removed = 1, 0, 0
+            else:
+                indexed, unchanged, removed = catalog.indexFolder(folder)
+            msg = " Files indexed: {0:d}, unchanged: {1:d}, removed: {2:d}".format(indexed, unchanged, removed)
+            print(msg)
+            logger.info(msg)
+        print("Catalog: "+str(len(catalog))+" measurements")
+        return 0
+
+    for row in catalog.query(limit = args.limit, **parseQuery(" ".join(args.query))):
+        print("{0:s}  {1:30s} PCE: {2:7.3f}  Voc: {3:6.3f}  FF: {4:5.3f}  Tracking: {5:6.1f} s  {6:s}".format(
+                str(row['acqTime']), row['device'], row['PCE'], row['Voc'], row['FF'],
+                row['trackingTime'], row['path']))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
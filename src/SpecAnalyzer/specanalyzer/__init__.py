@@ -28,7 +28,7 @@ logging.basicConfig(filename=config.loggingFilename, level=int(config.loggingLev
 logger = logging.getLogger()
 
 from . import configuration
-from . import mainWindow
-
+# mainWindow (PyQt5, matplotlib) is imported by the GUI entry point only,
+# so that the acquisition engine can be used headless
 
 
@@ -12,62 +12,108 @@ the Free Software Foundation; either version 2 of the License, or
 
 '''
 import numpy as np
-import pandas as pd
 import time, random, math
 from datetime import datetime
-from PyQt5.QtWidgets import (QApplication,QAbstractItemView)
+from PyQt5.QtWidgets import (QApplication,QAbstractItemView,QFileDialog)
 from PyQt5.QtCore import (Qt,QObject, QThread, pyqtSlot, pyqtSignal)
 from .acquisitionWindow import *
-from .modules.sourcemeter.keithley2400 import *
-from .modules.sourcemeter.agilent4155c import *
+from .instruments import *
+# engine and dataIO (pandas) are imported at first use, not at startup
 
 class Acquisition(QObject):
     def __init__(self, parent=None):
         super(Acquisition, self).__init__(parent)
     
-    # Collect acquisition parameters into a DataFrame to be used for storing (as csv or json)
+    # Collect acquisition parameters from the widgets into AcqParameters
     def getAcqParameters(self):
-        pdframe = pd.DataFrame({
-                'Acq Min Voltage': [self.parent().acquisitionwind.minVText.text()],
-                'Acq Max Voltage': [self.parent().acquisitionwind.maxVText.text()],
-                'Acq Start Voltage': [self.parent().acquisitionwind.startVText.text()],
-                'Acq Step Voltage': [self.parent().acquisitionwind.stepVText.text()],
-                'Acq Gate Voltage': [self.parent().acquisitionwind.gateVText.text()],
-                'Acq Hold Time': [self.parent().acquisitionwind.holdTText.text()],
-                'Acq Num Aver Scans': [int(self.parent().acquisitionwind.numAverScansText.text())],
-                'Delay Before Meas': [self.parent().acquisitionwind.delayBeforeMeasText.text()],
-                'Num Track Points': [int(self.parent().acquisitionwind.numPointsText.value())],
-                'PV mode': [bool(self.parent().acquisitionwind.pvModeBox.isChecked())],
-                'Track Interval': [self.parent().acquisitionwind.IntervalText.text()],
-                'Device Area': [self.parent().deviceAreaText.text()],
-                'Comments': [self.parent().commentsText.text()]})
-        return pdframe[['Acq Min Voltage','Acq Max Voltage','Acq Start Voltage',
-                'Acq Step Voltage','Acq Gate Voltage','Acq Hold Time', 'Acq Num Aver Scans',
-                'Delay Before Meas','Num Track Points','PV mode', 'Track Interval',
-                'Device Area', 'Comments']]
-                
+        from .engine import makeAcqParameters
+        return makeAcqParameters({
+                'Acq Min Voltage': self.parent().acquisitionwind.minVText.text(),
+                'Acq Max Voltage': self.parent().acquisitionwind.maxVText.text(),
+                'Acq Start Voltage': self.parent().acquisitionwind.startVText.text(),
+                'Acq Step Voltage': self.parent().acquisitionwind.stepVText.text(),
+                'Acq Gate Voltage': self.parent().acquisitionwind.gateVText.text(),
+                'Acq Hold Time': self.parent().acquisitionwind.holdTText.text(),
+                'Acq Num Aver Scans': int(self.parent().acquisitionwind.numAverScansText.text()),
+                'Delay Before Meas': self.parent().acquisitionwind.delayBeforeMeasText.text(),
+                'Num Track Points': int(self.parent().acquisitionwind.numPointsText.value()),
+                'PV mode': bool(self.parent().acquisitionwind.pvModeBox.isChecked()),
+                'Voc Jsc from JV': bool(self.parent().acquisitionwind.vocJscFromJVBox.isChecked()),
+                'Track Interval': self.parent().acquisitionwind.IntervalText.text(),
+                'Track MPPT': self.parent().acquisitionwind.mpptCBox.currentText(),
+                'Track MPPT Step': self.parent().acquisitionwind.mpptStepText.text(),
+                'Track Voc Jsc Every': self.parent().acquisitionwind.vocJscEveryText.value(),
+                'Device Area': self.parent().deviceAreaText.text(),
+                'Comments': self.parent().commentsText.text()},
+                deviceID = self.parent().deviceText.text(),
+                enableTracking = self.parent().acquisitionwind.enableTrackingBox.isChecked(),
+                powerIn = self.parent().config.irradiance1Sun)
+
     def start(self):
         # Using ALT with Start Acquisition button:
         # 1. overrides the config settings.
         # 2. Data is saved locally
         self.modifiers = QApplication.keyboardModifiers()
-        self.dfAcqParams = self.getAcqParameters()
         if self.parent().deviceText.text()=="":
             print("Please add device name")
             return
+        self.startThreads([self.getAcqParameters()], [None])
+
+    # Multi-device acquisition: devices from a csv list (Device, Area, Resource)
+    # are measured at the same time, one thread per sourcemeter.
+    def startMulti(self):
+        filename = QFileDialog.getOpenFileName(self.parent(),
+                        "Open list of devices", "","*.csv")[0]
+        if filename == "":
+            return
+        self.modifiers = QApplication.keyboardModifiers()
+        from .dataIO import readDeviceList
+        try:
+            devices = readDeviceList(filename, self.parent().deviceAreaText.text())
+        except:
+            self.printMsg(" Loading list of devices failed")
+            return
+        index = self.parent().sourcemeterwind.instrumentCBox.currentIndex()
+        resources = [getResource(index, self.parent().config, d['resource']) for d in devices]
+        if len(devices) == 0 or len(set(resources)) < len(resources):
+            self.printMsg(" Each device needs its own sourcemeter resource")
+            return
+        acqParams = self.getAcqParameters()
+        self.startThreads([acqParams._replace(deviceID = d['device'], deviceArea = d['area']) \
+                for d in devices], resources)
+
+    # Start one acquisition thread for each set of parameters.
+    # resources: VISA resource of the sourcemeter for each thread (None: from configuration)
+    def startThreads(self, acqParamsList, resources):
         self.parent().acquisitionwind.enableAcqPanel(False)
         self.parent().enableButtonsAcq(False)
         self.parent().resultswind.show()
         self.parent().resultswind.clearPlots(False,False)
-        
-        self.acq_thread = acqThread(self.dfAcqParams, self)
-        self.acq_thread.Msg.connect(self.printMsg)
-        self.acq_thread.acqJVComplete.connect(lambda JV,perfData,deviceID: \
-                self.JVDeviceProcess(JV,perfData,deviceID))
-        self.acq_thread.tempTracking.connect(lambda JV,perfData,deviceID,setupTable,saveData: \
-                self.plotTempTracking(JV,perfData,deviceID,setupTable,saveData))
-        self.acq_thread.maxPowerDev.connect(self.printMsg)
-        self.acq_thread.start()
+
+        # Tracking data is streamed to disk only when data is saved
+        if self.parent().config.saveLocalCsv == True or self.modifiers == Qt.AltModifier:
+            streamFolder = self.parent().resultswind.csvFolder
+        else:
+            streamFolder = None
+
+        self.acq_threads = []
+        self.activeThreads = set()
+        for acqParams, resource in zip(acqParamsList, resources):
+            dfAcqParams = acqParams.toDataFrame()
+            acq_thread = acqThread(acqParams,
+                    self.parent().sourcemeterwind.instrumentCBox.currentIndex(),
+                    self.parent().config, resource, streamFolder, self)
+            acq_thread.Msg.connect(self.printMsg)
+            acq_thread.acqJVComplete.connect(lambda JV,perfData,deviceID,df=dfAcqParams: \
+                    self.JVDeviceProcess(JV,perfData,deviceID,df))
+            acq_thread.tempTracking.connect(lambda JV,perfData,deviceID,setupTable,saveData,partialFile,df=dfAcqParams: \
+                    self.plotTempTracking(JV,perfData,deviceID,setupTable,saveData,partialFile,df))
+            acq_thread.maxPowerDev.connect(self.printMsg)
+            acq_thread.acqEnded.connect(self.endAcq)
+            self.acq_threads.append(acq_thread)
+            self.activeThreads.add(acq_thread)
+        for acq_thread in self.acq_threads:
+            acq_thread.start()
 
     # Action for stop button
     def stop(self):
@@ -77,12 +123,29 @@ class Acquisition(QObject):
                      quit_msg, QMessageBox.No, QMessageBox.Yes)
 
         if reply == QMessageBox.Yes:
-            msg = "Acquisition stopped: " + self.acq_thread.getDateTimeNow()[0]+ \
-                  " at "+self.acq_thread.getDateTimeNow()[1]
-            self.acq_thread.stop()
+            from .engine import getDateTimeNow
+            msg = "Acquisition stopped: " + getDateTimeNow()[0]+ \
+                  " at "+getDateTimeNow()[1]
+            self.stopThreads()
             self.printMsg(msg)
         else:
             pass
+
+    # Stop all acquisition threads (wait: until they are finished)
+    def stopThreads(self, wait=False):
+        for acq_thread in getattr(self, 'acq_threads', []):
+            acq_thread.stop()
+        if wait:
+            for acq_thread in getattr(self, 'acq_threads', []):
+                acq_thread.wait()
+
+    # Re-enable panels and buttons once all acquisition threads are done
+    def endAcq(self):
+        self.activeThreads.discard(self.sender())
+        if len(self.activeThreads) == 0:
+            self.parent().acquisitionwind.enableAcqPanel(True)
+            self.parent().enableButtonsAcq(True)
+
     # Show message on log and terminal
     def printMsg(self, msg):
         print(msg)
@@ -90,382 +153,108 @@ class Acquisition(QObject):
         self.parent().statusBarLabel.setText(msg)
 
     # Process JV Acquisition to result page
-    def JVDeviceProcess(self, JV, perfData, deviceID):
+    def JVDeviceProcess(self, JV, perfData, deviceID, dfAcqParams):
         self.parent().resultswind.setupResultTable()
-        self.parent().resultswind.processDeviceData(deviceID, self.dfAcqParams, perfData, JV, True)
-        QApplication.processEvents()
-        time.sleep(1)
-            
-    # Plot temporary data from tracking
-    def plotTempTracking(self, JV, perfData, deviceID, setupTable, saveData):
-        if setupTable is True:
-            self.parent().resultswind.setupResultTable()
-        self.parent().resultswind.processDeviceData(deviceID, self.dfAcqParams, perfData, JV, saveData)
-        QApplication.processEvents()
+        self.parent().resultswind.processDeviceData(deviceID, dfAcqParams, perfData, JV, True)
+
+    # Plot temporary data from tracking.
+    # Each tracked device keeps its own row in the result table.
+    # JV is plotted only once per row, as it does not change during tracking.
+    # partialFile (final data only) is removed once the data is saved.
+    def plotTempTracking(self, JV, perfData, deviceID, setupTable, saveData, partialFile, dfAcqParams):
+        newRow = deviceID not in self.parent().resultswind.deviceRows
+        self.parent().resultswind.selectResultRow(deviceID)
+        self.parent().resultswind.processDeviceData(deviceID, dfAcqParams, perfData, JV,
+                saveData, plotJV = newRow, partialFile = partialFile)
         if saveData is True:
-            time.sleep(1)
+            self.parent().resultswind.releaseResultRow(deviceID)
 
 # Main Class for Acquisition
-# Everything happens here!
+# Everything happens here! The thread does not access widgets:
+# parameters are passed at creation, results are emitted as signals.
 class acqThread(QThread):
 
     acqJVComplete = pyqtSignal(np.ndarray, np.ndarray, str)
-    tempTracking = pyqtSignal(np.ndarray, np.ndarray, str, bool, bool)
+    tempTracking = pyqtSignal(np.ndarray, np.ndarray, str, bool, bool, object)
     maxPowerDev = pyqtSignal(str)
     Msg = pyqtSignal(str)
+    acqEnded = pyqtSignal()
 
-    def __init__(self, dfAcqParams, parent=None):
+    def __init__(self, acqParams, sourcemeterIndex, config, resource=None, streamFolder=None, parent=None):
         super(acqThread, self).__init__(parent)
-        self.dfAcqParams = dfAcqParams
-        self.powerIn = float(self.parent().parent().config.conf['Instruments']['irradiance1Sun'])
+        from .engine import CancelToken
+        self.streamFolder = streamFolder
+        self.acqParams = acqParams
+        self.sourcemeterIndex = sourcemeterIndex
+        self.config = config
+        self.resource = resource
+        self.cancelToken = CancelToken()
+        self.lease = None
 
     def __del__(self):
         self.wait()
 
+    # Request a stop: the engine stops at the next point or wait, aborts
+    # the measurement and switches the output off. The thread then ends
+    # normally (acqEnded).
     def stop(self):
-        self.terminate()
-        self.endAcq()
+        self.cancelToken.cancel()
     
     def run(self):
 
         # Activate sourcemeter
-        self.Msg.emit("Activating sourcemeter...")
+        self.Msg.emit("Activating sourcemeter for device "+self.acqParams.deviceID+"...")
         try:
-            if self.parent().parent().sourcemeterwind.instrumentCBox.currentIndex() == 0:
-                self.parent().source_meter = Agilent4155c(self.parent().parent().config.agilent4155cID)
-            else:
-                self.parent().source_meter = Keithley2400(self.parent().parent().config.keithley2400ID)
-            self.parent().source_meter.set_limit(voltage=20., current=1.)
-            self.parent().source_meter.on()
+            self.lease = instrumentManager.leaseSourcemeter(self.sourcemeterIndex,
+                    self.config, self.resource, timeout = 5)
+        except InstrumentBusy:
+            self.Msg.emit(" Sourcemeter in use (sourcemeter panel?): no acquisition possible")
+            self.endAcq()
+            return
         except:
             self.Msg.emit(" Sourcemeter not activated: no acquisition possible")
-            self.stop()
+            self.endAcq()
+            return
+        self.source_meter = self.lease.instrument
+        try:
+            self.source_meter.set_limit(voltage=20., current=1.)
+            self.source_meter.on()
+        except:
+            self.lease.invalidate()
+            self.Msg.emit(" Sourcemeter not activated: no acquisition possible")
+            self.endAcq()
             return
         self.Msg.emit(" Sourcemeter activated.")
 
-        ### Setup interface and get parameters before acquisition
-        self.Msg.emit("Acquisition started: "+self.getDateTimeNow()[0]+" at " + \
-                self.getDateTimeNow()[1])
-        
         # If all is OK, start acquiring
-                
-        # Check if the holder has a substrate in that slot
-        if self.parent().parent().deviceText.text() != "":
-            self.max_power = []
-            #self.devMaxPower = 0
-            deviceID = self.parent().parent().deviceText.text()
-            # prepare parameters, plots, tables for acquisition
-            self.Msg.emit("  Acquiring JV from device: " + deviceID)
-
-            # Acquire forward and backward sweeps
-            sweepF, sweepB = self.measure_sweep()
-            # Acquire JV for performance parameters
-            JVOKflag, JVF, JVB, perfDataF, perfDataB = self. measure_voc_jsc_mpp()
-            if JVOKflag:
-                self.acqJVComplete.emit(JVF, perfDataF, deviceID+"_JV-forward")
-                self.acqJVComplete.emit(JVB, perfDataB, deviceID+"_JV-backward")
-
-                #Right now the voc, jsc and mpp are extracted from the JV in JVDeviceProcess
-                #self.acqJVComplete.emit(JVF, perfData, deviceID)
-
-                #self.max_power.append(np.max(JVF[:, 0] * JVF[:, 1]))
-                self.Msg.emit('  Device '+deviceID+' acquisition: complete')
-
-                if self.parent().parent().acquisitionwind.enableTrackingBox.isChecked() == True:
-                    # Tracking
-                    time.sleep(1)
-
-                    # Use this to get the simple JV used for detecting Vpmax
-                    perfData, JV = self.tracking(deviceID, JVF, perfDataF)
-                    # Alternatively use this for a complete JV sweep
-                    #JV = self.devAcqJV()
-
-                    self.Msg.emit(' Device '+deviceID+' tracking: complete')
-
-                self.Msg.emit("Acquisition Completed: "+ self.getDateTimeNow()[0] + \
-                    " at "+self.getDateTimeNow()[1])
+        from .engine import AcquisitionEngine
+        self.engine = AcquisitionEngine(self.acqParams, self.source_meter,
+                onMsg = self.Msg.emit,
+                onJVComplete = self.acqJVComplete.emit,
+                onTracking = self.tempTracking.emit,
+                streamFolder = self.streamFolder,
+                cancelToken = self.cancelToken)
+        try:
+            self.engine.run()
+        except Exception as e:
+            self.lease.invalidate()
+            self.Msg.emit(" Acquisition failed ("+self.acqParams.deviceID+"): "+str(e))
+        finally:
             self.endAcq()
 
     def endAcq(self):
-        self.parent().parent().acquisitionwind.enableAcqPanel(True)
-        self.parent().parent().enableButtonsAcq(True)
-
-        # park the stage close to origin, deactivate.
+        # deactivate sourcemeter, which stays connected for the next acquisition
         try:
-            self.parent().source_meter.off()
-            del self.parent().source_meter
-            self.Msg.emit("Sourcemeter deactivated")
+            self.source_meter.off()
+            del self.source_meter
+            self.Msg.emit("Sourcemeter deactivated ("+self.acqParams.deviceID+")")
         except:
-            pass     
+            if self.lease is not None:
+                self.lease.invalidate()
+        if self.lease is not None:
+            self.lease.release()
+            self.lease = None
         
-        # Re-enable panels and buttons
-        self.parent().parent().acquisitionwind.enableAcqPanel(True)
-        self.parent().parent().enableButtonsAcq(True)
-        QApplication.processEvents()
+        # Panels and buttons are re-enabled by the receiver (GUI thread)
         self.Msg.emit("System: ready")
-
-    ## measurements: JV
-    # dfAcqParams : self.dfAcqParams
-    def measure_sweep(self):
-        deviceID = self.parent().parent().deviceText.text()
-        #perfData = np.zeros((0,8))
-        
-        #self.source_meter.set_mode('VOLT')
-        self.parent().source_meter.set_mode('VOLT')
-        self.parent().source_meter.on()
-
-        # measurement parameters
-        v_min = float(self.dfAcqParams.at[0,'Acq Min Voltage'])
-        v_max = float(self.dfAcqParams.at[0,'Acq Max Voltage'])
-        v_start = float(self.dfAcqParams.at[0,'Acq Start Voltage'])
-        v_step = float(self.dfAcqParams.at[0,'Acq Step Voltage'])
-        v_gate = float(self.dfAcqParams.at[0,'Acq Gate Voltage'])
-        scans = int(self.dfAcqParams.at[0,'Acq Num Aver Scans'])
-        hold_time = float(self.dfAcqParams.at[0,'Acq Hold Time'])
-        delay_before_meas = float(self.dfAcqParams.at[0,'Delay Before Meas'])
-        pvMode = bool(self.dfAcqParams.at[0,'PV mode'])
-        deviceArea = float(self.dfAcqParams.at[0,'Device Area'])
-        time.sleep(delay_before_meas)
-        
-        # enforce
-        if v_start < v_min and v_start > v_max and v_min > v_max:
-            raise ValueError('Voltage Errors')
-
-        # create list of voltage to measure
-        v_list_full = np.arange(v_min-2., v_max + 2., v_step)
-        v_list = v_list_full[np.logical_and(v_min-1e-9 <= v_list_full, v_list_full <= v_max+1e-9)]
-        start_i = np.argmin(abs(v_start - v_list))
-
-        N = len(v_list)
-        #backward sweep
-        i_list_back = list(range(0, N))[::-1]
-        #forward sweep 1
-        i_list_forw1 = list(range(start_i, N))
-        #forward sweep 2
-        i_list_forw2 = list(range(0, start_i))
-
-        # create data array
-        data = np.zeros((N, 3))
-        data[:, 0] = v_list
-        
-        if self.parent().parent().sourcemeterwind.instrumentCBox.currentIndex() == 0:
-            self.Msg.emit('  Device '+deviceID+': acquiring forward sweep')
-            self.parent().source_meter.set_mode('VOLT')
-            self.parent().source_meter.sweep(v_start, v_max, v_step, v_gate, hold_time)
-            data[i_list_forw1, 1] = self.parent().source_meter.read_sweep_values(deviceArea, pvMode)[1]
-
-            self.Msg.emit('  Device '+deviceID+': acquiring backward sweep')
-            self.parent().source_meter.sweep(v_max, v_min, - v_step, v_gate, hold_time)
-            data[:, 2] = np.flipud(self.parent().source_meter.read_sweep_values(deviceArea, pvMode)[1])
-            perfDataB = self.analyseJV(data[:, (0,2)])
-            self.acqJVComplete.emit(data[:, (0,2)], perfDataB, deviceID+"_sweep-back")
-
-            self.Msg.emit('  Device '+deviceID+': completing forward sweep')
-            self.parent().source_meter.sweep(v_min, v_start-v_step, v_step, v_gate, hold_time)
-            try:
-                data[i_list_forw2, 1] = self.parent().source_meter.read_sweep_values(deviceArea, pvMode)[1]
-            except:
-                pass
-            perfDataF = self.analyseJV(data[:, (0,1)])
-            self.acqJVComplete.emit(data[:, (0,1)], perfDataF, deviceID+"_sweep-forw")
-
-        else:
-            self.Msg.emit('  Device '+deviceID+': acquiring forward sweep')
-            for i in i_list_forw1:
-                self.parent().source_meter.set_output(voltage = v_list[i])
-                time.sleep(hold_time)
-                data[i,1] = self.parent().source_meter.read_values(deviceArea, pvMode)[1]
-
-            self.Msg.emit('  Device '+deviceID+': acquiring backward sweep')
-            for i in i_list_back:
-                self.parent().source_meter.set_output(voltage = v_list[i])
-                time.sleep(hold_time)
-                data[i,2] = self.parent().source_meter.read_values(deviceArea, pvMode)[1]
-
-            perfDataB = self.analyseJV(data[:, (0,2)])
-            self.acqJVComplete.emit(data[:, (0,2)], perfDataB, deviceID+"_sweep-back")
-
-            self.Msg.emit('  Device '+deviceID+': completing forward sweep') 
-            for i in i_list_forw2:
-                self.parent().source_meter.set_output(voltage = v_list[i])
-                time.sleep(hold_time)
-                data[i,1] = self.parent().source_meter.read_values(deviceArea, pvMode)[1]
-
-            perfDataF = self.analyseJV(data[:, (0,1)])
-            self.acqJVComplete.emit(data[:, (0,1)], perfDataF, deviceID+"_sweep-forw")
-            print(data)
-        return data[:, 0:2], data[:,(0,2)]
-
-    ## measurements: voc, jsc
-    def measure_voc_jsc(self):
-        pvMode = bool(self.dfAcqParams.at[0,'PV mode'])
-        deviceArea = float(self.dfAcqParams.at[0,'Device Area'])
-
-        # voc
-        self.parent().source_meter.set_mode('CURR')
-        self.parent().source_meter.on()
-        self.parent().source_meter.set_output(current = 0.)
-        voc = self.parent().source_meter.read_values(deviceArea, pvMode)[0]
-        # jsc
-        self.parent().source_meter.set_mode('VOLT')
-        self.parent().source_meter.on()
-        self.parent().source_meter.set_output(voltage = 0.)
-        jsc = self.parent().source_meter.read_values(deviceArea, pvMode)[1]
-        return voc, jsc
-    
-    ## measurements: voc, jsc
-    def calculate_voc_jsc(self, JV):
-        jsc = interp1d(JV[:,0],JV[:,1])(0)
-        voc = interp1d(JV[:,1],JV[:,0])(0)
-        return voc, jsc
-
-    ## measurements: voc, jsc, mpp
-    def measure_voc_jsc_mpp(self):
-        deviceID = self.parent().parent().deviceText.text()
-        #perfData = np.zeros((0,8))
-
-        # measurement parameters
-        v_min = float(self.dfAcqParams.at[0,'Acq Min Voltage'])
-        v_max = float(self.dfAcqParams.at[0,'Acq Max Voltage'])
-        v_start = float(self.dfAcqParams.at[0,'Acq Start Voltage'])
-        v_step = float(self.dfAcqParams.at[0,'Acq Step Voltage'])
-        v_gate = float(self.dfAcqParams.at[0,'Acq Gate Voltage'])
-        scans = int(self.dfAcqParams.at[0,'Acq Num Aver Scans'])
-        hold_time = float(self.dfAcqParams.at[0,'Acq Hold Time'])
-        delay_before_meas = float(self.dfAcqParams.at[0,'Delay Before Meas'])
-        pvMode = bool(self.dfAcqParams.at[0,'PV mode'])
-        deviceArea = float(self.dfAcqParams.at[0,'Device Area'])
-        time.sleep(delay_before_meas)
-
-        # measurements: voc, jsc
-        voc, jsc = self.measure_voc_jsc()
-
-        # measurement parameters
-        v_min = 0.
-        v_max = voc
-        #v_max = 2 #for testing only
-
-        if v_max - v_min < v_step:
-            self.Msg.emit('  Voc appears to be close to V=0. Aborting') 
-            return False, None, None, None, None
-        
-        # measure
-        v_list = np.arange(v_min, v_max+1e-9, v_step)
-        
-        JV = np.zeros((len(v_list),3))
-        JV[:, 0] = v_list
-        JVtemp = np.zeros((len(v_list),3))
-        JVtemp[:, 0] = v_list
-        
-        self.Msg.emit('  Device '+deviceID+': acquiring JV forward for analsys')
-        
-        if self.parent().parent().sourcemeterwind.instrumentCBox.currentIndex() == 0:
-            for n in range(scans):
-                self.Msg.emit('  Device '+deviceID+': acquiring forward sweep')
-                self.parent().source_meter.set_mode('VOLT')
-                self.parent().source_meter.sweep(v_min, v_max, v_step, v_gate, hold_time)
-                JVtemp[:, 1] = self.parent().source_meter.read_sweep_values(deviceArea, pvMode)[1]
-
-                self.Msg.emit('  Device '+deviceID+': acquiring backward sweep')
-                self.parent().source_meter.sweep(v_max, v_min, - v_step, v_gate, hold_time)
-                JVtemp[:, 2] = np.flipud(self.parent().source_meter.read_sweep_values(deviceArea, pvMode)[1])
-            
-            JV[:,1] = (JVtemp[:,1] + JV[:,1]*n)/(n+1)
-            JV[:,2] = (JVtemp[:,2] + JV[:,2]*n)/(n+1)
-
-        else:
-            i_list_forw = list(range(0, len(v_list)))
-            i_list_back = i_list_forw[::-1]
-            for n in range(scans):
-                self.Msg.emit('  Device '+deviceID+': acquiring JV forward for analsys, scan: '+str(n)+'/'+str(scans))
-                for i in i_list_forw:
-                    self.parent().source_meter.set_output(voltage = v_list[i])
-                    time.sleep(hold_time)
-                    JVtemp[i,1]= self.parent().source_meter.read_values(deviceArea, pvMode)[1]
-
-                self.Msg.emit('  Device '+deviceID+': acquiring JV backward for analsys, scan: '+str(n)+'/'+str(scans))
-                for i in i_list_back:
-                    self.parent().source_meter.set_output(voltage = v_list[i])
-                    time.sleep(hold_time)
-                    JVtemp[i,2]= self.parent().source_meter.read_values(deviceArea, pvMode)[1]
-
-            JV[:,1] = (JVtemp[:,1] + JV[:,1]*n)/(n+1)
-            JV[:,2] = (JVtemp[:,2] + JV[:,2]*n)/(n+1)
-
-        perfDataF = self.analyseJV(JV[:, (0,1)])
-        perfDataB = self.analyseJV(JV[:, (0,2)])
-        
-        return True, JV[:, 0:2], JV[:,(0,2)], perfDataF, perfDataB
-
-    # Tracking (take JV once and track Vpmax)
-    def tracking(self, deviceID, JV, perfData):
-        hold_time = float(self.dfAcqParams.at[0,'Acq Hold Time'])
-        delay_before_meas = float(self.dfAcqParams.at[0,'Delay Before Meas'])
-        numPoints = int(self.dfAcqParams.at[0,'Num Track Points'])
-        trackTime = float(self.dfAcqParams.at[0,'Track Interval'])
-        pvMode = bool(self.dfAcqParams.at[0,'PV mode'])
-        deviceArea = float(self.dfAcqParams.at[0,'Device Area'])
-        time.sleep(delay_before_meas)
-
-        startTime = time.time()
-
-        self.Msg.emit("Tracking device: "+deviceID+" (time-step: 0)")
-
-        Vpmax = float(perfData[0][5])
-        #self.tempTracking.emit(JV, perfData, deviceID, True, False)
-        for n in range(1, numPoints):
-            time.sleep(trackTime)
-            timeStep = time.time()-startTime
-            self.Msg.emit("Tracking device: "+deviceID+" (time-step: "+str(n)+"/"+\
-                          str(numPoints)+" - {0:0.1f}s)".format(timeStep))
-            voc, jsc = self.measure_voc_jsc()
-            
-            self.parent().source_meter.set_output(voltage = Vpmax)
-            time.sleep(hold_time)
-            Jpmax = self.parent().source_meter.read_values(deviceArea, pvMode)[1]
-            try:
-                FF = Vpmax*Jpmax*100/(voc*jsc)
-                effic = Vpmax*Jpmax/self.powerIn
-            except:
-                FF = 0.
-                effic = 0.
-            data = np.array([voc, jsc, Vpmax, Vpmax*Jpmax,FF,effic])
-            data = np.hstack(([self.getDateTimeNow()[0],
-                                   self.getDateTimeNow()[1],timeStep], data))
-            perfData = np.vstack((data, perfData))
-            self.tempTracking.emit(JV, perfData, deviceID+"_tracking", False, False)
-        self.tempTracking.emit(JV, perfData, deviceID+"_tracking", True, True)
-        return perfData, JV
-
-    # Extract parameters from JV
-    def analyseJV(self, JV):
-        PV = np.zeros(JV.shape)
-        PV[:,0] = JV[:,0]
-        PV[:,1] = JV[:,0]*JV[:,1]
-        # measurements: voc, jsc
-        Voc, Jsc = self.measure_voc_jsc()
-        #Voc, Jsc = self.calculate_voc_jsc()
-
-        #Vpmax = PV[np.where(PV == np.amax(PV[:,1]))[0][0],0]
-        #Jpmax = JV[np.where(PV == np.amax(PV[:,1]))[0][0],1]
-        ind_Pmax = np.argmin(PV[:,1])
-        Jpmax = JV[ind_Pmax,1]
-        Vpmax = JV[ind_Pmax,0]
-
-        if Voc != 0. and Jsc != 0.:
-            FF = Vpmax*Jpmax/(Voc*Jsc)
-            effic = abs(100*Vpmax*Jpmax/self.powerIn)
-        else:
-            FF = 0.
-            effic = 0.
-        #print(Vpmax,Jpmax,Voc,Jsc,FF,effic,powerIn)
-        data = np.array([Voc, Jsc, Vpmax, Vpmax*Jpmax,FF,effic])
-        data = np.hstack((0., data))
-        data = np.hstack((self.getDateTimeNow()[1], data))
-        data = np.hstack((self.getDateTimeNow()[0], data))
-        return np.array([data])
-
-    # Get date/time
-    def getDateTimeNow(self):
-        return str(datetime.now().strftime('%Y-%m-%d')),\
-                    str(datetime.now().strftime('%H-%M-%S'))
+        self.acqEnded.emit()
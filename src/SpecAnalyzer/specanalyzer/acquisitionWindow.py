@@ -18,11 +18,12 @@ from datetime import datetime
 import numpy as np
 from PyQt5.QtWidgets import (QMainWindow, QApplication, QPushButton, QWidget, QAction,
     QVBoxLayout,QGridLayout,QLabel,QGraphicsView,QFileDialog,QStatusBar,QSpinBox,
-    QGraphicsScene,QLineEdit,QMessageBox,QDialog,QDialogButtonBox,QMenuBar,QCheckBox)
+    QGraphicsScene,QLineEdit,QMessageBox,QDialog,QDialogButtonBox,QMenuBar,QCheckBox,QComboBox)
 from PyQt5.QtGui import (QIcon,QImage,QKeySequence,QPixmap,QPainter,QDoubleValidator)
 from PyQt5.QtCore import (pyqtSlot,QRectF,QRect)
 
 from . import logger
+from .mppt import mpptNames
 
 '''
    Acquisition Window
@@ -35,7 +36,7 @@ class AcquisitionWindow(QMainWindow):
     # Setup UI elements
     def initUI(self,MainWindow):
         MainWindow.setObjectName("MainWindow")
-        MainWindow.setGeometry(10, 290, 340, 500)
+        MainWindow.setGeometry(10, 290, 340, 600)
         self.centralwidget = QWidget(MainWindow)
         self.centralwidget.setObjectName("centralwidget")
         self.gridLayoutWidget = QWidget(self.centralwidget)
@@ -102,9 +103,15 @@ class AcquisitionWindow(QMainWindow):
 
         self.pvModeBox = QCheckBox(self.centralwidget)
         self.pvModeBox.setGeometry(QRect(160, 300, 87, 20))
+
+        self.vocJscFromJVLabel = QLabel(self.centralwidget)
+        self.vocJscFromJVLabel.setGeometry(QRect(10, 320, 160, 16))
+
+        self.vocJscFromJVBox = QCheckBox(self.centralwidget)
+        self.vocJscFromJVBox.setGeometry(QRect(160, 320, 87, 20))
         
         self.gridLayoutWidget_2 = QWidget(self.centralwidget)
-        self.gridLayoutWidget_2.setGeometry(QRect(10, 320, 330, 181))
+        self.gridLayoutWidget_2.setGeometry(QRect(10, 340, 330, 170))
         self.gridLayout_2 = QGridLayout(self.gridLayoutWidget_2)
         self.gridLayout_2.setHorizontalSpacing(10)
 
@@ -118,8 +125,24 @@ class AcquisitionWindow(QMainWindow):
         self.IntervalText = QLineEdit(self)
         self.gridLayout_2.addWidget(self.IntervalText, 1, 1, 1, 1)
 
+        self.mpptLabel = QLabel(self.gridLayoutWidget_2)
+        self.gridLayout_2.addWidget(self.mpptLabel, 2, 0, 1, 1)
+        self.mpptCBox = QComboBox(self)
+        self.mpptCBox.addItems(mpptNames)
+        self.gridLayout_2.addWidget(self.mpptCBox, 2, 1, 1, 1)
+
+        self.mpptStepLabel = QLabel(self.gridLayoutWidget_2)
+        self.gridLayout_2.addWidget(self.mpptStepLabel, 3, 0, 1, 1)
+        self.mpptStepText = QLineEdit(self)
+        self.gridLayout_2.addWidget(self.mpptStepText, 3, 1, 1, 1)
+
+        self.vocJscEveryLabel = QLabel(self.gridLayoutWidget_2)
+        self.gridLayout_2.addWidget(self.vocJscEveryLabel, 4, 0, 1, 1)
+        self.vocJscEveryText = QSpinBox(self)
+        self.gridLayout_2.addWidget(self.vocJscEveryText, 4, 1, 1, 1)
+
         self.totTimePerDeviceLabel = QLabel(self.gridLayoutWidget_2)
-        self.gridLayout_2.addWidget(self.totTimePerDeviceLabel, 2, 0, 1, 1)
+        self.gridLayout_2.addWidget(self.totTimePerDeviceLabel, 5, 0, 1, 1)
         
         MainWindow.setCentralWidget(self.centralwidget)
         
@@ -147,17 +170,21 @@ class AcquisitionWindow(QMainWindow):
         self.delayBeforeMeasLabel.setText("Delays before measurements [sec]")
         self.trackingLabel.setText("<qt><b>Track Voc, Jsc, MPP: </b></qt>")
         self.pvModeLabel.setText("<qt><b>PV mode: </b></qt>")
+        self.vocJscFromJVLabel.setText("<qt><b>Voc, Jsc from JV: </b></qt>")
         self.numPointsLabel.setText("Number of points")
         self.intervalLabel.setText("Interval")
+        self.mpptLabel.setText("MPPT")
+        self.mpptStepLabel.setText("MPPT voltage step [V]")
+        self.vocJscEveryLabel.setText("Voc, Jsc every (points, 0: never)")
         self.totTimePerDeviceLabel.setText("Total time per device")
         
         self.saveButton = QPushButton(self.centralwidget)
-        self.saveButton.setGeometry(QRect(250, 390, 80, 60))
+        self.saveButton.setGeometry(QRect(250, 520, 80, 60))
         self.saveButton.setText("Save")
         self.saveButton.clicked.connect(self.saveParameters)
         
         self.defaultButton = QPushButton(self.centralwidget)
-        self.defaultButton.setGeometry(QRect(160, 390, 80, 60))
+        self.defaultButton.setGeometry(QRect(160, 520, 80, 60))
         self.defaultButton.setText("Default")
         self.defaultButton.clicked.connect(self.defaultParameters)
         
@@ -172,20 +199,29 @@ class AcquisitionWindow(QMainWindow):
         
     # Save acquisition parameters in configuration ini
     def saveParameters(self):
-        self.parent().config.conf['Acquisition']['acqMinVoltage'] = str(self.minVText.text())
-        self.parent().config.conf['Acquisition']['acqMaxVoltage'] = str(self.maxVText.text())
-        self.parent().config.conf['Acquisition']['acqStartVoltage'] = str(self.startVText.text())
-        self.parent().config.conf['Acquisition']['acqStepVoltage'] = str(self.stepVText.text())
-        self.parent().config.conf['Acquisition']['acqGateVoltage'] = str(self.gateVText.text())
-        self.parent().config.conf['Acquisition']['acqHoldTime'] = str(self.holdTText.text())
-        self.parent().config.conf['Acquisition']['acqNumAvScans'] = str(self.numAverScansText.text())
-        self.parent().config.conf['Acquisition']['acqDelBeforeMeas'] = str(self.delayBeforeMeasText.text())
-        self.parent().config.conf['Acquisition']['acqTrackNumPoints'] = str(self.numPointsText.value())
-        self.parent().config.conf['Acquisition']['acqTrackInterval'] = str(self.IntervalText.text())
-        self.parent().config.conf['Acquisition']['acqPVmode'] = str(self.pvModeBox.isChecked())
-
-        self.parent().config.saveConfig(self.parent().config.configFile)
-        self.parent().config.readConfig(self.parent().config.configFile)
+        try:
+            self.parent().config.update({
+                'acqMinVoltage' : self.minVText.text(),
+                'acqMaxVoltage' : self.maxVText.text(),
+                'acqStartVoltage' : self.startVText.text(),
+                'acqStepVoltage' : self.stepVText.text(),
+                'acqGateVoltage' : self.gateVText.text(),
+                'acqHoldTime' : self.holdTText.text(),
+                'acqNumAvScans' : self.numAverScansText.text(),
+                'acqDelBeforeMeas' : self.delayBeforeMeasText.text(),
+                'acqTrackNumPoints' : self.numPointsText.value(),
+                'acqTrackInterval' : self.IntervalText.text(),
+                'acqTrackMPPT' : self.mpptCBox.currentText(),
+                'acqTrackMPPTStep' : self.mpptStepText.text(),
+                'acqTrackVocJscEvery' : self.vocJscEveryText.value(),
+                'acqPVmode' : self.pvModeBox.isChecked(),
+                'acqVocJscFromJV' : self.vocJscFromJVBox.isChecked()})
+        except ValueError as e:
+            msg = "Acquisition parameters not saved: "+str(e)
+            print(msg)
+            logger.info(msg)
+            return
+        self.parent().config.flush()
         print("Acquisition parameters saved as default")
         logger.info("Acquisition parameters saved as default")
         self.timePerDevice()
@@ -211,7 +247,11 @@ class AcquisitionWindow(QMainWindow):
         self.delayBeforeMeasText.setText(str(self.parent().config.acqDelBeforeMeas))
         self.numPointsText.setValue(int(self.parent().config.acqTrackNumPoints))
         self.IntervalText.setText(str(self.parent().config.acqTrackInterval))
-        self.pvModeBox.setChecked(eval(self.parent().config.conf['Acquisition']['acqPVmode']))
+        self.mpptCBox.setCurrentIndex(max(self.mpptCBox.findText(self.parent().config.acqTrackMPPT), 0))
+        self.mpptStepText.setText(str(self.parent().config.acqTrackMPPTStep))
+        self.vocJscEveryText.setValue(int(self.parent().config.acqTrackVocJscEvery))
+        self.pvModeBox.setChecked(self.parent().config.acqPVmode)
+        self.vocJscFromJVBox.setChecked(self.parent().config.acqVocJscFromJV)
         self.timePerDevice()
 
     # Field validator for VStart
@@ -262,6 +302,11 @@ class AcquisitionWindow(QMainWindow):
         self.delayBeforeMeasText.setEnabled(flag)
         self.numPointsText.setEnabled(flag)
         self.IntervalText.setEnabled(flag)
+        self.mpptCBox.setEnabled(flag)
+        self.mpptStepText.setEnabled(flag)
+        self.vocJscEveryText.setEnabled(flag)
         self.saveButton.setEnabled(flag)
         self.defaultButton.setEnabled(flag)
         self.enableTrackingBox.setEnabled(flag)
+        self.pvModeBox.setEnabled(flag)
+        self.vocJscFromJVBox.setEnabled(flag)
@@ -0,0 +1,110 @@
+'''
+analysis.py
+-------------
+Extraction of performance parameters from JV curves.
+No hardware access: all values are derived from the data.
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import numpy as np
+
+# Sort a JV curve (columns: V, J) by increasing voltage
+def sortJV(JV):
+    JV = np.asarray(JV, dtype=float)
+    ind = np.argsort(JV[:,0], kind='mergesort')
+    return JV[ind,0], JV[ind,1]
+
+# Voltages at which y crosses zero, linearly interpolated between neighbouring points
+def zeroCrossings(x, y):
+    s = np.signbit(y)
+    ind = np.nonzero(s[1:] != s[:-1])[0]
+    x0, x1, y0, y1 = x[ind], x[ind+1], y[ind], y[ind+1]
+    return x0 - y0*(x1-x0)/(y1-y0)
+
+## Voc, Jsc from the JV curve
+# Jsc: current density interpolated at V = 0
+# Voc: zero crossing of the current density closest to V = 0 (0 if the
+# curve does not cross zero: Voc must then be measured)
+def calculate_voc_jsc(JV):
+    V, J = sortJV(JV)
+    if V[0] > 0. or V[-1] < 0.:
+        jsc = 0.
+    else:
+        jsc = float(np.interp(0., V, J))
+    vocs = zeroCrossings(V, J)
+    if vocs.size == 0:
+        voc = 0.
+    else:
+        voc = float(vocs[np.argmin(np.abs(vocs))])
+    return voc, jsc
+
+## Maximum power point
+# The search is restricted to the power quadrant (0 <= V <= Voc). The discrete
+# maximum is refined by interpolating the zero crossing of dP/dV around it.
+def calculate_mpp(JV, voc, jsc):
+    V, J = sortJV(JV)
+    sign = np.sign(voc*jsc) if voc*jsc != 0. else 1.
+    P = sign*V*J
+    mask = np.logical_and(V >= min(0., voc), V <= max(0., voc))
+    if np.count_nonzero(mask) < 1:
+        mask = np.ones(V.shape, dtype=bool)
+    ind = np.nonzero(mask)[0][np.argmax(P[mask])]
+    Vpmax, Jpmax = V[ind], J[ind]
+
+    if 0 < ind < V.size-1 and np.all(np.diff(V[ind-1:ind+2]) > 0):
+        lo = max(ind-2, 0)
+        hi = min(ind+3, V.size)
+        dP = np.gradient(P[lo:hi], V[lo:hi])
+        crossings = zeroCrossings(V[lo:hi], dP)
+        crossings = crossings[np.abs(crossings - V[ind]) <= np.max(np.abs(np.diff(V[ind-1:ind+2])))]
+        if crossings.size > 0:
+            Vm = float(crossings[np.argmin(np.abs(crossings - V[ind]))])
+            Jm = float(np.interp(Vm, V, J))
+            if sign*Vm*Jm >= P[ind]:
+                Vpmax, Jpmax = Vm, Jm
+    return float(Vpmax), float(Jpmax)
+
+## Fill factor and power conversion efficiency (%) from Voc, Jsc and MPP
+def calculate_ff_effic(voc, jsc, vpmax, jpmax, powerIn):
+    if voc != 0. and jsc != 0.:
+        return vpmax*jpmax/(voc*jsc), abs(100*vpmax*jpmax/powerIn)
+    return 0., 0.
+
+## Performance parameters from JV
+# powerIn: irradiance in the same power density units as V*J
+# voc, jsc: if provided (e.g. measured), they are used instead of the values from the curve
+# Returns: Voc, Jsc, Vpmax, Jpmax, FF, PCE
+def analyseJV(JV, powerIn, voc = None, jsc = None):
+    if voc is None or jsc is None:
+        Voc, Jsc = calculate_voc_jsc(JV)
+        if voc is not None:
+            Voc = voc
+        if jsc is not None:
+            Jsc = jsc
+    else:
+        Voc, Jsc = voc, jsc
+    Vpmax, Jpmax = calculate_mpp(JV, Voc, Jsc)
+    FF, effic = calculate_ff_effic(Voc, Jsc, Vpmax, Jpmax, powerIn)
+    return Voc, Jsc, Vpmax, Jpmax, FF, effic
+
+### This is only for testing ###
+# Usage: python3 analysis.py <saved csv files>
+if __name__ == '__main__':
+    import sys
+    import pandas as pd
+    for filename in sys.argv[1:]:
+        dftot = pd.read_csv(filename, na_filter=False)
+        JV = dftot[['V','J']].replace('', np.nan).dropna().values.astype(float)
+        Voc, Jsc, Vpmax, Jpmax, FF, effic = analyseJV(JV, 4.5044)
+        print(filename)
+        print("  saved:  Voc: {0:0.4f}, Jsc: {1:0.4f}, VPP: {2:0.4f}, MPP: {3:0.4f}".format(
+                float(dftot.at[0,'Voc']), float(dftot.at[0,'Jsc']),
+                float(dftot.at[0,'VPP']), float(dftot.at[0,'MPP'])))
+        print("  from JV: Voc: {0:0.4f}, Jsc: {1:0.4f}, VPP: {2:0.4f}, MPP: {3:0.4f}, FF: {4:0.4f}, PCE: {5:0.4f}".format(
+                Voc, Jsc, Vpmax, Vpmax*Jpmax, FF, effic))
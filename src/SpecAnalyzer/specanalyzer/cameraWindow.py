@@ -20,7 +20,11 @@ from PyQt5.QtWidgets import (QMainWindow, QPushButton, QAction,
     QGraphicsRectItem,QGraphicsItem,QToolBar,QMenuBar)
 from PyQt5.QtGui import (QIcon,QImage,QKeySequence,QPixmap,QPainter,
                          QBrush,QColor,QTransform,QPen,QFont)
-from PyQt5.QtCore import (pyqtSlot,QRectF,QPoint,QRect,Qt,QPointF)
+from PyQt5.QtCore import (pyqtSlot,QRectF,QPoint,QRect,Qt,QPointF,QThread,pyqtSignal)
+try:
+    from PyQt5 import sip
+except ImportError:
+    import sip
 
 from .modules.camera.camera import *
 from .configuration import *
@@ -36,8 +40,7 @@ class CameraWindow(QMainWindow):
     def __init__(self, parent=None):
         super(CameraWindow, self).__init__(parent)
         self.initUI()
-        self.config = Configuration()
-        self.config.readConfig(self.config.configFile)
+        self.config = self.parent().config
         #self.numRow = self.config.numSubsHolderRow
         #self.numCol = self.config.numSubsHolderCol
     
@@ -61,6 +64,7 @@ class CameraWindow(QMainWindow):
         self.end = QPoint()
         self.firstTimeRunning = True
         self.alignOn = False
+        self.live = False
         
         # Set up ToolBar
         tb = QToolBar()
@@ -251,8 +255,11 @@ class CameraWindow(QMainWindow):
         self.setWindowTitle('Camera Alignment Panel')
     '''
 
-    # Perform manual alignment
+    # Perform manual alignment. It runs until ENTER, Reset or closing
+    # the window (endManualAlign)
     def manualAlign(self, live):
+        if self.alignOn:
+            self.endManualAlign()
         self.delCam()
         #self.openShutter()
         self.cam = CameraFeed()
@@ -261,15 +268,15 @@ class CameraWindow(QMainWindow):
         self.saveImageBtn.setEnabled(True)
         self.isAutoAlign = False
         self.firstRun = True
-        if self.alignOn == False:
-            self.scene.selectionDef.connect(self.checkManualAlign)
+        self.scene.selectionDef.connect(self.checkManualAlign)
         self.alignOn = True
         self.setSelWindow(live)
         self.resetBtn.setEnabled(True)
-        QApplication.processEvents()
-        while self.alignOn:
-            time.sleep(0.1)
-            QApplication.processEvents()
+
+    # End of manual alignment
+    def endManualAlign(self):
+        self.alignOn = False
+        self.firstRun = False
         try:
             self.scene.selectionDef.disconnect()
         except:
@@ -290,19 +297,16 @@ class CameraWindow(QMainWindow):
         else:
             self.outAlignmentMessageBox(self.alignFlag)
 
-    # Define selection window 
+    # Define selection window (set with SPACE, see GraphicsScene)
     def setSelWindow(self, live):
         self.cameraFeed(live)
         if self.firstRun:
             self.printMsg(" Use Mouse to set the integration window")
-        while self.firstRun:
-            time.sleep(0.05)
-            QApplication.processEvents()
-            pass
-        self.firstRun = False
             
     # Alignment routine
     def alignment(self):
+        if self.live:
+            self.cam.latest_image(copy = True)
         image, image_data, image_orig = self.cam.get_image(True,
                              int(self.initial.x()),
                              int(self.final.x()),
@@ -349,33 +353,43 @@ class CameraWindow(QMainWindow):
             return 0, alignPerc, iMax
     '''
 
-    # Get image from feed
+    # Get image from feed: frames are captured by cameraThread and shown by
+    # showFrame. live: the image follows the camera, otherwise the first
+    # frame (after the ramp frames) is kept.
     def cameraFeed(self, live):
         self.scene.cleanup()
         self.setDefaultBtn.setEnabled(True)
+        self.live = live
         try:
             self.checkAlignText.setStyleSheet("color: rgb(0, 0, 0);")
             self.enableButtons(False)
-            if live:
-                #self.parent().stagewind.setGeometry(700, 60, 310, 400)
-                #self.parent().stagewind.show()
-                QApplication.processEvents()
-                self.img = self.cam.grab_image_live()
-            else:
-                QApplication.processEvents()
-                self.img = self.cam.grab_image()
-            if hasattr(self,"cam"):
-                self.image, self.image_data, temp = self.cam.get_image(False,0,0,0,0)
-            
-                pixMap = QPixmap.fromImage(self.image)
-                self.scene.addPixmap(pixMap)
-            self.view.fitInView(self.view.sceneRect(), Qt.KeepAspectRatio)
+            self.cam.start_buffer()
+            self.camThread = cameraThread(self.cam, parent=self)
+            self.camThread.frameReady.connect(self.showFrame)
+            self.camThread.start()
+        except:
+            self.statusBar().showMessage(' Camera not connected', 5000)
 
+    # Show the latest frame of the capture thread in the scene
+    def showFrame(self, count):
+        if not hasattr(self,"cam") or count <= self.cam.ramp_frames:
+            return
+        if not self.live:
+            if self.scene.pixmapItem is not None:
+                return
+            self.camThread.stop()
+        self.cam.latest_image()
+        self.img = self.cam.img
+        self.image, self.image_data, temp = self.cam.get_image(False,0,0,0,0)
+        pixMap = QPixmap.fromImage(gray_to_qimage(self.image))
+        if self.scene.pixmapItem is None:
+            self.scene.pixmapItem = self.scene.addPixmap(pixMap)
+            self.view.fitInView(self.view.sceneRect(), Qt.KeepAspectRatio)
             self.statusBar().showMessage('Camera-feed' + \
                  str(datetime.now().strftime(' (%Y-%m-%d %H-%M-%S)')), 5000)
             self.statusBar().showMessage(' Drag Mouse to select area for alignment', 5000)
-        except:
-            self.statusBar().showMessage(' Camera not connected', 5000)
+        else:
+            self.scene.pixmapItem.setPixmap(pixMap)
 
     # Set default values for alignment parameters
     def setDefault(self):
@@ -399,11 +413,9 @@ class CameraWindow(QMainWindow):
         ret = msgBox.exec_()
 
         if ret == QMessageBox.Yes:
-            self.parent().config.conf['Instruments']['alignmentContrastDefault'] = str(self.alignPerc)
-            self.parent().config.conf['Instruments']['alignmentIntMax'] = str(self.iMax)
-            with open(self.parent().config.configFile, 'w') as configfile:
-                self.parent().config.conf.write(configfile)
-            self.parent().config.readConfig(self.parent().config.configFile)
+            self.parent().config.update({'alignmentContrastDefault' : self.alignPerc,
+                    'alignmentIntMax' : self.iMax})
+            self.parent().config.flush()
             self.printMsg(" New alignment settings saved as default.")
             self.saveImage()
             return True
@@ -477,22 +489,16 @@ class CameraWindow(QMainWindow):
 
     # Delete camera feed
     def delCam(self):
+        if hasattr(self,"camThread"):
+            self.camThread.stop()
+            del self.camThread
         if hasattr(self,"cam"):
-            self.cam.closeLiveFeed = True
             del self.cam
 
     # Close camera feed upon closing window.
     def closeEvent(self, event):
         #self.parent().stagewind.close()
-        self.firstRun = False
-        self.enableButtons(True)
-        self.delCam()
-        self.scene.cleanup()
-        try:
-            self.alignOn = False
-            self.scene.selectionDef.disconnect()
-        except:
-            pass
+        self.endManualAlign()
         self.statusBar().showMessage("Camera: Ready")
         self.intensityLabel.setText("")
 
@@ -537,8 +543,10 @@ class CameraWindow(QMainWindow):
         #self.autoAlignmentMenu.setEnabled(flag)
         #self.liveAlignmentMenu.setEnabled(flag)
 
-    # Set alignOn variable as False
+    # Set alignOn variable (False: end of manual alignment)
     def setAlignOn(self, flag):
+        if flag is False and self.alignOn:
+            self.endManualAlign()
         self.alignOn = flag
         self.firstRun = flag
         self.resetBtn.setEnabled(flag)
@@ -547,13 +555,13 @@ class CameraWindow(QMainWindow):
     def getPixelIntensity(self):
         if hasattr(self,"cam"):
             try:
-                img_y, img_x, c = self.cam.img.shape
+                img_y, img_x = self.cam.gray.shape
             except:
-                img_y, img_x, c = 0,0,1
+                img_y, img_x = 0,0
             x = int(self.end.x())
             y = int(self.end.y())
             if x > 0 and y > 0 and x < img_x and y < img_y:
-                intensity = cv2.cvtColor(self.cam.img, cv2.COLOR_RGB2GRAY)[y,x]
+                intensity = self.cam.gray[y,x]
                 #msg = " Intensity pixel at ["+str(x)+", "+str(y)+"]: "+str(intensity)
                 msg = " Int: <b>"+str(intensity)+"</b> - ["+str(x)+", "+str(y)+"] "
                 #self.printMsg(msg)
@@ -598,6 +606,7 @@ class GraphicsScene(QGraphicsScene):
     def __init__(self, parent=None):
         super(GraphicsScene, self).__init__(parent)
         self.btnPressed = False
+        self.pixmapItem = None
 
     # Create rectangular selection
     def addRect(self):
@@ -653,20 +662,18 @@ class GraphicsScene(QGraphicsScene):
                 self.parent().firstRun = False
                 self.selectionDef.emit(True)
             if event.key() == Qt.Key_Return:
-                self.parent().alignOn=False
+                self.parent().setAlignOn(False)
     
     # Remove rectangular selections upon redrawing, leave image
     def removeRectangles(self):
-        if len(self.items()) == 1 :
-            self.image_item = self.items()[0]
         for item in self.items():
-            self.removeItem(item)
-        if hasattr(self,"image_item"):
-            self.addItem(self.image_item)
-        self.update
+            if item is not self.pixmapItem:
+                self.removeItem(item)
+        self.update()
 
     # cleaup scene and view
     def cleanup(self):
+        self.pixmapItem = None
         try:
             for item in self.items():
                 self.removeItem(item)
@@ -679,3 +686,42 @@ class GraphicsScene(QGraphicsScene):
 
 
 
+
+# QImage on the data of a grayscale (uint8) image or view (with contiguous
+# rows, as a crop), without copying: img must be kept as long as the
+# QImage is used (QPixmap.fromImage makes its own copy).
+def gray_to_qimage(img):
+    if img.size == 0:
+        return QImage()
+    if img.dtype != np.uint8 or img.strides[1] != 1:
+        raise ValueError("Grayscale uint8 image with contiguous rows needed")
+    return QImage(sip.voidptr(img.ctypes.data), img.shape[1], img.shape[0],
+            img.strides[0], QImage.Format_Grayscale8)
+
+'''
+   cameraThread
+   Captures frames continuously into the FrameBuffer of the camera
+   (pacing is given by the camera). frameReady(count) is emitted for the
+   preview at most previewRate times per second.
+'''
+class cameraThread(QThread):
+    frameReady = pyqtSignal(int)
+
+    def __init__(self, cam, previewRate = 30, parent=None):
+        super(cameraThread, self).__init__(parent)
+        self.cam = cam
+        self.previewInterval = 1/previewRate
+        self.runningFlag = True
+
+    # The loop ends after the frame being captured
+    def stop(self):
+        self.runningFlag = False
+        self.wait()
+
+    def run(self):
+        lastPreview = 0
+        while self.runningFlag and self.cam.capture():
+            now = time.time()
+            if now - lastPreview >= self.previewInterval:
+                lastPreview = now
+                self.frameReady.emit(self.cam.buffer.count)
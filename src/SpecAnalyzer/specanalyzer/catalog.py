@@ -0,0 +1,214 @@
+'''
+catalog.py
+-------------
+Catalog (SQLite) of saved device data: device ID, acquisition time,
+key metrics and acquisition parameters of each file, for fast searches
+without reading the files.
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import os, json, sqlite3, threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from . import config, logger
+from .dataIO import *
+
+# Columns of the catalog. Metrics are averages over perfData (as in the
+# results table), trackingTime is the duration of tracking (0: no tracking).
+catalogColumns = ['path', 'item', 'device', 'acqTime', 'trackingTime', 'samples',
+                'Voc', 'Jsc', 'VPP', 'MPP', 'FF', 'PCE', 'acqParams', 'fileTime', 'fileSize']
+
+catalogSchema = ['''CREATE TABLE IF NOT EXISTS measurements (
+                    path TEXT NOT NULL, item INTEGER NOT NULL,
+                    device TEXT, acqTime TEXT, trackingTime REAL, samples INTEGER,
+                    Voc REAL, Jsc REAL, VPP REAL, MPP REAL, FF REAL, PCE REAL,
+                    acqParams TEXT, fileTime REAL, fileSize INTEGER,
+                    PRIMARY KEY (path, item))''',
+                'CREATE INDEX IF NOT EXISTS measurementsDevice ON measurements(device)',
+                'CREATE INDEX IF NOT EXISTS measurementsTime ON measurements(acqTime)',
+                'CREATE INDEX IF NOT EXISTS measurementsPCE ON measurements(PCE)']
+
+'''
+   Catalog
+   One row per device saved in a file (item: index of the device in an
+   archive, 0 for csv). Can be used from several threads.
+'''
+class Catalog():
+    def __init__(self, dbFile):
+        self.dbFile = dbFile
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(dbFile, timeout = 10, check_same_thread = False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            for statement in catalogSchema:
+                self.db.execute(statement)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    # Row of the catalog for a device saved in path
+    def makeRow(self, path, item, deviceID, perfData, acqParams):
+        stat = os.stat(path)
+        timestamps = perfData['timestamp'][~np.isnat(perfData['timestamp'])]
+        acqTime = str(np.datetime_as_string(timestamps.min(), unit = 's')) \
+                if len(timestamps) > 0 else None
+        metrics = [float(np.mean(perfData[k])) for k in perfDataColumns[3:]]
+        return [os.path.abspath(path), item, str(deviceID), acqTime,
+                float(np.max(perfData['Time step'])), len(perfData)] + metrics + \
+                [json.dumps(jsonAcqParams(acqParams)), stat.st_mtime, stat.st_size]
+
+    def insertRows(self, rows):
+        with self.lock, self.db:
+            self.db.executemany('INSERT OR REPLACE INTO measurements VALUES ('+ \
+                    ','.join(['?']*len(catalogColumns))+')', rows)
+
+    # Add (or update) a saved device. acqParams: dictionary or DataFrame
+    def add(self, path, deviceID, perfData, acqParams, item = 0):
+        if not isinstance(acqParams, dict):
+            acqParams = acqParams.iloc[0].to_dict() if len(acqParams) > 0 else {}
+        self.insertRows([self.makeRow(path, item, deviceID, perfData, acqParams)])
+
+    # Add all devices of a data file (csv or archive)
+    def addFile(self, path):
+        self.insertRows(self.fileRows(path))
+
+    # The JV of archived devices is not read
+    def fileRows(self, path):
+        if isArchive(path):
+            with DataArchive(path) as archive:
+                return [self.makeRow(path, i, archive.deviceID(i), archive.perfData(i),
+                        archive.acqParams(i)) for i in range(len(archive))]
+        deviceID, perfData, JV, dfAcqParams = readCsv(path)
+        return [self.makeRow(path, 0, deviceID, perfData,
+                dfAcqParams.iloc[0].to_dict() if len(dfAcqParams) > 0 else {})]
+
+    def removePaths(self, paths):
+        with self.lock, self.db:
+            self.db.executemany('DELETE FROM measurements WHERE path = ?',
+                    [(os.path.abspath(p),) for p in paths])
+
+    # Measurements matching all the given conditions, most recent first.
+    # device: device ID, with * as wildcard
+    # since, until: date and time as ISO strings ("2026-09-01", "2026-09-01T12:00")
+    # tracking: True (False) for tracking (JV) measurements only
+    # Returns a list of dictionaries with catalogColumns as keys
+    def query(self, device = None, minPCE = None, maxPCE = None,
+                since = None, until = None, tracking = None, limit = None):
+        conditions, values = [], []
+        if device is not None:
+            conditions.append("device LIKE ? ESCAPE '\\'")
+            values.append(device.replace('\\','\\\\').replace('%','\\%'). \
+                    replace('_','\\_').replace('*','%'))
+        if minPCE is not None:
+            conditions.append('PCE >= ?')
+            values.append(float(minPCE))
+        if maxPCE is not None:
+            conditions.append('PCE <= ?')
+            values.append(float(maxPCE))
+        if since is not None:
+            conditions.append('acqTime >= ?')
+            values.append(str(since).replace(' ','T'))
+        if until is not None:
+            conditions.append('acqTime <= ?')
+            values.append(str(until).replace(' ','T') + ('T99' if len(str(until)) <= 10 else ''))
+        if tracking is not None:
+            conditions.append('trackingTime > 0' if tracking else 'trackingTime = 0')
+        sql = 'SELECT * FROM measurements'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY acqTime DESC'
+        if limit is not None:
+            sql += ' LIMIT ' + str(int(limit))
+        with self.lock:
+            return [dict(row) for row in self.db.execute(sql, values)]
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM measurements').fetchone()[0]
+
+    # Index data files (csv, npz) in folder and subfolders. Only new or
+    # modified files are read, entries of files no longer present are removed.
+    # onProgress(done, total): called after each file read
+    # Returns the number of files indexed, unchanged and removed
+    def indexFolder(self, folder, onProgress = None):
+        folder = os.path.abspath(folder)
+        files = {}
+        for root, dirs, names in os.walk(folder):
+            for name in names:
+                if os.path.splitext(name)[1].lower() in ['.csv', '.npz']:
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    files[path] = (stat.st_mtime, stat.st_size)
+
+        with self.lock:
+            indexed = {row[0] : (row[1], row[2]) for row in self.db.execute(
+                    "SELECT path, fileTime, fileSize FROM measurements WHERE path LIKE ? ESCAPE '\\'",
+                    [folder.replace('\\','\\\\').replace('%','\\%').replace('_','\\_') + os.sep + '%'])}
+        removed = [p for p in indexed if p not in files]
+        changed = [p for p in files if indexed.get(p) != files[p]]
+        self.removePaths(removed + changed)
+
+        def readRows(path):
+            try:
+                return self.fileRows(path)
+            except Exception as e:
+                logger.info(" Catalog: "+path+" not indexed ("+str(e)+")")
+                return []
+        with ThreadPoolExecutor(max_workers = min(8, os.cpu_count() or 1)) as pool:
+            for i, rows in enumerate(pool.map(readRows, changed)):
+                if rows:
+                    self.insertRows(rows)
+                if onProgress is not None:
+                    onProgress(i+1, len(changed))
+        return len(changed), len(files) - len(changed), len(removed)
+
+# Query from text, e.g.: "cell* pce>15 since:2026-09-01 tracking"
+# Terms: pce>x, pce<x, since:date, until:date, tracking, jv; other words
+# are the device ID. Returns keyword arguments for Catalog.query.
+def parseQuery(text):
+    query = {}
+    for term in text.split():
+        t = term.lower()
+        if t.startswith('pce>'):
+            query['minPCE'] = float(t[4:].lstrip('='))
+        elif t.startswith('pce<'):
+            query['maxPCE'] = float(t[4:].lstrip('='))
+        elif t.startswith('since:'):
+            query['since'] = term[6:]
+        elif t.startswith('until:'):
+            query['until'] = term[6:]
+        elif t == 'tracking':
+            query['tracking'] = True
+        elif t == 'jv':
+            query['tracking'] = False
+        else:
+            query['device'] = term
+    return query
+
+catalog = None
+catalogLock = threading.Lock()
+
+# Catalog of the configuration (config.catalogFile), opened on first use
+def getCatalog():
+    global catalog
+    with catalogLock:
+        if catalog is None:
+            catalog = Catalog(config.catalogFile)
+    return catalog
+
+# Add a saved device to the catalog of the configuration.
+# Saving does not fail if the catalog cannot be updated.
+def addToCatalog(path, deviceID, perfData, acqParams):
+    try:
+        getCatalog().add(path, deviceID, perfData, acqParams)
+    except Exception as e:
+        msg = " Catalog not updated: "+str(e)
+        print(msg)
+        logger.info(msg)
@@ -11,11 +11,70 @@ the Free Software Foundation; either version 2 of the License, or
 (at your option) any later version.
 
 '''
-import configparser, logging, os
+import configparser, logging, os, threading, atexit
 from pathlib import Path
-from datetime import datetime
 from . import __version__
 
+# Settings available as attributes of Configuration: key: (section, type)
+configKeys = {
+    'deviceArea' : ('Devices', float),
+    'acqMinVoltage' : ('Acquisition', float),
+    'acqMaxVoltage' : ('Acquisition', float),
+    'acqStartVoltage' : ('Acquisition', float),
+    'acqStepVoltage' : ('Acquisition', float),
+    'acqGateVoltage' : ('Acquisition', float),
+    'acqHoldTime' : ('Acquisition', float),
+    'acqNumAvScans' : ('Acquisition', int),
+    'acqDelBeforeMeas' : ('Acquisition', float),
+    'acqTrackNumPoints' : ('Acquisition', int),
+    'acqTrackInterval' : ('Acquisition', float),
+    'acqTrackMPPT' : ('Acquisition', str),
+    'acqTrackMPPTStep' : ('Acquisition', float),
+    'acqTrackVocJscEvery' : ('Acquisition', int),
+    'acqPVmode' : ('Acquisition', bool),
+    'acqVocJscFromJV' : ('Acquisition', bool),
+    'alignmentIntThreshold' : ('Instruments', float),
+    'alignmentContrastDefault' : ('Instruments', float),
+    'alignmentIntMax' : ('Instruments', float),
+    'powermeterID' : ('Instruments', str),
+    'irradiance1Sun' : ('Instruments', float),
+    'irradianceSensorArea' : ('Instruments', float),
+    'keithley2400ID' : ('Instruments', str),
+    'agilent4155cID' : ('Instruments', str),
+    'simulatorRs' : ('Instruments', float),
+    'simulatorRsh' : ('Instruments', float),
+    'simulatorNoise' : ('Instruments', float),
+    'simulatorHysteresis' : ('Instruments', float),
+    'simulatorLatency' : ('Instruments', float),
+    'appVersion' : ('System', str),
+    'loggingLevel' : ('System', str),
+    'loggingFilename' : ('System', str),
+    'csvSavingFolder' : ('System', str),
+    'saveLocalCsv' : ('System', bool),
+    'saveFormat' : ('System', str),
+    'plotRefreshRate' : ('System', float),
+    }
+
+# Typed value of a setting from a string (or a value of the right type).
+# Raises ValueError if not valid.
+def parseConfigValue(key, value):
+    valueType = configKeys[key][1]
+    if valueType is bool:
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() not in configparser.ConfigParser.BOOLEAN_STATES:
+            raise ValueError("Not a boolean: "+str(value))
+        return configparser.ConfigParser.BOOLEAN_STATES[str(value).lower()]
+    return valueType(str(value))
+
+'''
+   Configuration
+   Settings of the ini file, as typed attributes (configKeys).
+   Changes through set()/update() stay in memory and notify the listeners
+   (addListener). The file is written after saveDelay seconds (several
+   changes are written once) or at flush(), atomically.
+   One instance is shared by the program (config in the package).
+'''
 class Configuration():
     def __init__(self):
         self.home = str(Path.home())+"/"
@@ -23,12 +82,18 @@ class Configuration():
         self.generalFolder = self.home+"SpecAnalyzer/"
         Path(self.generalFolder).mkdir(parents=True, exist_ok=True)
         self.logFile = self.generalFolder+"SpecAnalyzer.log"
+        self.catalogFile = self.generalFolder+"catalog.db"
         self.dataFolder = self.generalFolder + 'data/'
         Path(self.dataFolder).mkdir(parents=True, exist_ok=True)
         self.imagesFolder = self.generalFolder + 'images/'
         Path(self.imagesFolder).mkdir(parents=True, exist_ok=True)
         self.conf = configparser.ConfigParser()
         self.conf.optionxform = str
+        self.lock = threading.RLock()
+        self.saveDelay = 1.
+        self.saveTimer = None
+        self.listeners = []
+        atexit.register(self.flush)
     
     # Create configuration file
     def createConfig(self):
@@ -37,8 +102,7 @@ class Configuration():
             self.defineConfAcq()
             self.defineConfInstr()
             self.defineConfSystem()
-            with open(self.configFile, 'w') as configfile:
-                self.conf.write(configfile)
+            self.writeConfig(self.configFile)
         except:
             print("Error in creating configuration file")
 
@@ -59,7 +123,11 @@ class Configuration():
             'acqDelBeforeMeas' : 1,
             'acqTrackNumPoints' : 5,
             'acqTrackInterval' : 2,
+            'acqTrackMPPT' : 'Perturb and Observe',
+            'acqTrackMPPTStep' : 0.01,
+            'acqTrackVocJscEvery' : 10,
             'acqPVmode' : True,
+            'acqVocJscFromJV' : True,
             }
     def defineConfInstr(self):
         self.conf['Instruments'] = {
@@ -71,6 +139,11 @@ class Configuration():
             'irradianceSensorArea' : 3.24,
             'keithley2400ID' : "GPIB0::24::INSTR",
             'agilent4155cID' : "GPIB0::17::INSTR",
+            'simulatorRs' : 2,
+            'simulatorRsh' : 1000,
+            'simulatorNoise' : 0.01,
+            'simulatorHysteresis' : 0.05,
+            'simulatorLatency' : 0.005,
             }
     def defineConfSystem(self):
         self.conf['System'] = {
@@ -79,62 +152,116 @@ class Configuration():
             'loggingFilename' : self.logFile,
             'csvSavingFolder' : self.dataFolder,
             'saveLocalCsv' : True,
+            'saveFormat' : 'csv',
+            'plotRefreshRate' : 5,
             }
 
-    # Read configuration file into usable variables
+    # Read configuration file into usable variables.
+    # Settings missing in the file (e.g. added in a newer version) or not
+    # valid are set to their default value, the others are kept.
+    # Listeners are notified of the values that changed.
     def readConfig(self, configFile):
-        self.conf.read(configFile)
-        self.sysConfig = self.conf['System']
-        self.appVersion = self.sysConfig['appVersion']
-        try:
+        previous = {key : getattr(self, key, None) for key in configKeys}
+        with self.lock:
+            self.conf.read(configFile)
+            defaults = self.defaultConf()
+            values, fixed = {}, []
+            for key, (section, valueType) in configKeys.items():
+                if not self.conf.has_section(section):
+                    self.conf.add_section(section)
+                try:
+                    values[key] = parseConfigValue(key, self.conf[section][key])
+                except (KeyError, ValueError):
+                    self.conf[section][key] = defaults[section][key]
+                    values[key] = parseConfigValue(key, defaults[section][key])
+                    fixed.append(key)
             self.devConfig = self.conf['Devices']
             self.acqConfig = self.conf['Acquisition']
             self.instrConfig = self.conf['Instruments']
             self.sysConfig = self.conf['System']
+            for key, value in values.items():
+                setattr(self, key, value)
+        if fixed:
+            msg = "Configuration file: default values set for "+", ".join(fixed)
+            print(msg)
+            logging.getLogger().info(msg)
+            self.saveConfig(configFile)
+        self.notify({key : value for key, value in values.items() if previous[key] != value})
 
-            self.deviceArea = self.conf.getfloat('Devices','deviceArea')
-        
-            self.acqMinVoltage = self.conf.getfloat('Acquisition','acqMinVoltage')
-            self.acqMaxVoltage = self.conf.getfloat('Acquisition','acqMaxVoltage')
-            self.acqStartVoltage = self.conf.getfloat('Acquisition','acqStartVoltage')
-            self.acqStepVoltage = self.conf.getfloat('Acquisition','acqStepVoltage')
-            self.acqGateVoltage = self.conf.getfloat('Acquisition','acqGateVoltage')
-            self.acqHoldTime = self.conf.getfloat('Acquisition','acqHoldTime')
-            self.acqNumAvScans = self.conf.getint('Acquisition','acqNumAvScans')
-            self.acqDelBeforeMeas = self.conf.getfloat('Acquisition','acqDelBeforeMeas')
-            self.acqTrackNumPoints = self.conf.getint('Acquisition','acqTrackNumPoints')
-            self.acqTrackInterval = self.conf.getfloat('Acquisition','acqTrackInterval')
-            self.acqPVmode = self.conf.getboolean('Acquisition','acqPVmode')
-
-            self.alignmentIntThreshold = self.conf.getfloat('Instruments','alignmentIntThreshold')
-            self.alignmentContrastDefault = self.conf.getfloat('Instruments','alignmentContrastDefault')
-            self.alignmentIntMax = self.conf.getfloat('Instruments','alignmentIntMax')
-            self.powermeterID = self.instrConfig['powermeterID']
-            self.irradiance1Sun = self.conf.getfloat('Instruments','irradiance1Sun')
-            self.irradianceSensorArea = self.conf.getfloat('Instruments','irradianceSensorArea')
-            self.keithley2400ID = self.instrConfig['keithley2400ID']
-            self.agilent4155cID = self.instrConfig['agilent4155cID']
-
-            self.appVersion = self.sysConfig['appVersion']
-            self.loggingLevel = self.sysConfig['loggingLevel']
-            self.loggingFilename = self.sysConfig['loggingFilename']
-            self.csvSavingFolder = self.sysConfig['csvSavingFolder']
-            self.saveLocalCsv = self.conf.getboolean('System','saveLocalCsv')
+    # Default configuration (ConfigParser)
+    def defaultConf(self):
+        with self.lock:
+            conf = self.conf
+            self.conf = configparser.ConfigParser()
+            self.conf.optionxform = str
+            try:
+                self.defineConfDevices()
+                self.defineConfAcq()
+                self.defineConfInstr()
+                self.defineConfSystem()
+                return self.conf
+            finally:
+                self.conf = conf
 
-        except:
-            print("Configuration file is for an earlier version of the software")
-            oldConfigFile = str(os.path.splitext(configFile)[0] + "_" +\
-                    str(datetime.now().strftime('%Y%m%d-%H%M%S'))+".ini")
-            print("Old config file backup: ",oldConfigFile)
-            os.rename(configFile, oldConfigFile )
-            print("Creating a new config file.")
-            self.createConfig()
-            self.readConfig(configFile)
+    # Change settings (key : value, keys in configKeys). Values are checked
+    # first: if any is not valid (ValueError) nothing is changed.
+    def update(self, values):
+        typed = {key : parseConfigValue(key, value) for key, value in values.items()}
+        with self.lock:
+            for key, value in values.items():
+                self.conf[configKeys[key][0]][key] = str(value)
+                setattr(self, key, typed[key])
+        self.notify(typed)
+        self.scheduleSave()
+
+    def set(self, key, value):
+        self.update({key : value})
+
+    # callback(key, value) is called for each setting changed
+    def addListener(self, callback):
+        self.listeners.append(callback)
+
+    def removeListener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def notify(self, values):
+        for key, value in values.items():
+            for callback in list(self.listeners):
+                callback(key, value)
+
+    # Write changes after saveDelay, unless more changes come
+    def scheduleSave(self):
+        with self.lock:
+            if self.saveTimer is not None:
+                self.saveTimer.cancel()
+            self.saveTimer = threading.Timer(self.saveDelay, self.flush)
+            self.saveTimer.daemon = True
+            self.saveTimer.start()
+
+    # Write pending changes now
+    def flush(self):
+        with self.lock:
+            if self.saveTimer is None:
+                return
+            self.saveTimer.cancel()
+            self.saveTimer = None
+            self.saveConfig(self.configFile)
+
+    # Write to a temporary file renamed over configFile, so that the
+    # file is never left half written
+    def writeConfig(self, configFile):
+        with self.lock:
+            tmpFile = configFile + ".tmp"
+            with open(tmpFile, 'w') as configfile:
+                self.conf.write(configfile)
+                configfile.flush()
+                os.fsync(configfile.fileno())
+            os.replace(tmpFile, configFile)
 
     # Save current parameters in configuration file
     def saveConfig(self, configFile):
         try:
-            with open(configFile, 'w') as configfile:
-                self.conf.write(configfile)
+            self.writeConfig(configFile)
         except:
             print("Error in saving parameters")
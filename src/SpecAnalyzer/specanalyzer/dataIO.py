@@ -0,0 +1,466 @@
+'''
+dataIO.py
+-------------
+Saving and loading of device data, independent of the
+graphical user interface.
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import numpy as np
+import pandas as pd
+import os, json, time, queue, threading
+from collections import namedtuple
+from datetime import datetime
+from . import logger
+
+# Columns of perfData, as saved in csv
+perfDataColumns = ['Acq Date','Acq Time','Time step', 'Voc',
+                'Jsc', 'VPP','MPP','FF','effic']
+
+# Performance data: one record per JV analysis or tracking sample.
+# Date and time (csv) are stored as a single timestamp.
+perfDataDtype = np.dtype([('timestamp', 'datetime64[ms]')] + \
+                [(k, 'f8') for k in perfDataColumns[2:]])
+
+# perfData with a single record (timestamp: now if None)
+def makePerfData(timeStep, Voc, Jsc, VPP, MPP, FF, effic, timestamp = None):
+    perfData = np.zeros(1, dtype = perfDataDtype)
+    if timestamp is None:
+        timestamp = np.datetime64(datetime.now(), 'ms')
+    perfData[0] = (timestamp, timeStep, Voc, Jsc, VPP, MPP, FF, effic)
+    return perfData
+
+# Date and time strings (as saved in csv) of a timestamp
+def dateTimeStrings(timestamp):
+    dt = pd.Timestamp(timestamp)
+    return dt.strftime('%Y-%m-%d'), dt.strftime('%H-%M-%S')
+
+# Create DataFrames for saving csv and jsons
+def makeDFPerfData(perfData):
+    timestamps = pd.DatetimeIndex(perfData['timestamp'])
+    dfPerfData = pd.DataFrame({'Acq Date': timestamps.strftime('%Y-%m-%d'),
+                    'Acq Time': timestamps.strftime('%H-%M-%S')})
+    for k in perfDataColumns[2:]:
+        dfPerfData[k] = perfData[k]
+    return dfPerfData[perfDataColumns]
+
+# perfData from a DataFrame read from csv
+# (empty cells: "" if read with na_filter=False, NaN otherwise)
+def makePerfDataFromDF(dfTot):
+    rows = int((dfTot['Acq Date'].fillna("") != "").sum())
+    perfData = np.zeros(rows, dtype = perfDataDtype)
+    perfData['timestamp'] = pd.to_datetime(dfTot['Acq Date'][:rows].astype(str)+" "+ \
+                    dfTot['Acq Time'][:rows].astype(str), format='%Y-%m-%d %H-%M-%S',
+                    errors='coerce').values
+    for k in perfDataColumns[2:]:
+        perfData[k] = dfTot[k][:rows].astype(float)
+    return perfData
+
+def makeDFJV(JV):
+    dfJV = pd.DataFrame({'V':JV[:,0], 'J':JV[:,1]})
+    dfJV = dfJV[['V', 'J']]
+    return dfJV
+
+# Formats for saving device data (configuration: saveFormat)
+dataFormats = ['csv', 'npz']
+
+# Name of the file for a device acquisition (with _tracking for tracking)
+def makeDataFilename(deviceID, perfData, extension):
+    dateTimeTag = str(datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
+    filename = deviceID+"_"+dateTimeTag
+    if np.count_nonzero(~np.isnan(perfData['MPP'])) >= 2:
+        filename += "_tracking"
+    return filename+"."+extension
+
+### Save device acquisition in the format from dataFormats
+# The saved file is added to the catalog (catalog.py).
+# Returns the full path of the saved file (None if saving failed)
+def saveDevice(deviceID, dfAcqParams, perfData, JV, folder, dataFormat = 'csv'):
+    if dataFormat == 'npz':
+        filename = saveNpz(deviceID, dfAcqParams, perfData, JV, folder)
+    else:
+        filename = saveCsv(deviceID, dfAcqParams, perfData, JV, folder)
+    if filename is not None:
+        from .catalog import addToCatalog
+        addToCatalog(filename, deviceID, perfData, dfAcqParams)
+    return filename
+
+### Save device acquisition as csv
+# Returns the full path of the saved file (None if saving failed)
+def saveCsv(deviceID, dfAcqParams, perfData, JV, folder):
+    dfPerfData = makeDFPerfData(perfData)
+    dfJV = makeDFJV(JV)
+
+    dfDeviceID = pd.DataFrame({'Device':[deviceID]})
+    dfTot = pd.concat([dfDeviceID, dfPerfData], axis = 1)
+    dfTot = pd.concat([dfTot,dfJV], axis = 1)
+    dfTot = pd.concat([dfTot,dfAcqParams.reset_index(drop=True)], axis = 1)
+
+    csvFilename = makeDataFilename(deviceID, perfData, "csv")
+    try:
+        dfTot.to_csv(folder+"/"+csvFilename, sep=',', index=False)
+        msg=" Device data saved on: "+folder+"/"+csvFilename
+        filename = folder+"/"+csvFilename
+    except:
+        msg=" Device data not saved"
+        filename = None
+    print(msg)
+    logger.info(msg)
+    return filename
+
+### Save device acquisition as archive (npz)
+# Returns the full path of the saved file (None if saving failed)
+def saveNpz(deviceID, dfAcqParams, perfData, JV, folder):
+    filename = folder+"/"+makeDataFilename(deviceID, perfData, "npz")
+    acqParams = dfAcqParams.iloc[0].to_dict() if len(dfAcqParams) > 0 else {}
+    try:
+        writeArchive(filename, [DeviceResult(deviceID, perfData, JV, acqParams)])
+        msg=" Device data saved on: "+filename
+    except:
+        msg=" Device data not saved"
+        filename = None
+    print(msg)
+    logger.info(msg)
+    return filename
+
+# Types of the device data columns in csv, the acquisition parameters follow
+csvDataDtypes = {'Device' : str, 'Acq Date' : str, 'Acq Time' : str, 'V' : float, 'J' : float}
+csvDataDtypes.update({k : float for k in perfDataColumns[2:]})
+
+# Archive (npz) or csv from the file extension
+def isArchive(filename):
+    return os.path.splitext(filename)[1].lower() == '.npz'
+
+### Load device acquisitions from csv or archive (npz)
+# All the data of all devices is read: to read only some devices or
+# arrays of an archive, use DataArchive.
+# Returns a list of (deviceID, perfData, JV, dfAcqParams)
+def readDataFile(filename):
+    if isArchive(filename):
+        with DataArchive(filename) as archive:
+            return [(r.deviceID, r.perfData, r.JV, pd.DataFrame([r.acqParams])) \
+                        for r in archive]
+    return [readCsv(filename)]
+
+### Load device acquisition from csv
+# Data columns are read with their types (no type inference), the
+# acquisition parameters from the first row only.
+# Returns deviceID, perfData, JV, dfAcqParams
+def readCsv(filename):
+    dfTot = pd.read_csv(filename, usecols = list(csvDataDtypes), dtype = csvDataDtypes)
+    dfAcqParams = pd.read_csv(filename, nrows = 1, na_filter = False,
+                usecols = lambda c: c not in csvDataDtypes)
+    perfData = makePerfDataFromDF(dfTot)
+    JV = dfTot[['V','J']].values[:dfTot['V'].count()]
+    return str(dfTot.at[0,'Device']), perfData, JV, dfAcqParams
+
+### Load list of devices for multi-device acquisition
+# csv with columns: Device, Area (optional), Resource (optional, VISA resource)
+# Returns a list of dictionaries with keys: device, area, resource
+def readDeviceList(filename, defaultArea):
+    dfDevices = pd.read_csv(filename, na_filter=False, skipinitialspace=True)
+    devices = []
+    for i in range(len(dfDevices)):
+        area = dfDevices.at[i,'Area'] if 'Area' in dfDevices else ""
+        resource = dfDevices.at[i,'Resource'] if 'Resource' in dfDevices else ""
+        devices.append({'device' : str(dfDevices.at[i,'Device']),
+                'area' : float(area) if area != "" else float(defaultArea),
+                'resource' : str(resource) if resource != "" else None})
+    return devices
+
+# Record of device data: perfData and JV arrays, acqParams dictionary
+DeviceResult = namedtuple('DeviceResult', ['deviceID', 'perfData', 'JV', 'acqParams'])
+
+'''
+   Archive (npz) of device data
+   For each device i: perfData<i> (perfData records) and JV<i> (V, J)
+   are separate typed arrays; device IDs and acquisition parameters are
+   in a JSON header. No padding and no parsing, compressed on disk.
+   Arrays are read without pickle.
+'''
+archiveFormat = {'format' : 'SpecAnalyzer', 'version' : 1}
+
+# Acquisition parameters with JSON types
+def jsonAcqParams(acqParams):
+    return {str(k) : v.item() if isinstance(v, np.generic) else v \
+            for k, v in acqParams.items()}
+
+# results: list of DeviceResult (one device or a whole session)
+def writeArchive(filename, results):
+    arrays = {}
+    header = dict(archiveFormat, devices = [])
+    for i, result in enumerate(results):
+        arrays['perfData'+str(i)] = np.asarray(result.perfData, dtype = perfDataDtype)
+        arrays['JV'+str(i)] = np.asarray(result.JV, dtype = float).reshape(-1, 2)
+        header['devices'].append({'device' : str(result.deviceID),
+                'acqParams' : jsonAcqParams(result.acqParams)})
+    arrays['header'] = np.array(json.dumps(header))
+    with open(filename, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+'''
+   DataArchive
+   Archive opened for reading: the header is read on opening, the arrays
+   only when accessed. archive[i] is the DeviceResult of device i;
+   perfData(i), JV(i) and acqParams(i) read a single array (or the header)
+   of a device, e.g. to index or search archives without reading the JV.
+'''
+class DataArchive():
+    def __init__(self, filename):
+        self.file = np.load(filename, allow_pickle = False)
+        try:
+            header = json.loads(str(self.file['header']))
+            if header.get('format') != archiveFormat['format']:
+                raise ValueError('Not a SpecAnalyzer archive: '+filename)
+        except:
+            self.file.close()
+            raise
+        self.devices = header['devices']
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __getitem__(self, i):
+        return DeviceResult(self.deviceID(i), self.perfData(i), self.JV(i),
+                self.acqParams(i))
+
+    def device(self, i):
+        if i < 0 or i >= len(self.devices):
+            raise IndexError('Device not in archive: '+str(i))
+        return self.devices[i]
+
+    def deviceID(self, i):
+        return self.device(i)['device']
+
+    def acqParams(self, i):
+        return self.device(i)['acqParams']
+
+    def perfData(self, i):
+        self.device(i)
+        return self.file['perfData'+str(i)]
+
+    def JV(self, i):
+        self.device(i)
+        return self.file['JV'+str(i)]
+
+    def deviceIDs(self):
+        return [d['device'] for d in self.devices]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+'''
+   SaveQueue
+   Saves device data (saveDevice) in a dedicated writer thread, so that
+   the caller does not wait for slow storage. Data is saved in the order
+   it is queued. Saving is retried on failure (retries, with the delay
+   doubling at every attempt).
+   flush() waits until all queued data is saved, close() also stops the
+   writer thread.
+'''
+class SaveQueue():
+    def __init__(self, retries = 3, retryDelay = 0.5):
+        self.retries = retries
+        self.retryDelay = retryDelay
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    # partialFile: removed once the data is saved (kept if saving fails)
+    def put(self, deviceID, dfAcqParams, perfData, JV, folder, dataFormat = 'csv',
+                partialFile = None):
+        self.queue.put((deviceID, dfAcqParams.copy(), np.array(perfData),
+                np.array(JV), folder, dataFormat, partialFile))
+
+    # Number of queued saves not completed yet
+    def pending(self):
+        return self.queue.unfinished_tasks
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                self.save(*job)
+            finally:
+                self.queue.task_done()
+
+    def save(self, deviceID, dfAcqParams, perfData, JV, folder, dataFormat, partialFile = None):
+        for attempt in range(self.retries + 1):
+            try:
+                filename = saveDevice(deviceID, dfAcqParams, perfData, JV, folder, dataFormat)
+            except Exception:
+                filename = None
+            if filename is not None:
+                removePartialFile(partialFile)
+                return filename
+            if attempt < self.retries:
+                time.sleep(self.retryDelay*2**attempt)
+        msg = " Device data not saved after "+str(self.retries + 1)+" attempts: "+deviceID
+        if partialFile:
+            msg += " (tracking data kept in: "+partialFile+")"
+        print(msg)
+        logger.info(msg)
+        return None
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+'''
+   GrowableArray
+   Preallocated array whose capacity doubles when full:
+   appending a row is O(1) amortised, data is a view (no copy).
+   Rows are either records of dtype (columns = None) or arrays of columns.
+'''
+class GrowableArray():
+    def __init__(self, dtype = float, columns = None, capacity = 1024):
+        shape = (capacity,) if columns is None else (capacity, columns)
+        self.buffer = np.zeros(shape, dtype = dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, row):
+        if self.size == self.buffer.shape[0]:
+            buffer = np.zeros((2*self.buffer.shape[0],) + self.buffer.shape[1:],
+                        dtype = self.buffer.dtype)
+            buffer[:self.size] = self.buffer
+            self.buffer = buffer
+        self.buffer[self.size] = row
+        self.size += 1
+
+    @property
+    def data(self):
+        return self.buffer[:self.size]
+
+'''
+   TrackingWriter
+   Appends tracking samples (perfData records) to disk as they are acquired,
+   so that data of long runs survives an interrupted acquisition.
+   The file (<deviceID>_<date-time>.csv.partial) is csv with perfData columns.
+   Rows are flushed at every sample and synced to disk every fsyncEvery rows.
+'''
+class TrackingWriter():
+    def __init__(self, deviceID, folder, fsyncEvery = 10):
+        dateTimeTag = str(datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
+        self.filename = folder+"/"+deviceID+"_"+dateTimeTag+".csv.partial"
+        self.fsyncEvery = fsyncEvery
+        self.numRows = 0
+        self.file = open(self.filename, 'w')
+        self.file.write(",".join(perfDataColumns)+"\n")
+        self.file.flush()
+
+    # record: perfData record
+    def append(self, record):
+        row = list(dateTimeStrings(record['timestamp'])) + \
+                [str(float(record[k])) for k in perfDataColumns[2:]]
+        self.file.write(",".join(row)+"\n")
+        self.file.flush()
+        self.numRows += 1
+        if self.fsyncEvery > 0 and self.numRows % self.fsyncEvery == 0:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+# Remove the partial file of a tracking (TrackingWriter), once the complete
+# data has been saved
+def removePartialFile(filename):
+    if not filename:
+        return
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+'''
+   ResultStore
+   Results of a session: append-only list of records with an index by
+   device ID. A record holds deviceID, perfData, JV and the acquisition
+   parameters (as a dictionary column: value). Records are identified by
+   a key (their position): removing a record leaves an empty slot, so
+   that adding and removing are O(1) and keys do not change.
+   DataFrames are created only when requested (dfAcqParams, toDataFrame).
+'''
+
+class ResultStore():
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.records = []
+        self.deviceKeys = {}
+        self.numRemoved = 0
+
+    def __len__(self):
+        return len(self.records) - self.numRemoved
+
+    # dfAcqParams: DataFrame with acquisition parameters (first row is used)
+    # Returns the key of the new record
+    def add(self, deviceID, perfData, JV, dfAcqParams):
+        key = len(self.records)
+        acqParams = dfAcqParams.iloc[0].to_dict() if len(dfAcqParams) > 0 else {}
+        self.records.append(DeviceResult(str(deviceID), np.array(perfData, dtype = perfDataDtype),
+                np.asarray(JV, dtype = float).reshape(-1, 2), acqParams))
+        self.deviceKeys.setdefault(str(deviceID), {})[key] = None
+        return key
+
+    def remove(self, key):
+        record = self.records[key]
+        if record is None:
+            return
+        self.records[key] = None
+        self.numRemoved += 1
+        keys = self.deviceKeys[record.deviceID]
+        del keys[key]
+        if not keys:
+            del self.deviceKeys[record.deviceID]
+
+    # Record (None if removed)
+    def get(self, key):
+        return self.records[key]
+
+    # Keys of all records, or of the records of a device
+    def keys(self, deviceID = None):
+        if deviceID is None:
+            return [k for k, r in enumerate(self.records) if r is not None]
+        return list(self.deviceKeys.get(deviceID, {}))
+
+    # Acquisition parameters of a record as a DataFrame (as saved in csv)
+    def dfAcqParams(self, key):
+        return pd.DataFrame([self.records[key].acqParams])
+
+    # Summary of the records (one row each): device, averages of
+    # perfData, number of samples and acquisition parameters
+    def toDataFrame(self, keys = None):
+        rows = []
+        for key in (self.keys() if keys is None else keys):
+            record = self.records[key]
+            row = {'Device': record.deviceID}
+            row['Acq Date'], row['Acq Time'] = dateTimeStrings(record.perfData[0]['timestamp'])
+            row.update({k : float(np.mean(record.perfData[k])) for k in perfDataColumns[3:]})
+            row['Time step'] = float(record.perfData[0]['Time step'])
+            row['Samples'] = len(record.perfData)
+            row.update(record.acqParams)
+            rows.append(row)
+        return pd.DataFrame(rows)
@@ -0,0 +1,420 @@
+'''
+engine.py
+-------------
+Acquisition sequence (sweeps, JV, tracking) independent of the
+graphical user interface. Used by acqThread and by the batch
+command line interface.
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import numpy as np
+import pandas as pd
+import time, threading
+from collections import namedtuple
+from datetime import datetime
+from . import analysis
+from .mppt import getMPPTracker
+from .dataIO import GrowableArray, TrackingWriter, perfDataDtype, makePerfData
+
+# Acquisition parameters, in the order they are stored in csv files
+acqParamsColumns = ['Acq Min Voltage','Acq Max Voltage','Acq Start Voltage',
+                'Acq Step Voltage','Acq Gate Voltage','Acq Hold Time', 'Acq Num Aver Scans',
+                'Delay Before Meas','Num Track Points','PV mode', 'Voc Jsc from JV',
+                'Track Interval', 'Track MPPT', 'Track MPPT Step', 'Track Voc Jsc Every',
+                'Device Area', 'Comments']
+
+# Configuration entries (section Acquisition) providing the default acquisition parameters
+acqParamsConfig = {'Acq Min Voltage' : 'acqMinVoltage',
+                'Acq Max Voltage' : 'acqMaxVoltage',
+                'Acq Start Voltage' : 'acqStartVoltage',
+                'Acq Step Voltage' : 'acqStepVoltage',
+                'Acq Gate Voltage' : 'acqGateVoltage',
+                'Acq Hold Time' : 'acqHoldTime',
+                'Acq Num Aver Scans' : 'acqNumAvScans',
+                'Delay Before Meas' : 'acqDelBeforeMeas',
+                'Num Track Points' : 'acqTrackNumPoints',
+                'PV mode' : 'acqPVmode',
+                'Voc Jsc from JV' : 'acqVocJscFromJV',
+                'Track Interval' : 'acqTrackInterval',
+                'Track MPPT' : 'acqTrackMPPT',
+                'Track MPPT Step' : 'acqTrackMPPTStep',
+                'Track Voc Jsc Every' : 'acqTrackVocJscEvery'}
+
+# Fields of AcqParameters for the parameters stored in csv files
+acqParamsFields = {'Acq Min Voltage' : 'minVoltage',
+                'Acq Max Voltage' : 'maxVoltage',
+                'Acq Start Voltage' : 'startVoltage',
+                'Acq Step Voltage' : 'stepVoltage',
+                'Acq Gate Voltage' : 'gateVoltage',
+                'Acq Hold Time' : 'holdTime',
+                'Acq Num Aver Scans' : 'numAverScans',
+                'Delay Before Meas' : 'delayBeforeMeas',
+                'Num Track Points' : 'numTrackPoints',
+                'PV mode' : 'pvMode',
+                'Voc Jsc from JV' : 'vocJscFromJV',
+                'Track Interval' : 'trackInterval',
+                'Track MPPT' : 'mppt',
+                'Track MPPT Step' : 'mpptStep',
+                'Track Voc Jsc Every' : 'vocJscEvery',
+                'Device Area' : 'deviceArea',
+                'Comments' : 'comments'}
+
+# Boolean from widgets, configuration or text (csv, json)
+def toBool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ['true', '1', 'yes']
+    return bool(value)
+
+# Types of the acquisition parameters (float if not listed)
+acqParamsTypes = {'Acq Num Aver Scans' : lambda v: int(float(v)),
+                'Num Track Points' : lambda v: int(float(v)),
+                'PV mode' : toBool,
+                'Voc Jsc from JV' : toBool,
+                'Track MPPT' : str,
+                'Track Voc Jsc Every' : lambda v: int(float(v)),
+                'Comments' : str}
+
+'''
+   AcqParameters
+   Immutable parameters for the acquisition of one device, built with
+   makeAcqParameters. It can be shared between GUI and worker threads.
+'''
+class AcqParameters(namedtuple('AcqParameters',
+        [acqParamsFields[k] for k in acqParamsColumns] + ['deviceID', 'enableTracking', 'powerIn'])):
+    __slots__ = ()
+
+    # DataFrame to be used for storing (as csv or json)
+    def toDataFrame(self):
+        pdframe = pd.DataFrame({k : [getattr(self, acqParamsFields[k])] for k in acqParamsColumns})
+        return pdframe[acqParamsColumns]
+
+# Collect acquisition parameters (keys: csv column names) into AcqParameters
+def makeAcqParameters(params, deviceID = "", enableTracking = False, powerIn = 100.):
+    values = {acqParamsFields[k] : acqParamsTypes.get(k, float)(params[k]) for k in acqParamsColumns}
+    return AcqParameters(deviceID = str(deviceID), enableTracking = toBool(enableTracking),
+                powerIn = float(powerIn), **values)
+
+# Get date/time
+def getDateTimeNow():
+    return str(datetime.now().strftime('%Y-%m-%d')),\
+                str(datetime.now().strftime('%H-%M-%S'))
+
+# Results of AcquisitionEngine.results()
+JVResult = namedtuple('JVResult', ['JV', 'perfData', 'deviceID'])
+# partialFile: tracking data streamed to disk (TrackingWriter), only in the
+# final result (saveData) and None if not streamed. It is not removed by the
+# engine: the consumer removes it once the data is saved (removePartialFile).
+TrackingResult = namedtuple('TrackingResult', ['JV', 'perfData', 'deviceID', 'setupTable',
+                'saveData', 'partialFile'])
+
+# Raised in the acquisition when it is cancelled (CancelToken)
+class AcquisitionCancelled(Exception):
+    pass
+
+'''
+   CancelToken
+   Cooperative cancellation of an acquisition: cancel() can be called from
+   any thread, the acquisition stops at the next check (between points and
+   during waits, including the hold times of sweeps).
+'''
+class CancelToken():
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise AcquisitionCancelled()
+
+    # Wait for seconds, unless cancelled
+    def sleep(self, seconds):
+        if self.event.wait(max(float(seconds), 0.)):
+            raise AcquisitionCancelled()
+
+'''
+   Acquisition Engine
+   Runs the acquisition for one device on an activated sourcemeter.
+   Results are either iterated with results() (JVResult, TrackingResult)
+   or passed to the callbacks by run():
+    onMsg(msg)
+    onJVComplete(JV, perfData, deviceID)
+    onTracking(JV, perfData, deviceID, setupTable, saveData, partialFile)
+   cancelToken: CancelToken to stop the acquisition from another thread.
+   On cancel, the instrument is aborted and its output switched off.
+'''
+class AcquisitionEngine():
+    def __init__(self, params, source_meter,
+            onMsg = print, onJVComplete = None, onTracking = None, streamFolder = None,
+            cancelToken = None):
+        self.params = params
+        self.cancelToken = cancelToken if cancelToken is not None else CancelToken()
+        self.streamFolder = streamFolder
+        self.source_meter = source_meter
+        self.powerIn = params.powerIn
+        self.onMsg = onMsg
+        self.onJVComplete = onJVComplete if onJVComplete is not None else lambda *args: None
+        self.onTracking = onTracking if onTracking is not None else lambda *args: None
+        self.JVOKflag = False
+
+    # Full sequence, with results passed to the callbacks.
+    # Returns False if the JV for performance parameters was not acquired
+    # or the acquisition was cancelled
+    def run(self):
+        try:
+            for result in self.results():
+                if isinstance(result, TrackingResult):
+                    self.onTracking(*result)
+                else:
+                    self.onJVComplete(*result)
+        except AcquisitionCancelled:
+            self.abort()
+            self.onMsg("  Device "+self.params.deviceID+": acquisition cancelled")
+            return False
+        return self.JVOKflag
+
+    # Stop the instrument: abort a running sweep, clear errors, output off
+    def abort(self):
+        try:
+            if hasattr(self.source_meter, 'abort'):
+                self.source_meter.abort()
+        finally:
+            self.source_meter.off()
+
+    # Sweep run by the instrument. Its duration is waited here, so that a
+    # cancel takes effect within a hold time, then data is read back.
+    def sweep_values(self, start, end, step, gate, hold_time):
+        self.cancelToken.check()
+        self.source_meter.sweep(start, end, step, gate, hold_time)
+        num_points = 1 if step == 0 else int(round(abs((end - start)/step))) + 1
+        self.cancelToken.sleep(num_points*hold_time)
+        return self.source_meter.read_sweep_values(self.params.deviceArea, self.params.pvMode)
+
+    # Full sequence: sweeps, JV for performance parameters and (optional) tracking
+    def results(self):
+        deviceID = self.params.deviceID
+        self.onMsg("Acquisition started: "+getDateTimeNow()[0]+" at " + \
+                getDateTimeNow()[1])
+        self.onMsg("  Acquiring JV from device: " + deviceID)
+
+        # Acquire forward and backward sweeps
+        sweepF, sweepB = yield from self.measure_sweep(deviceID)
+        # Acquire JV for performance parameters
+        self.JVOKflag, JVF, JVB, perfDataF, perfDataB = self.measure_voc_jsc_mpp(deviceID)
+        if self.JVOKflag:
+            yield JVResult(JVF, perfDataF, deviceID+"_JV-forward")
+            yield JVResult(JVB, perfDataB, deviceID+"_JV-backward")
+            self.onMsg('  Device '+deviceID+' acquisition: complete')
+
+            if self.params.enableTracking:
+                self.cancelToken.sleep(1)
+                perfData, JV = yield from self.tracking(deviceID, JVF, perfDataF)
+                self.onMsg(' Device '+deviceID+' tracking: complete')
+
+            self.onMsg("Acquisition Completed: "+ getDateTimeNow()[0] + \
+                " at "+getDateTimeNow()[1])
+
+    ## measurements: JV
+    # Yields JVResult for backward and forward sweeps
+    def measure_sweep(self, deviceID):
+        p = self.params
+        # measurement parameters
+        v_min, v_max, v_start = p.minVoltage, p.maxVoltage, p.startVoltage
+        v_step, v_gate, hold_time = p.stepVoltage, p.gateVoltage, p.holdTime
+        pvMode, deviceArea = p.pvMode, p.deviceArea
+
+        # enforce, before the output is switched on
+        if v_min > v_max or not v_min <= v_start <= v_max:
+            raise ValueError('Voltage Errors: start voltage '+str(v_start)+ \
+                    ' V not within min/max voltage ['+str(v_min)+', '+str(v_max)+'] V')
+
+        self.source_meter.set_mode('VOLT')
+        self.source_meter.on()
+        self.cancelToken.sleep(p.delayBeforeMeas)
+
+        # create list of voltage to measure
+        v_list_full = np.arange(v_min-2., v_max + 2., v_step)
+        v_list = v_list_full[np.logical_and(v_min-1e-9 <= v_list_full, v_list_full <= v_max+1e-9)]
+        start_i = np.argmin(abs(v_start - v_list))
+
+        N = len(v_list)
+        #forward sweep 1
+        i_list_forw1 = list(range(start_i, N))
+        #forward sweep 2
+        i_list_forw2 = list(range(0, start_i))
+
+        # create data array
+        data = np.zeros((N, 3))
+        data[:, 0] = v_list
+        
+        self.onMsg('  Device '+deviceID+': acquiring forward sweep')
+        self.source_meter.set_mode('VOLT')
+        data[i_list_forw1, 1] = self.sweep_values(v_list[start_i], v_max, v_step, v_gate, hold_time)[1]
+
+        self.onMsg('  Device '+deviceID+': acquiring backward sweep')
+        data[:, 2] = np.flipud(self.sweep_values(v_list[-1], v_list[0], - v_step, v_gate, hold_time)[1])
+        perfDataB = self.analyseJV(data[:, (0,2)])
+        yield JVResult(data[:, (0,2)], perfDataB, deviceID+"_sweep-back")
+
+        if len(i_list_forw2) > 0:
+            self.onMsg('  Device '+deviceID+': completing forward sweep')
+            data[i_list_forw2, 1] = self.sweep_values(v_list[0], v_list[start_i-1], v_step, v_gate, hold_time)[1]
+        perfDataF = self.analyseJV(data[:, (0,1)])
+        yield JVResult(data[:, (0,1)], perfDataF, deviceID+"_sweep-forw")
+        return data[:, 0:2], data[:,(0,2)]
+
+    ## measurements: voc, jsc
+    def measure_voc_jsc(self):
+        pvMode, deviceArea = self.params.pvMode, self.params.deviceArea
+        self.cancelToken.check()
+
+        # voc
+        self.source_meter.set_mode('CURR')
+        self.source_meter.on()
+        self.source_meter.set_output(current = 0.)
+        voc = self.source_meter.read_values(deviceArea, pvMode)[0]
+        # jsc
+        self.source_meter.set_mode('VOLT')
+        self.source_meter.on()
+        self.source_meter.set_output(voltage = 0.)
+        jsc = self.source_meter.read_values(deviceArea, pvMode)[1]
+        return voc, jsc
+    
+    ## measurements: voc, jsc, mpp
+    def measure_voc_jsc_mpp(self, deviceID):
+        # measurement parameters
+        p = self.params
+        v_step, v_gate, hold_time = p.stepVoltage, p.gateVoltage, p.holdTime
+        scans, pvMode, deviceArea = p.numAverScans, p.pvMode, p.deviceArea
+        self.cancelToken.sleep(p.delayBeforeMeas)
+
+        # measurements: voc, jsc
+        voc, jsc = self.measure_voc_jsc()
+
+        # measurement parameters
+        v_min = 0.
+        v_max = voc
+        #v_max = 2 #for testing only
+
+        if v_max - v_min < v_step:
+            self.onMsg('  Voc appears to be close to V=0. Aborting') 
+            return False, None, None, None, None
+        
+        # measure
+        v_list = np.arange(v_min, v_max+1e-9, v_step)
+        
+        JV = np.zeros((len(v_list),3))
+        JV[:, 0] = v_list
+        JVtemp = np.zeros((len(v_list),3))
+        JVtemp[:, 0] = v_list
+        
+        for n in range(scans):
+            self.onMsg('  Device '+deviceID+': acquiring JV forward for analysis, scan: '+str(n+1)+'/'+str(scans))
+            self.source_meter.set_mode('VOLT')
+            JVtemp[:, 1] = self.sweep_values(v_list[0], v_list[-1], v_step, v_gate, hold_time)[1]
+
+            self.onMsg('  Device '+deviceID+': acquiring JV backward for analysis, scan: '+str(n+1)+'/'+str(scans))
+            JVtemp[:, 2] = np.flipud(self.sweep_values(v_list[-1], v_list[0], - v_step, v_gate, hold_time)[1])
+
+            JV[:,1] = (JVtemp[:,1] + JV[:,1]*n)/(n+1)
+            JV[:,2] = (JVtemp[:,2] + JV[:,2]*n)/(n+1)
+
+        # the sweep stops at the measured Voc: no zero crossing in the curve,
+        # the measured Voc and Jsc are used
+        perfDataF = self.analyseJV(JV[:, (0,1)], voc, jsc)
+        perfDataB = self.analyseJV(JV[:, (0,2)], voc, jsc)
+        
+        return True, JV[:, 0:2], JV[:,(0,2)], perfDataF, perfDataB
+
+    # Tracking (take JV once and track the MPP with the MPPT strategy)
+    # Voc and Jsc are measured every vocJscEvery samples (never if 0),
+    # otherwise the latest values are used.
+    # Samples are kept in a growable numeric buffer and, if streamFolder is set,
+    # appended to disk as they arrive (TrackingWriter). The partial file is
+    # kept: it is passed with the final result, for removal once saved.
+    # Yields TrackingResult at each time step
+    def tracking(self, deviceID, JV, perfData):
+        p = self.params
+        hold_time, numPoints, trackTime = p.holdTime, p.numTrackPoints, p.trackInterval
+        pvMode, deviceArea = p.pvMode, p.deviceArea
+        self.cancelToken.sleep(p.delayBeforeMeas)
+
+        # operating point at given voltage
+        def measure(v):
+            self.cancelToken.check()
+            self.source_meter.set_output(voltage = v)
+            self.cancelToken.sleep(hold_time)
+            return self.source_meter.read_values(deviceArea, pvMode)[1]
+        # short sweep (mini-sweep MPPT)
+        def sweep(v_start, v_end, v_step):
+            return self.sweep_values(v_start, v_end, v_step, p.gateVoltage, hold_time)
+
+        voc, jsc = perfData[0]['Voc'], perfData[0]['Jsc']
+        Vpmax = perfData[0]['VPP']
+        Jpmax = perfData[0]['MPP']/Vpmax if Vpmax != 0. else 0.
+        tracker = getMPPTracker(p.mppt, Vpmax, Jpmax, p.mpptStep)
+        self.source_meter.set_mode('VOLT')
+        self.source_meter.on()
+
+        # perfData records, oldest first
+        values = GrowableArray(perfDataDtype)
+        values.append(perfData[0])
+        writer = None
+        if self.streamFolder is not None:
+            writer = TrackingWriter(deviceID+"_tracking", self.streamFolder)
+            writer.append(perfData[0])
+
+        startTime = time.time()
+
+        self.onMsg("Tracking device: "+deviceID+" (time-step: 0, MPPT: "+p.mppt+")")
+
+        perfData = values.data[::-1]
+        try:
+            for n in range(1, numPoints):
+                self.cancelToken.sleep(trackTime)
+                timeStep = time.time()-startTime
+                self.onMsg("Tracking device: "+deviceID+" (time-step: "+str(n)+"/"+\
+                              str(numPoints)+" - {0:0.1f}s)".format(timeStep))
+                if p.vocJscEvery > 0 and (n-1) % p.vocJscEvery == 0:
+                    voc, jsc = self.measure_voc_jsc()
+
+                Vpmax, Jpmax = tracker.track(measure, sweep)
+                FF, effic = analysis.calculate_ff_effic(voc, jsc, Vpmax, Jpmax, self.powerIn)
+                data = makePerfData(timeStep, voc, jsc, Vpmax, Vpmax*Jpmax, FF, effic)
+                values.append(data[0])
+                if writer is not None:
+                    writer.append(data[0])
+                # newest first, view of the buffer (no copy)
+                perfData = values.data[::-1]
+                yield TrackingResult(JV, perfData, deviceID+"_tracking", False, False, None)
+            if writer is not None:
+                writer.close()
+            yield TrackingResult(JV, perfData, deviceID+"_tracking", True, True,
+                    writer.filename if writer is not None else None)
+        finally:
+            if writer is not None:
+                writer.close()
+        return perfData, JV
+
+    # Extract parameters from JV
+    # Voc and Jsc are either derived from the curve or measured (see 'Voc Jsc from JV').
+    # voc, jsc: if already measured, used in either case
+    def analyseJV(self, JV, voc = None, jsc = None):
+        if voc is not None and jsc is not None:
+            Voc, Jsc, Vpmax, Jpmax, FF, effic = analysis.analyseJV(JV, self.powerIn, voc, jsc)
+        elif self.params.vocJscFromJV:
+            Voc, Jsc, Vpmax, Jpmax, FF, effic = analysis.analyseJV(JV, self.powerIn)
+        else:
+            voc, jsc = self.measure_voc_jsc()
+            Voc, Jsc, Vpmax, Jpmax, FF, effic = analysis.analyseJV(JV, self.powerIn, voc, jsc)
+        return makePerfData(0., Voc, Jsc, Vpmax, Vpmax*Jpmax, FF, effic)
@@ -0,0 +1,178 @@
+'''
+instruments.py
+-------------
+Selection and connection of the supported sourcemeters, and the
+instrument manager that keeps instruments connected across uses.
+Drivers are imported only when used, so that the simulator
+works without pyvisa installed.
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import threading, time
+
+# Order matches the entries of SourcemeterWindow.instrumentCBox
+sourcemeterNames = ["Agilent 4155", "Keithley 2400", "Simulator"]
+
+# Connect to sourcemeter from its index in sourcemeterNames
+# resource: VISA resource of the instrument (default from configuration)
+def getSourcemeter(index, config, resource = None):
+    if index == 0:
+        from .modules.sourcemeter.agilent4155c import Agilent4155c
+        return Agilent4155c(getResource(index, config, resource))
+    elif index == 1:
+        from .modules.sourcemeter.keithley2400 import Keithley2400
+        return Keithley2400(getResource(index, config, resource))
+    elif index == 2:
+        from .modules.sourcemeter.simulator import SimulatedSourcemeter
+        sm = SimulatedSourcemeter(getResource(index, config, resource),
+                    rs = config.simulatorRs,
+                    rsh = config.simulatorRsh,
+                    noise = config.simulatorNoise,
+                    hysteresis = config.simulatorHysteresis,
+                    latency = config.simulatorLatency,
+                    irradiance = config.irradiance1Sun)
+        # the simulated device is lit by the irradiance used for the PCE
+        def onConfigChange(key, value):
+            if key == 'irradiance1Sun':
+                sm.set_irradiance(value)
+        config.addListener(onConfigChange)
+        return sm
+    else:
+        raise ValueError('Unknown sourcemeter: '+str(index))
+
+# VISA resource of a sourcemeter, resource overrides the configuration
+def getResource(index, config, resource = None):
+    if resource is not None and resource != "":
+        return resource
+    if index == 0:
+        return config.agilent4155cID
+    elif index == 1:
+        return config.keithley2400ID
+    else:
+        return "SIM::INSTR"
+
+# Raised when an instrument is still leased after the timeout
+class InstrumentBusy(Exception):
+    pass
+
+# Connection to one instrument (see InstrumentManager)
+class InstrumentEntry():
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.instrument = None
+        self.valid = False
+        self.lastUsed = 0.
+        self.lock = threading.Lock()
+
+    # Open the instrument if needed. An instrument idle for more than
+    # checkInterval is checked first, and reopened if not responding.
+    def connect(self, checkInterval):
+        if self.instrument is not None and (not self.valid or \
+                (time.time() - self.lastUsed > checkInterval and not self.healthy())):
+            self.close()
+        if self.instrument is None:
+            self.instrument = self.factory()
+            self.valid = True
+
+    def healthy(self):
+        if not hasattr(self.instrument, 'ask'):
+            return True
+        try:
+            self.instrument.ask('*IDN?')
+            return True
+        except Exception:
+            return False
+
+    # Drivers close their VISA session when deleted
+    def close(self):
+        instrument, self.instrument = self.instrument, None
+        self.valid = False
+        del instrument
+
+'''
+   InstrumentLease
+   Exclusive use of an instrument, released with release() or at the end
+   of a with block. An error in the with block (or invalidate()) has the
+   instrument reopened at the next lease.
+'''
+class InstrumentLease():
+    def __init__(self, entry):
+        self.entry = entry
+        self.instrument = entry.instrument
+
+    def invalidate(self):
+        self.entry.valid = False
+
+    def release(self):
+        if self.instrument is not None:
+            self.instrument = None
+            self.entry.lastUsed = time.time()
+            self.entry.lock.release()
+
+    def __enter__(self):
+        return self.instrument
+
+    def __exit__(self, type, value, traceback):
+        if type is not None:
+            self.invalidate()
+        self.release()
+
+'''
+   InstrumentManager
+   Opens each instrument (VISA resource) once, with its configuration,
+   and keeps it connected for the acquisition and the panels:
+       with instrumentManager.leaseSourcemeter(index, config) as sm:
+           ...
+   A lease is exclusive: other users of the same instrument wait for it
+   (up to timeout seconds, None: no limit).
+'''
+class InstrumentManager():
+    def __init__(self, checkInterval = 10):
+        self.checkInterval = checkInterval
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def lease(self, key, name, factory, timeout = None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = InstrumentEntry(name, factory)
+        if not entry.lock.acquire(timeout = -1 if timeout is None else timeout):
+            raise InstrumentBusy(name+" is in use")
+        try:
+            entry.connect(self.checkInterval)
+        except:
+            entry.lock.release()
+            raise
+        return InstrumentLease(entry)
+
+    # Sourcemeter from its index in sourcemeterNames
+    def leaseSourcemeter(self, index, config, resource = None, timeout = None):
+        resource = getResource(index, config, resource)
+        return self.lease(('sourcemeter', index, resource), resource,
+                lambda: getSourcemeter(index, config, resource), timeout)
+
+    def leasePowermeter(self, powermeterID, timeout = None):
+        from .modules.powermeter.powermeter import PowerMeter
+        return self.lease(('powermeter', powermeterID), powermeterID,
+                lambda: PowerMeter(powermeterID), timeout)
+
+    # Close the instruments not in use (e.g. when quitting)
+    def closeAll(self, timeout = 1):
+        with self.lock:
+            entries = list(self.entries.values())
+            self.entries = {}
+        for entry in entries:
+            if entry.lock.acquire(timeout = timeout):
+                entry.close()
+                entry.lock.release()
+
+# Instruments of the program
+instrumentManager = InstrumentManager()
@@ -11,7 +11,7 @@ the Free Software Foundation; either version 2 of the License, or
 
 '''
 
-import sys, webbrowser, random, time
+import sys, webbrowser, random, time, importlib
 import configparser
 from datetime import datetime
 
@@ -20,19 +20,26 @@ from PyQt5.QtWidgets import (QMainWindow, QApplication, QPushButton,
     QFileDialog,QStatusBar,QGraphicsScene,QLineEdit,QMessageBox,
     QDialog,QToolBar,QMenuBar)
 from PyQt5.QtGui import (QIcon,QImage,QKeySequence,QPixmap,QPainter)
-from PyQt5.QtCore import (pyqtSlot,QRectF)
+from PyQt5.QtCore import (pyqtSlot,QRectF,QRect,Qt)
 
 from . import __version__
 from . import __author__
 from . import logger
+from . import config
 from .configuration import *
-from .cameraWindow import *
-from .resultsWindow import *
 from .acquisition import *
 from .acquisitionWindow import *
-from .powermeterWindow import *
 from .sourcemeterWindow import *
 
+# Windows created (and their module imported) at first use, as they
+# bring in matplotlib, OpenCV or the powermeter libraries.
+# Attribute of MainWindow: (module, class)
+lazyWindows = {
+    'resultswind' : ('.resultsWindow', 'ResultsWindow'),
+    'camerawind' : ('.cameraWindow', 'CameraWindow'),
+    'powermeterwind' : ('.powermeterWindow', 'PowermeterWindow'),
+    }
+
 '''
    Main Window
    Definition of Main Panel
@@ -40,9 +47,29 @@ from .sourcemeterWindow import *
 class MainWindow(QMainWindow):
     def __init__(self):
         super(MainWindow, self).__init__(None)
-        self.config = Configuration()
-        self.config.readConfig(self.config.configFile)
+        self.config = config
+        self.windows = {}
         self.initUI()
+        self.config.addListener(self.configChanged)
+
+    # Window in lazyWindows, created at the first call.
+    # Errors are raised as RuntimeError: an AttributeError would be reported
+    # by the property as a missing attribute of MainWindow.
+    def lazyWindow(self, name):
+        if name not in self.windows:
+            module, className = lazyWindows[name]
+            startTime = time.perf_counter()
+            try:
+                windowClass = getattr(importlib.import_module(module, __package__), className)
+                self.windows[name] = windowClass(parent=self)
+            except Exception as e:
+                raise RuntimeError(className+" not created: "+repr(e)) from e
+            logger.info(" "+className+" created in {0:0.3f} s".format(time.perf_counter()-startTime))
+        return self.windows[name]
+
+    resultswind = property(lambda self: self.lazyWindow('resultswind'))
+    camerawind = property(lambda self: self.lazyWindow('camerawind'))
+    powermeterwind = property(lambda self: self.lazyWindow('powermeterwind'))
     
     # Define UI elements
     def initUI(self):
@@ -51,12 +78,9 @@ class MainWindow(QMainWindow):
         self.setGeometry(10,30,340,220)
         self.setFixedSize(self.size())
         self.aboutwid = AboutWidget()
-        self.resultswind = ResultsWindow(parent=self)
-        self.camerawind = CameraWindow(parent=self)
         self.weblinks = WebLinksWidget()
         self.acquisition = Acquisition(parent=self)
         self.acquisitionwind = AcquisitionWindow(parent=self)
-        self.powermeterwind = PowermeterWindow(parent=self)
         self.sourcemeterwind = SourcemeterWindow(parent=self)
         
         self.deviceLabel = QLabel(self)
@@ -101,12 +125,17 @@ class MainWindow(QMainWindow):
         self.loadMenu = QAction("&Load Data", self)
         self.loadMenu.setShortcut("Ctrl+o")
         self.loadMenu.setStatusTip('Load csv data from saved file')
-        self.loadMenu.triggered.connect(self.resultswind.read_csv)
+        self.loadMenu.triggered.connect(lambda: self.resultswind.read_csv())
+        
+        self.multiAcqMenu = QAction("Start &Multi-device Acquisition", self)
+        self.multiAcqMenu.setShortcut("Ctrl+Shift+m")
+        self.multiAcqMenu.setStatusTip('Acquire devices from a list (Device, Area, Resource) at the same time')
+        self.multiAcqMenu.triggered.connect(self.acquisition.startMulti)
         
         self.directoryMenu = QAction("&Set directory for saved files", self)
         self.directoryMenu.setShortcut("Ctrl+d")
         self.directoryMenu.setStatusTip('Set directory for saved files')
-        self.directoryMenu.triggered.connect(self.resultswind.set_dir_saved)
+        self.directoryMenu.triggered.connect(lambda: self.resultswind.set_dir_saved())
         
         self.quitMenu = QAction("&Quit", self)
         self.quitMenu.setShortcut("Ctrl+q")
@@ -118,6 +147,7 @@ class MainWindow(QMainWindow):
         fileMenu.addSeparator()
         fileMenu.addAction(self.loadMenu)
         fileMenu.addAction(self.directoryMenu)
+        fileMenu.addAction(self.multiAcqMenu)
         fileMenu.addSeparator()
         fileMenu.addAction(self.loadConfigMenu)
         fileMenu.addAction(self.saveConfigMenu)
@@ -125,7 +155,7 @@ class MainWindow(QMainWindow):
         self.powermeterMenu = QAction("&Powermeter", self)
         self.powermeterMenu.setShortcut("Ctrl+p")
         self.powermeterMenu.setStatusTip('Powermeter controls')
-        self.powermeterMenu.triggered.connect(self.powermeterwind.show)
+        self.powermeterMenu.triggered.connect(lambda: self.powermeterwind.show())
         self.sourcemeterMenu = QAction("&Sourcemeter", self)
         self.sourcemeterMenu.setShortcut("Ctrl+k")
         self.sourcemeterMenu.setStatusTip('Sourcemeter controls')
@@ -133,7 +163,7 @@ class MainWindow(QMainWindow):
         self.cameraMenu = QAction("&Camera", self)
         self.cameraMenu.setShortcut("Ctrl+c")
         self.cameraMenu.setStatusTip('Camera controls')
-        self.cameraMenu.triggered.connect(self.camerawind.show)
+        self.cameraMenu.triggered.connect(lambda: self.camerawind.show())
 
         instrumentsMenu = self.menuBar.addMenu('&Instruments')
         instrumentsMenu.addAction(self.sourcemeterMenu)
@@ -172,12 +202,12 @@ class MainWindow(QMainWindow):
         self.resultsToolbar = QAction("&Results", self)
         self.resultsToolbar.setShortcut("Ctrl+p")
         self.resultsToolbar.setStatusTip('Results Panel')
-        self.resultsToolbar.triggered.connect(self.resultswind.show)
+        self.resultsToolbar.triggered.connect(lambda: self.resultswind.show())
         
         self.cameraToolbar = QAction("&Camera", self)
         self.cameraToolbar.setShortcut("Ctrl+c")
         self.cameraToolbar.setStatusTip('Camera and alignment')
-        self.cameraToolbar.triggered.connect(self.camerawind.show)
+        self.cameraToolbar.triggered.connect(lambda: self.camerawind.show())
         
         #toolBar = self.addToolBar("&Toolbar")
         self.toolBar.addAction(self.acquisitionToolbar)
@@ -213,7 +243,9 @@ class MainWindow(QMainWindow):
     def loadConfig(self):
         filename = QFileDialog.getOpenFileName(self,
                         "Open INI config file", "","*.ini")
-        self.config.readConfig(filename)
+        if filename[0] == "":
+            return
+        self.config.readConfig(filename[0])
         print("Confguration parameters loaded from:",filename[0])
         logger.info("Confguration parameters loaded from:"+filename[0])
     
@@ -221,15 +253,23 @@ class MainWindow(QMainWindow):
     def saveConfig(self):
         filename = QFileDialog.getSaveFileName(self,
                         "Save INI config file", "","*.ini")
+        if filename[0] == "":
+            return
         self.config.saveConfig(filename[0])
         print("Confguration parameters saved to:",filename[0])
         logger.info("Confguration parameters saved to:"+filename[0])
     
     # Logic to save deviceArea on config when done editing the corresponding field
     def setDeviceArea(self):
-        self.config.conf['Devices']['deviceArea'] = str(self.deviceAreaText.text())
-        self.config.saveConfig(self.config.configFile)
-        self.config.readConfig(self.config.configFile)
+        try:
+            self.config.set('deviceArea', self.deviceAreaText.text())
+        except ValueError:
+            self.deviceAreaText.setText(str(self.config.deviceArea))
+
+    # Show settings changed elsewhere (e.g. configuration file loaded)
+    def configChanged(self, key, value):
+        if key == 'deviceArea' and self.deviceAreaText.text() != str(value):
+            self.deviceAreaText.setText(str(value))
 
     # When closing the MainWindow, all windows need to close as we..
     def fileQuit(self):
@@ -288,9 +328,15 @@ class MainWindow(QMainWindow):
 
         if reply == QMessageBox.Yes:
             try:
-                self.acquisition.acq_thread.stop()
+                self.acquisition.stopThreads(True)
+                if 'resultswind' in self.windows:
+                    self.resultswind.stopLoadCsv()
             except:
                 pass
+            if 'resultswind' in self.windows:
+                self.resultswind.flushSaveQueue()
+            self.config.flush()
+            instrumentManager.closeAll()
             self.close()
         else:
             event.ignore()
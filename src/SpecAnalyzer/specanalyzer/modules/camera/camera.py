@@ -17,9 +17,17 @@ the Free Software Foundation; either version 2 of the License, or
 import cv2
 import time, sys
 import numpy as np
-from PIL import Image
-from PIL.ImageQt import ImageQt
 from datetime import datetime
+from collections import namedtuple
+
+# Statistics of the image (or region of interest) used for alignment:
+# contrast: percentage of values above the threshold (thresholdPerc*iMax)
+# mean, iMax: mean and max intensity
+# brightFraction: fraction of pixels above the threshold (each channel
+# counts separately for color images)
+# centroid: (x, y) of the pixels above the threshold, in pixels
+AlignmentStats = namedtuple('AlignmentStats',
+        ['contrast', 'iMax', 'mean', 'brightFraction', 'centroid'])
 
 class CameraFeed():
     # Setup connection to OpenCV
@@ -30,34 +38,10 @@ class CameraFeed():
         #time.sleep(2)
         self.camera.set(10, -200)
         self.camera.set(15, -8.0)
+        self.img = None
+        self.gray = None
+        self.buffer = None
 
-    # Grab frame into variable from live
-    def grab_image_live(self):
-        self.closeLiveFeed = False
-        windowTitle = 'Live Feed: push \"q\" to stop and grab frame'
-        while True:
-            ret, frame = self.camera.read()
-
-            cv2.namedWindow(windowTitle)
-            # Our operations on the frame come here
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            def mouse_callback(event, x, y, flags, param):
-                if event == cv2.EVENT_LBUTTONDOWN:
-                    intensity = gray[y,x]
-                    print(" Intensity pixel at ["+str(x)+", "+str(y)+"]: "+str(intensity))
-        
-            cv2.setMouseCallback(windowTitle, mouse_callback)
-            cv2.imshow(windowTitle,gray)
-        
-            if (cv2.waitKey(1) & 0xFF == ord('q')) or self.closeLiveFeed == True:
-                cv2.destroyAllWindows()
-                break
-        for i in range(self.ramp_frames):
-            temp = self.camera.read()
-        _, self.img = self.camera.read()
-        return self.img
-        
     def grab_image(self):
         #ret, frame = self.camera.read()
         for i in range(self.ramp_frames):
@@ -65,34 +49,59 @@ class CameraFeed():
         _, self.img = self.camera.read()
         return self.img
         
-    # Process image
+    # Continuous capture: frames are read in place into a FrameBuffer
+    # of numFrames frames by capture(), called in a loop by the capture thread
+    def start_buffer(self, numFrames = 4):
+        ret, frame = self.camera.read()
+        if not ret:
+            raise IOError("No frame from camera")
+        self.buffer = FrameBuffer(numFrames, frame.shape, frame.dtype)
+
+    # Read the next frame into the buffer (blocks until a frame is available)
+    def capture(self):
+        slot = self.buffer.next_slot()
+        ret, frame = self.camera.read(slot)
+        if not ret:
+            return False
+        if frame.ctypes.data != slot.ctypes.data:
+            slot[...] = frame
+        self.buffer.commit()
+        return True
+
+    # Latest frame of the buffer as current image (self.img).
+    # copy: keep it even after the buffer has moved on
+    def latest_image(self, copy = False):
+        img, count = self.buffer.latest()
+        if img is not None:
+            self.img = img.copy() if copy else img
+        return count
+
+    # Process image: the frame (BGR) is converted once to grayscale (gray),
+    # crops are views. Returns the grayscale crop (to show), the crop of the
+    # frame as captured (img_data, used for alignment: alignmentIntThreshold
+    # and alignmentContrastDefault are calibrated on it) and the grayscale frame.
     def get_image(self, crop, x1, x2, y1, y2):
+        self.gray = cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)
         if crop == True:
-            self.img1 = self.img[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)]
+            self.gray_data = self.gray[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)]
+            self.img_data = self.img[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)]
         else:
-            self.img1 = self.img
-        self.img_raw = Image.fromarray(self.img1).convert('L')
-        self.imgg = ImageQt(self.img_raw)
-        self.img_data = np.asarray(self.img1)
-        self.imgg_orig = ImageQt(Image.fromarray(self.img).convert('L'))
-        return self.imgg, self.img_data, self.imgg_orig
+            self.gray_data = self.gray
+            self.img_data = self.img
+        return self.gray_data, self.img_data, self.gray
 
     # Save image
     def save_image(self, filename):
-        img_bw = cv2.cvtColor(self.img, cv2.COLOR_RGB2GRAY)
+        img_bw = cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)
         cv2.imwrite(filename,img_bw)
 
-    # Logic for checking alignment
+    # Logic for checking alignment. Full statistics of the last check
+    # are kept in alignmentStats (AlignmentStats).
     def check_alignment(self, img_data, thresholdPerc):
-        count = 0
-        self.iMax = np.amax(img_data)
-        threshold = thresholdPerc*self.iMax
-        for i in np.nditer(img_data):
-            if i > threshold:
-                count = count + 1
-        contrast = 100*count/img_data.size
-        print(" Check alignment [%]: {0:0.3f}".format(contrast))
-        return "{0:0.3f}".format(contrast), self.iMax
+        stats = self.alignmentStats = alignment_stats(img_data, thresholdPerc)
+        self.iMax = stats.iMax
+        print(" Check alignment [%]: {0:0.3f}".format(stats.contrast))
+        return "{0:0.3f}".format(stats.contrast), self.iMax
 
     '''
     def check_alignment_old(self, threshold):
@@ -106,6 +115,71 @@ class CameraFeed():
 
     # Close connection to camera
     def close_cam(self):
-        self.closeLiveFeed = True
         cv2.destroyAllWindows()
         del(self.camera)
+
+'''
+   FrameBuffer
+   Ring buffer of numFrames preallocated frames. Each frame is captured in
+   place into next_slot() and made available by commit(). latest() gives
+   the last complete frame without copying: it stays valid while fewer
+   than numFrames-1 new frames are captured.
+'''
+class FrameBuffer():
+    def __init__(self, numFrames, shape, dtype = np.uint8):
+        self.frames = np.zeros((numFrames,)+tuple(shape), dtype = dtype)
+        self.numFrames = numFrames
+        self.count = 0
+
+    def next_slot(self):
+        return self.frames[self.count % self.numFrames]
+
+    def commit(self):
+        self.count += 1
+
+    # Latest frame and number of frames captured so far
+    def latest(self):
+        count = self.count
+        if count == 0:
+            return None, 0
+        return self.frames[(count - 1) % self.numFrames], count
+
+# Alignment statistics of img_data (grayscale, or color with the channels
+# as last axis), from one threshold mask over the whole array. Sums run
+# in OpenCV on the image seen as 2D (channels along the rows).
+# roi: (x1, x2, y1, y2) to restrict the statistics to a region
+def alignment_stats(img_data, thresholdPerc, roi = None):
+    if roi is not None:
+        x1, x2, y1, y2 = roi
+        img_data = img_data[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)]
+    if img_data.size == 0:
+        return AlignmentStats(0., 0, 0., 0., (np.nan, np.nan))
+    rows = np.ascontiguousarray(img_data).reshape(img_data.shape[0], -1)
+    iMax = np.amax(rows)
+    threshold = thresholdPerc*iMax
+    if np.issubdtype(rows.dtype, np.integer):
+        # same comparison, without converting the image to float
+        threshold = rows.dtype.type(min(np.floor(threshold), np.iinfo(rows.dtype).max))
+    mask = (rows > threshold).view(np.uint8)
+    rowCounts = cv2.reduce(mask, 1, cv2.REDUCE_SUM, dtype = cv2.CV_32S).ravel()
+    colCounts = cv2.reduce(mask, 0, cv2.REDUCE_SUM, dtype = cv2.CV_32S).ravel()
+    colCounts = colCounts.reshape(img_data.shape[1], -1).sum(axis = 1)
+    count = int(rowCounts.sum())
+    if count > 0:
+        centroid = (float(np.dot(colCounts, np.arange(colCounts.size)))/count,
+                float(np.dot(rowCounts, np.arange(rowCounts.size)))/count)
+    else:
+        centroid = (np.nan, np.nan)
+    return AlignmentStats(100*count/img_data.size, iMax, cv2.mean(rows)[0],
+            count/img_data.size, centroid)
+
+### This is only for testing ###
+# Micro-benchmark of the alignment check on a synthetic VGA frame
+if __name__ == "__main__":
+    import timeit
+    img = np.random.randint(0, 80, (480, 640, 3), dtype = np.uint8)
+    img[200:280, 300:420] = 250
+    repeats = 200
+    for shape, data in [("480x640x3", img), ("480x640", cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))]:
+        t = timeit.timeit(lambda: alignment_stats(data, 0.6), number = repeats)/repeats
+        print(" alignment_stats "+shape+": {0:0.3f} ms".format(1000*t), alignment_stats(data, 0.6))
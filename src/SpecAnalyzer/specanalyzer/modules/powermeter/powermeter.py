@@ -14,6 +14,7 @@ the Free Software Foundation; either version 2 of the License, or
 '''
 
 import time
+import numpy as np
 #from gridedgeat import configuration
 try:
     from ThorlabsPM100 import ThorlabsPM100
@@ -21,26 +22,111 @@ try:
 except ImportError:
     pass
 
+# Approximate duration of one PM100 sample (s)
+sampleTime = 0.003
+
 class PowerMeter():
-    # Define connection to powermeter
-    def __init__(self, powermeterID):
+    # Define connection to powermeter. The VISA session is opened once
+    # and kept for all readings.
+    # averageCount: samples averaged by the PM100 for each reading
+    # (sampleTime each)
+    def __init__(self, powermeterID, averageCount = 1):
         self.powermeterID = powermeterID
+        self.rm = visa.ResourceManager()
+        self.inst = self.rm.open_resource(self.powermeterID, timeout=1000)
+        self.power_meter = ThorlabsPM100(inst=self.inst)
+        self.PM100Init = True
+        self.set_average_count(averageCount)
+
+    def __del__(self):
         try:
-            self.rm = visa.ResourceManager()
-            self.PM100Init = True
+            self.inst.close()
         except:
-            self.PM100Init = False
-        time.sleep(1)
-    
+            pass
+
+    def ask(self, command):
+        return self.inst.query(command)
+
+    def set_average_count(self, averageCount):
+        self.power_meter.sense.average.count = int(averageCount)
+        self.averageCount = int(averageCount)
+
     # Get power reading from powermeter
     def get_power(self):
-        inst = self.rm.open_resource(self.powermeterID, timeout=1)
-        power_meter = ThorlabsPM100(inst=inst)
-        return power_meter.read
+        return self.power_meter.read
 
     # Performs zero adjustment routine
     def zero(self):
-        inst = self.rm.open_resource(self.powermeterID, timeout=1)
-        power_meter = ThorlabsPM100(inst=inst)
-        power_meter.sense.correction.collect.zero.initiate()
+        self.power_meter.sense.correction.collect.zero.initiate()
         time.sleep(1)
+
+    # Readings every interval seconds (as long as stop() is False),
+    # as (timestamp, power). Each reading is averaged by the PM100 over
+    # about half the interval.
+    def stream(self, interval, stop = lambda: False):
+        self.set_average_count(max(1, int(0.5*interval/sampleTime)))
+        nextTime = time.time()
+        while not stop():
+            timestamp = time.time()
+            power = self.get_power()
+            yield timestamp, power
+            nextTime = max(nextTime + interval, time.time())
+            time.sleep(max(0, nextTime - time.time()))
+
+'''
+   PowerReadings
+   Last size readings (timestamp, power) in a ring buffer, with
+   mean and standard deviation of the readings in the buffer.
+'''
+class PowerReadings():
+    def __init__(self, size = 600):
+        self.timestamps = np.zeros(size)
+        self.powers = np.zeros(size)
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.next = 0
+        self.sum = 0.
+        self.sumSq = 0.
+
+    def append(self, timestamp, power):
+        if self.count == self.size:
+            old = self.powers[self.next]
+            self.sum -= old
+            self.sumSq -= old*old
+        else:
+            self.count += 1
+        self.timestamps[self.next] = timestamp
+        self.powers[self.next] = power
+        self.sum += power
+        self.sumSq += power*power
+        self.next = (self.next + 1) % self.size
+        # Sums are recomputed at each turn of the buffer (no rounding drift)
+        if self.next == 0:
+            self.sum = float(np.sum(self.powers))
+            self.sumSq = float(np.dot(self.powers, self.powers))
+
+    def __len__(self):
+        return self.count
+
+    def mean(self):
+        return self.sum/self.count if self.count > 0 else 0.
+
+    def std(self):
+        if self.count < 2:
+            return 0.
+        return float(np.sqrt(max(0., (self.sumSq - self.sum*self.sum/self.count)/(self.count - 1))))
+
+    # Readings in time order, as arrays (timestamps, powers)
+    def data(self):
+        order = (np.arange(self.count) + self.next - self.count) % self.size
+        return self.timestamps[order], self.powers[order]
+
+### This is only for testing ###
+if __name__ == "__main__":
+    readings = PowerReadings(5)
+    for i in range(8):
+        readings.append(i, float(i))
+    print(readings.data(), readings.mean(), readings.std())
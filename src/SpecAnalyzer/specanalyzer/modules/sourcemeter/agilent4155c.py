@@ -16,13 +16,14 @@ the Free Software Foundation; either version 2 of the License, or
 
 import visa, time
 import numpy as np
+from .visainstrument import VisaInstrument
 
-class Agilent4155c(object):
+class Agilent4155c(VisaInstrument):
     '''
     SourceMeter Class
         - Agilent 4155C Semiconductor Parameter Analyzer
     '''
-    def __init__(self, visa_string):
+    def __init__(self, visa_string, binary = True):
         self.manager = visa.ResourceManager().open_resource(visa_string)
         #self.manager = visa.ResourceManager('@py').open_resource(visa_string)
         print(self.ask("*IDN?"))
@@ -51,6 +52,7 @@ class Agilent4155c(object):
         time.sleep(0.5)
         self.voltage_limit = 100.
         self.current_limit = 1.
+        self.set_data_format(binary)
 
     def __del__(self):
         try:
@@ -84,18 +86,35 @@ class Agilent4155c(object):
         self.write(":PAGE:SCON:SING")
         self.write("*WAI")
 
+    # Select data transfer format: binary (REAL,64 little endian) or ASCII
+    def set_data_format(self, binary):
+        self.binary = binary
+        if binary:
+            self.write(":FORM:DATA REAL,64")
+            self.write(":FORM:BORD SWAP")
+        else:
+            self.write(":FORM:DATA ASC")
+
+    def query_values(self, command):
+        if self.binary:
+            try:
+                return self.manager.query_binary_values(command, datatype='d',
+                        is_big_endian=False, container=np.array)
+            except Exception as e:
+                print("Binary transfer failed, falling back to ASCII:", e)
+                self.clear_buffer()
+                self.write("*CLS")
+                self.set_data_format(False)
+        return self.manager.query_ascii_values(command, container=np.array)
+
+    # The 4155C returns one variable per query: currents and voltages are read separately
     def read_sweep_values(self, area, pv):
-        self.write(":FORM:DATA ASC")
         self.write(":PAGE:GLIS")
         self.write(":PAGE:GLIS:SCAL:AUTO ONCE")
 
-        I_data = self.manager.query_ascii_values(":DATA? 'ID' ")
-        V_data = self.manager.query_ascii_values(":DATA? 'VD' ")
-        I_data = [1e4*i/float(area) for i in I_data]
-        if pv == True:
-            I_data = [-1*i for i in I_data]
-        else:
-            pass
+        I_data = self.query_values(":DATA? 'ID' ")
+        V_data = self.query_values(":DATA? 'VD' ")
+        I_data = (-1e4 if pv == True else 1e4)/float(area)*I_data
         return V_data, I_data
 
     ### These are wrappers for common use with Keithley 2400
@@ -139,6 +158,11 @@ class Agilent4155c(object):
         data = self.read_sweep_values(area, pv)
         return data[0][0], data[1][0]
 
+    # Stop a running measurement and clear errors
+    def abort(self):
+        self.write(":PAGE:SCON:STOP")
+        self.write("*CLS")
+
     def on(self):
         pass
     
@@ -16,14 +16,16 @@ the Free Software Foundation; either version 2 of the License, or
 
 '''
 import visa
+import numpy as np
+from .visainstrument import VisaInstrument
 
-class Keithley2400(object):
+class Keithley2400(VisaInstrument):
     '''
     SourceMeter Class
         - Keithley 2400
         - command manual: http://research.physics.illinois.edu/bezryadin/labprotocol/Keithley2400Manual.pdf
     '''
-    def __init__(self, visa_string):
+    def __init__(self, visa_string, binary = True):
         self.manager = visa.ResourceManager().open_resource(visa_string) 
         print(self.ask('*IDN?'))
         # for safety
@@ -37,6 +39,7 @@ class Keithley2400(object):
         self.set_mode('VOLT')
         self.write('SYSTEM:BEEP:STATE OFF')
         self.write('FORM:ELEM VOLT,CURR')
+        self.set_data_format(binary)
 
     def __del__(self):
         try:
@@ -56,6 +59,28 @@ class Keithley2400(object):
     def ask(self, command):
         return self.manager.query(command)
 
+    # Select data transfer format: binary or ASCII.
+    # The 2400 supports single precision only (REAL,32), byte order is set to little endian
+    def set_data_format(self, binary):
+        self.binary = binary
+        if binary:
+            self.write('FORM:DATA REAL,32')
+            self.write('FORM:BORD SWAP')
+        else:
+            self.write('FORM:DATA ASC')
+
+    def query_values(self, command):
+        if self.binary:
+            try:
+                return self.manager.query_binary_values(command, datatype='f',
+                        is_big_endian=False, container=np.array).astype(float)
+            except Exception as e:
+                print('Binary transfer failed, falling back to ASCII:', e)
+                self.clear_buffer()
+                self.write('*CLS')
+                self.set_data_format(False)
+        return self.manager.query_ascii_values(command, container=np.array)
+
     ## keithley api
     def get_mode(self, key):
         if key.upper() == 'SOURCE':
@@ -119,12 +144,78 @@ class Keithley2400(object):
                 print('Warning: Compliance Reached!!')
                 self.write('SOUR:CURR {:f}'.format(self.current_limit))
 
-    def read_values(self, area, pv):
-        data = list(map(float, self.ask(':READ?').split(',')))
-        if pv == True:
-            data[1] = -1*data[1]/float(area)
+    def sweep(self, start, end, step, gate, hold_time):
+        """
+        Linear voltage sweep run by the instrument trigger model.
+        The hold time is applied as source delay, readings are stored in
+        the trace buffer and retrieved with read_sweep_values.
+        Gate is ignored (no third SMU); kept for compatibility with Agilent4155c.
+        """
+        if step == 0:
+            num_points = 1
         else:
-            data[1] = data[1]/float(area)
+            num_points = int(round(abs((end - start)/step))) + 1
+        if num_points > 2500:
+            raise ValueError('Sweep exceeds the 2500 points of the buffer')
+        end = start + np.sign(end - start)*abs(step)*(num_points - 1)
+        if max(abs(start), abs(end)) > self.voltage_limit:
+            print('Warning: Compliance Reached!!')
+            start = np.clip(start, -self.voltage_limit, self.voltage_limit)
+            end = np.clip(end, -self.voltage_limit, self.voltage_limit)
+        if self.get_mode('source') != 'VOLT':
+            self.set_mode('VOLT')
+
+        self.write('*CLS')
+        self.write('TRAC:CLE')
+        self.write('TRAC:POIN {:d}'.format(num_points))
+        self.write('TRAC:FEED SENS')
+        self.write('TRAC:FEED:CONT NEXT')
+        self.write('SOUR:VOLT:STAR {:f}'.format(start))
+        self.write('SOUR:VOLT:STOP {:f}'.format(end))
+        self.write('SOUR:SWE:POIN {:d}'.format(num_points))
+        self.write('SOUR:SWE:SPAC LIN')
+        self.write('SOUR:SWE:RANG BEST')
+        self.write('SOUR:VOLT:MODE SWE')
+        self.write('SOUR:DEL {:f}'.format(float(hold_time)))
+        self.write('TRIG:COUN {:d}'.format(num_points))
+        self.write('INIT')
+        self.sweep_points = num_points
+        self.sweep_time = num_points*float(hold_time)
+
+    def read_sweep_values(self, area, pv):
+        """
+        Wait for the sweep to complete and read the whole trace buffer
+        with a single query. Returns voltages and current densities.
+        """
+        timeout = self.manager.timeout
+        try:
+            self.manager.timeout = max(timeout or 0, 1000*(2*self.sweep_time + 10))
+            self.ask('*OPC?')
+            data = self.query_values('TRAC:DATA?')
+        finally:
+            self.manager.timeout = timeout
+            self.end_sweep()
+        V_data = data[0::2]
+        I_data = (-1. if pv == True else 1.)/float(area)*data[1::2]
+        return V_data, I_data
+
+    # Bring trigger model and source back to fixed, single-point operation
+    def end_sweep(self):
+        self.write('TRAC:FEED:CONT NEV')
+        self.write('TRIG:COUN 1')
+        self.write('SOUR:DEL 0')
+        self.write('SOUR:VOLT:MODE FIX')
+
+    # Abort a running sweep (trigger model back to idle), clear errors
+    # and go back to single-point operation
+    def abort(self):
+        self.write('ABOR')
+        self.write('*CLS')
+        self.end_sweep()
+
+    def read_values(self, area, pv):
+        data = self.query_values(':READ?')
+        data[1] = (-1. if pv == True else 1.)*data[1]/float(area)
         return data
 
     def on(self):
@@ -141,10 +232,8 @@ if __name__ == '__main__':
     sc.set_limit(voltage=10, current=0.12)
     sc.on()
 
-    #sc.sweep(np.arange(0, 5, 0.1))
-    #while sc.busy:
-    #    time.sleep(0.5)
-    #print(sc.read_buffer()[-1])
+    sc.sweep(0, 5, 0.1, 0, 0.01)
+    print(sc.read_sweep_values(1,True))
     print("Voltage:",sc.read_values(1,True)[0]," Current:",sc.read_values(1,True)[1])
     pass
 
@@ -0,0 +1,263 @@
+'''
+simulator.py
+-------------
+Class providing a simulated sourcemeter with the same interface
+of Keithley2400 and Agilent4155c. The device under test is a
+solar cell described by the single-diode model.
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import time
+import numpy as np
+
+class SimulatedSourcemeter(object):
+    '''
+    SourceMeter Class
+        - Simulated sourcemeter, no hardware needed
+        - Single diode model (generator convention, densities per cm2):
+            J = Jph - J0*(exp((V+J*Rs)/(n*Ncells*kT/q)) - 1) - (V+J*Rs)/Rsh
+        - Model current densities are in mA/cm2, voltages in V, resistances
+          in Ohm*cm2. Readings are in A divided by the area, as for the
+          instruments (read_values, read_sweep_values)
+        - irradiance: incident power density [W/cm2, the units of V*J of the
+          readings], e.g. the configured irradiance used for the PCE.
+          jph is the photocurrent density at 1 sun (0.1 W/cm2) and scales
+          linearly with the irradiance (set_irradiance)
+        - area: device area [cm2]. The simulated device takes the area of
+          each reading (read_values, read_sweep_values), so that the current
+          scales with it and the current density does not depend on it
+        - hysteresis: fraction of the previous bias seen by the junction.
+          It relaxes towards the applied bias with time constant hysteresis_tau [s]
+        - noise: standard deviation of the current density noise [mA/cm2]
+        - latency: bus latency per command [s]
+        - timescale: scaling of hold times and delays (0: no waiting)
+    '''
+    def __init__(self, visa_string = "SIM::INSTR", jph = 20., j0 = 1e-8,
+                 ideality = 1.5, ncells = 1, rs = 2., rsh = 1000., area = 1.,
+                 irradiance = 0.1,
+                 noise = 0.01, hysteresis = 0.05, hysteresis_tau = 5.,
+                 latency = 0.005, timescale = 1., temperature = 298.15):
+        self.visa_string = visa_string
+        self.jph_1sun = jph
+        self.irradiance = irradiance
+        self.jph = jph*irradiance/0.1
+        self.j0 = j0
+        self.nVt = ideality*ncells*1.380649e-23*temperature/1.602176634e-19
+        self.rs = rs
+        self.rsh = rsh
+        self.area = area
+        self.noise = noise
+        self.hysteresis = hysteresis
+        self.hysteresis_tau = hysteresis_tau
+        self.latency = latency
+        self.timescale = timescale
+        self.rng = np.random.default_rng()
+
+        self.voltage_limit = 100.
+        self.current_limit = 1.
+        self.mode = 'VOLT'
+        self.output = False
+        self.bias = 0.
+        self.v_junction = 0.
+        self.t_junction = time.time()
+        self.sweep_list = np.zeros(0)
+        self.sweep_hold_time = 0.
+        self.sweep_start = time.time()
+        self.num_commands = 0
+        self.make_table()
+        print(self.ask("*IDN?"))
+
+    # Photocurrent follows the irradiance [W/cm2]
+    def set_irradiance(self, irradiance):
+        self.irradiance = float(irradiance)
+        self.jph = self.jph_1sun*self.irradiance/0.1
+        self.make_table()
+
+    # Tabulate the JV curve as a function of the junction voltage: the model
+    # is explicit in the junction voltage and V is monotonic in it.
+    def make_table(self, vmax = 25., points = 50001):
+        vd = np.linspace(-vmax, vmax, points)
+        j = self.jph - self.j0*np.expm1(np.minimum(vd/self.nVt, 700.)) - 1e3*vd/self.rsh
+        self.table_v = vd - 1e-3*j*self.rs
+        self.table_j = j
+
+    ## common visa api wrappers
+    # Only latency and command count are emulated
+    def write(self, command):
+        self.num_commands += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+    def read(self):
+        return ""
+    def ask(self, command):
+        self.write(command)
+        if command == "*IDN?":
+            return "SpecAnalyzer,Simulated Sourcemeter,0,"+self.visa_string
+        return self.read()
+
+    ## device model
+    # Track the bias history for hysteresis.
+    # elapsed: time spent at the previous bias, measured from the clock if None
+    def apply_bias(self, voltage, elapsed = None):
+        now = time.time()
+        if elapsed is None:
+            elapsed = now - self.t_junction
+        self.t_junction = now
+        decay = np.exp(-elapsed/self.hysteresis_tau) if self.hysteresis_tau > 0 else 0.
+        self.v_junction = voltage + (self.v_junction - voltage)*decay
+        self.bias = voltage
+
+    # Measured current density [mA/cm2] (load convention, as seen by the
+    # instrument). v_junction: junction voltage(s), current one if None
+    def current_density(self, voltage, v_junction = None):
+        voltage = np.asarray(voltage, dtype=float)
+        if v_junction is None:
+            v_junction = self.v_junction
+        v_eff = voltage + self.hysteresis*(v_junction - voltage)
+        j = -np.interp(v_eff, self.table_v, self.table_j)
+        if self.noise > 0:
+            j = j + self.rng.normal(0., self.noise, j.shape)
+        return j
+
+    # Voltage at a given current density (load convention)
+    def voltage(self, j):
+        return float(np.interp(-j, self.table_j[::-1], self.table_v[::-1]))
+
+    def wait(self, seconds):
+        if self.timescale > 0 and seconds > 0:
+            time.sleep(self.timescale*seconds)
+
+    ## sourcemeter api
+    def get_mode(self, key):
+        if key.upper() == 'SOURCE':
+            return self.mode
+        else:
+            return 'CURR' if self.mode == 'VOLT' else 'VOLT'
+
+    def set_mode(self, mode):
+        abv_mode = mode[0:4].upper()
+        if abv_mode in ['VOLT', 'CURR']:
+            self.mode = abv_mode
+        else:
+            raise ValueError('Wrong mode!')
+        self.write('SOUR:FUNC {}'.format(self.mode))
+
+    def set_limit(self, voltage = None, current = None):
+        if voltage != None:
+            self.write('SENS:VOLT:PROT {}'.format(voltage))
+            self.voltage_limit = 10. if voltage == 'MAX' else voltage
+        if current != None:
+            self.write('SENS:CURR:PROT {}'.format(current))
+            self.current_limit = 1. if current == 'MAX' else current
+
+    def set_output(self, voltage = None, current = None):
+        if voltage != None:
+            if self.get_mode('source') != 'VOLT':
+                self.set_mode('VOLT')
+            voltage = min(voltage, self.voltage_limit)
+            self.write('SOUR:VOLT {:f}'.format(voltage))
+            self.apply_bias(voltage)
+        elif current != None:
+            if self.get_mode('source') != 'CURR':
+                self.set_mode('CURR')
+            current = min(current, self.current_limit)
+            self.write('SOUR:CURR {:f}'.format(current))
+            self.apply_bias(self.voltage(1e3*current/self.area))
+            self.source_current = current
+
+    # Single point reading: [V, I/area], I in A
+    def read_values(self, area, pv):
+        self.area = float(area)
+        self.ask(':READ?')
+        if not self.output:
+            return np.zeros(2)
+        if self.mode == 'VOLT':
+            j = 1e-3*float(self.current_density(self.bias))
+        else:
+            j = self.source_current/self.area
+        data = np.array([self.bias, j])
+        data[1] = (-1. if pv == True else 1.)*data[1]
+        return data
+
+    def sweep(self, start, end, step, gate, hold_time):
+        if step == 0:
+            num_points = 1
+        else:
+            num_points = int(round(abs((end - start)/step))) + 1
+        end = start + np.sign(end - start)*abs(step)*(num_points - 1)
+        self.write('SOUR:VOLT:STAR {:f}'.format(start))
+        self.write('SOUR:VOLT:STOP {:f}'.format(end))
+        self.write('INIT')
+        self.sweep_list = np.clip(np.linspace(start, end, num_points),
+                -self.voltage_limit, self.voltage_limit)
+        self.sweep_hold_time = float(hold_time)
+        self.sweep_start = time.time()
+
+    # Junction voltages along a sweep with constant step and hold time.
+    # At each point the junction relaxes towards the bias by decay
+    # (apply_bias): the lag e[i] = d*(e[i-1] - step) has the closed form
+    # e[i] = e_inf + (e[0] - e_inf)*d**i, with e_inf = -d*step/(1-d).
+    def sweep_junction(self, V_data):
+        if self.hysteresis_tau > 0:
+            decay = np.exp(-self.sweep_hold_time/self.hysteresis_tau)
+        else:
+            decay = 0.
+        if decay >= 1.:
+            v_junction = np.full(V_data.shape, self.v_junction)
+        else:
+            step = V_data[1] - V_data[0] if V_data.size > 1 else 0.
+            e_0 = decay*(self.v_junction - V_data[0])
+            e_inf = -decay*step/(1. - decay)
+            v_junction = V_data + e_inf + (e_0 - e_inf)*decay**np.arange(V_data.size)
+        self.v_junction = float(v_junction[-1])
+        self.bias = float(V_data[-1])
+        self.t_junction = time.time()
+        return v_junction
+
+    # The sweep runs from its start (as on the instrument): only the
+    # remaining time is waited. Readings: V, I/area (I in A)
+    def read_sweep_values(self, area, pv):
+        self.area = float(area)
+        if self.timescale > 0:
+            remaining = self.sweep_start + self.timescale*len(self.sweep_list)*self.sweep_hold_time - time.time()
+            self.wait(remaining/self.timescale)
+        self.ask('TRAC:DATA?')
+        V_data = self.sweep_list
+        I_data = np.zeros(V_data.shape)
+        if self.output and V_data.size > 0:
+            I_data = 1e-3*self.current_density(V_data, self.sweep_junction(V_data))
+        I_data = (-1. if pv == True else 1.)*I_data
+        return V_data, I_data
+
+    # Abort a running sweep and clear errors
+    def abort(self):
+        self.write('ABOR')
+        self.write('*CLS')
+        self.sweep_list = np.zeros(0)
+
+    def on(self):
+        self.write('OUTP ON')
+        self.output = True
+
+    def off(self):
+        self.write('OUTP OFF')
+        self.output = False
+
+### This is only for testing ###
+if __name__ == '__main__':
+    sc = SimulatedSourcemeter(timescale = 0)
+    sc.set_limit(voltage=20., current=1.)
+    sc.on()
+    sc.set_output(current = 0.)
+    print("Voc:",sc.read_values(1,True)[0])
+    sc.set_output(voltage = 0.)
+    print("Jsc [A/cm2]:",sc.read_values(1,True)[1])
+    sc.sweep(-0.2, 0.8, 0.05, 0, 0.01)
+    print(sc.read_sweep_values(1,True))
+    print("Commands sent:", sc.num_commands)
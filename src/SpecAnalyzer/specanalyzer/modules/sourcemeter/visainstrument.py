@@ -0,0 +1,38 @@
+'''
+visainstrument.py
+-------------
+Helpers shared by the sourcemeters connected through VISA
+(Keithley2400, Agilent4155c)
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+
+class VisaInstrument(object):
+    '''
+    VISA Instrument Class
+        - Base class of the VISA drivers: self.manager is the VISA resource
+    '''
+    # Discard a pending response (e.g. the rest of a failed binary transfer),
+    # so that it is not read as the answer to the next query: device clear,
+    # or reading until the buffer is empty if not supported
+    def clear_buffer(self):
+        try:
+            self.manager.clear()
+            return
+        except Exception:
+            pass
+        timeout = self.manager.timeout
+        try:
+            self.manager.timeout = 200
+            while True:
+                self.manager.read_raw()
+        except Exception:
+            pass
+        finally:
+            self.manager.timeout = timeout
@@ -0,0 +1,122 @@
+'''
+mppt.py
+-------------
+Maximum power point tracking (MPPT) strategies used during
+tracking. No hardware access: the instrument is driven through
+the functions passed to track().
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import numpy as np
+
+'''
+   MPPT strategies
+   Each strategy holds the operating voltage and updates it at every sample.
+   track(measure, sweep) returns voltage and current density at the new
+   operating point:
+    measure(v): current density at voltage v
+    sweep(v_start, v_end, v_step): arrays of voltages and current densities
+   Power is maximised in the quadrant of the initial MPP (sign of Vmpp*Jmpp).
+'''
+class FixedVoltage():
+    def __init__(self, vmpp, jmpp, step):
+        self.v = float(vmpp)
+        self.step = abs(float(step))
+        self.sign = 1. if vmpp*jmpp >= 0 else -1.
+
+    def power(self, v, j):
+        return self.sign*v*j
+
+    # Hold Vmpp from the initial JV
+    def track(self, measure, sweep):
+        return self.v, measure(self.v)
+
+# Perturb and observe: step in the same direction while power increases
+class PerturbObserve(FixedVoltage):
+    def __init__(self, vmpp, jmpp, step):
+        super(PerturbObserve, self).__init__(vmpp, jmpp, step)
+        self.direction = 1.
+        self.p_last = None
+
+    def track(self, measure, sweep):
+        v = self.v + self.direction*self.step
+        j = measure(v)
+        p = self.power(v, j)
+        if self.p_last is not None and p < self.p_last:
+            self.direction = -self.direction
+        self.v, self.p_last = v, p
+        return v, j
+
+# Incremental conductance: dP/dV = J + V*dJ/dV from the last two samples.
+# The voltage is held when |dP/dV| is below tolerance*|J|.
+class IncrementalConductance(FixedVoltage):
+    def __init__(self, vmpp, jmpp, step, tolerance = 0.05):
+        super(IncrementalConductance, self).__init__(vmpp, jmpp, step)
+        self.tolerance = tolerance
+        self.direction = 1.
+        self.last = None
+
+    def track(self, measure, sweep):
+        v = self.v
+        j = measure(v)
+        if self.last is None or v == self.last[0]:
+            # no slope available: probe the next voltage
+            self.v = v + self.direction*self.step
+        else:
+            dPdV = self.sign*(j + v*(j - self.last[1])/(v - self.last[0]))
+            if abs(dPdV) > self.tolerance*abs(j):
+                self.direction = 1. if dPdV > 0 else -1.
+                self.v = v + self.direction*self.step
+        self.last = (v, j)
+        return v, j
+
+# Mini-sweep: short sweep of a few points around Vmpp at every sample,
+# the operating voltage moves to the point with the highest power.
+class MiniSweep(FixedVoltage):
+    def __init__(self, vmpp, jmpp, step, points = 5):
+        super(MiniSweep, self).__init__(vmpp, jmpp, step)
+        self.points = points
+
+    def track(self, measure, sweep):
+        half = self.step*((self.points-1)//2)
+        V, J = sweep(self.v - half, self.v + half, self.step)
+        ind = int(np.argmax(self.power(np.asarray(V), np.asarray(J))))
+        self.v = float(V[ind])
+        return self.v, float(J[ind])
+
+# Names as shown in the Acquisition panel and stored in configuration
+mpptStrategies = {'Perturb and Observe' : PerturbObserve,
+                'Incremental Conductance' : IncrementalConductance,
+                'Mini-sweep' : MiniSweep,
+                'Fixed Vmpp' : FixedVoltage}
+mpptNames = ['Perturb and Observe', 'Incremental Conductance', 'Mini-sweep', 'Fixed Vmpp']
+
+# Create the MPPT strategy from its name
+def getMPPTracker(name, vmpp, jmpp, step):
+    if name not in mpptStrategies:
+        raise ValueError('Unknown MPPT strategy: '+str(name))
+    return mpptStrategies[name](vmpp, jmpp, step)
+
+### This is only for testing ###
+# Tracking on the simulated sourcemeter for all strategies
+if __name__ == '__main__':
+    from .modules.sourcemeter.simulator import SimulatedSourcemeter
+    for name in mpptNames:
+        sc = SimulatedSourcemeter(timescale = 0, latency = 0, noise = 0.)
+        sc.on()
+        def measure(v):
+            sc.set_output(voltage = v)
+            return sc.read_values(1, True)[1]
+        def sweep(v_start, v_end, v_step):
+            sc.sweep(v_start, v_end, v_step, 0, 0)
+            return sc.read_sweep_values(1, True)
+        tracker = getMPPTracker(name, 0.5, 0.015, 0.01)
+        for n in range(50):
+            v, j = tracker.track(measure, sweep)
+        print("{0:25s} V: {1:0.3f}, P: {2:0.5f}, commands: {3:d}".format(name, v, v*j, sc.num_commands))
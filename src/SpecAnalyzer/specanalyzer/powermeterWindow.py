@@ -12,11 +12,12 @@ the Free Software Foundation; either version 2 of the License, or
 (at your option) any later version.
 
 '''
-
+import threading
 from PyQt5.QtCore import (QRect,QThread, pyqtSlot, pyqtSignal)
 from PyQt5.QtWidgets import (QLabel, QLineEdit, QWidget, QMainWindow,
             QPushButton, QApplication,QMessageBox)
 from .modules.powermeter.powermeter import *
+from .instruments import *
 from . import logger
 
 class PowermeterWindow(QMainWindow):
@@ -76,6 +77,7 @@ class PowermeterWindow(QMainWindow):
         self.irradiance = self.parent().config.irradiance1Sun
         self.powerMeterDefaultText.textEdited.connect(self.setIrradianceManually)
         self.powerMeterSensorAreaText.textEdited.connect(self.setIrradianceManually)
+        self.parent().config.addListener(self.configChanged)
 
     # Logic to stop powermeter acquisition
     def stopPMAcq(self):
@@ -96,18 +98,20 @@ class PowermeterWindow(QMainWindow):
         self.powerMeterLabel.setText("Activating powermeter...")
         self.powerMeterLabel2.setText("")
         self.pmThread = powermeterThread(self, self.parent().config.powermeterID)
-        self.pmThread.pmResponse.connect(lambda curr, av, flag: self.printMsg(curr, av, flag))
+        self.pmThread.pmResponse.connect(self.printMsg)
         self.pmThread.start()
 
     # Stop acquisition upon closing the powermeter window
     def closeEvent(self, event):
         self.stopPMAcq()
 
-    def printMsg(self, curr, av, flag):
+    # av, std: mean and standard deviation of the last readings
+    def printMsg(self, curr, av, std, flag):
         if flag is True:
-            self.irradiance = av/float(self.powerMeterSensorAreaText.text())
+            area = float(self.powerMeterSensorAreaText.text())
+            self.irradiance = av/area
             msg1 = "Power levels [mW]: {0:0.4f}".format(curr)
-            msg2 = "Average irradiance [mW/cm\u00B2]: {0:0.4f}".format(self.irradiance)
+            msg2 = "Average irradiance [mW/cm\u00B2]: {0:0.4f} \u00B1 {1:0.4f}".format(self.irradiance, std/area)
         if flag is False:
             msg1 = "Powermeter libraries or connection failed"
             msg2 = ""
@@ -132,11 +136,9 @@ class PowermeterWindow(QMainWindow):
         ret = msgBox.exec_()
 
         if ret == QMessageBox.Yes:
-            self.parent().config.conf['Instruments']['irradiance1Sun'] = "{0:0.4f}".format(self.irradiance)
-            self.parent().config.conf['Instruments']['irradianceSensorArea'] = self.powerMeterSensorAreaText.text()
-            with open(self.parent().config.configFile, 'w') as configfile:
-                self.parent().config.conf.write(configfile)
-            self.parent().config.readConfig(self.parent().config.configFile)
+            self.parent().config.update({'irradiance1Sun' : "{0:0.4f}".format(self.irradiance),
+                    'irradianceSensorArea' : self.powerMeterSensorAreaText.text()})
+            self.parent().config.flush()
             self.powerMeterDefaultText.setText("{0:0.4f}".format(self.irradiance))
             print(" New irradiance settings saved as default.")
             logger.info(" New irradiance settings saved as default.")
@@ -146,41 +148,54 @@ class PowermeterWindow(QMainWindow):
             return False
     
     # Save new irradiance upon changing manually the default irradiance in the powermeter panel
+    # (written to file once typing stops; incomplete numbers are not saved)
     def setIrradianceManually(self):
-        self.parent().config.conf['Instruments']['irradiance1Sun'] = self.powerMeterDefaultText.text()
-        self.parent().config.conf['Instruments']['irradianceSensorArea'] = self.powerMeterSensorAreaText.text()
-        with open(self.parent().config.configFile, 'w') as configfile:
-                self.parent().config.conf.write(configfile)
-        self.parent().config.readConfig(self.parent().config.configFile)
+        try:
+            self.parent().config.update({'irradiance1Sun' : self.powerMeterDefaultText.text(),
+                    'irradianceSensorArea' : self.powerMeterSensorAreaText.text()})
+        except ValueError:
+            pass
+
+    # Show irradiance settings changed elsewhere
+    def configChanged(self, key, value):
+        fields = {'irradiance1Sun' : self.powerMeterDefaultText,
+                'irradianceSensorArea' : self.powerMeterSensorAreaText}
+        if key in fields:
+            try:
+                if float(fields[key].text()) == value:
+                    return
+            except ValueError:
+                pass
+            fields[key].setText(str(value))
         
 # Acquisition takes place in a separate thread
+# Readings are averaged over the last numReadings (in mW)
 class powermeterThread(QThread):
-    pmResponse = pyqtSignal(float, float, bool)
+    pmResponse = pyqtSignal(float, float, float, bool)
     
-    def __init__(self, parent_obj, powermeterID):
+    def __init__(self, parent_obj, powermeterID, numReadings = 600):
         QThread.__init__(self)
         self.parent_obj = parent_obj
         self.powermeterID = powermeterID
-        self.avPower = 1
+        self.readings = PowerReadings(numReadings)
+        self.stopEvent = threading.Event()
 
     def __del__(self):
         self.wait()
 
+    # The loop ends at the next reading, the powermeter stays connected
     def stop(self):
-        self.terminate()
+        self.stopEvent.set()
+        self.wait()
 
     def run(self):
         try:
-            self.pm = PowerMeter(self.powermeterID)
-            self.pm.zero()
-            self.avPower = 1000*self.pm.get_power()
-            numAver = 1
-            while True:
-                curPower = 1000*self.pm.get_power()
-                self.avPower = (self.avPower*numAver + curPower)/(numAver+1)
-                self.pmResponse.emit(curPower,self.avPower,True)
-                numAver += 1
-                time.sleep(float(self.parent_obj.powerMeterRefreshText.text()))
+            with instrumentManager.leasePowermeter(self.powermeterID, timeout = 1) as self.pm:
+                self.pm.zero()
+                interval = float(self.parent_obj.powerMeterRefreshText.text())
+                for timestamp, power in self.pm.stream(interval, self.stopEvent.is_set):
+                    self.readings.append(timestamp, 1000*power)
+                    self.pmResponse.emit(1000*power, self.readings.mean(), self.readings.std(), True)
         except:
-            self.pmResponse.emit(0, 0, False)
+            self.pmResponse.emit(0, 0, 0, False)
 
@@ -12,23 +12,27 @@ the Free Software Foundation; either version 2 of the License, or
 (at your option) any later version.
 
 '''
-import sys, random, math, json
+import sys, os, random, math, json
+from concurrent.futures import ThreadPoolExecutor
 #import requests, webbrowser
 import numpy as np
 import pandas as pd
 from datetime import datetime
 from PyQt5.QtWidgets import (QMainWindow,QPushButton,QVBoxLayout,QFileDialog,QWidget,
                              QGridLayout,QGraphicsView,QLabel,QComboBox,QLineEdit,
-                             QMenuBar,QStatusBar, QApplication,QTableWidget,
-                             QTableWidgetItem,QAction,QHeaderView,QMenu,QCheckBox,
-                             QHBoxLayout,QAbstractItemView)
-from PyQt5.QtCore import (QSize,QRect,pyqtSlot,Qt)
-from PyQt5.QtGui import (QColor,QCursor)
+                             QMenuBar,QStatusBar, QApplication,QTableView,
+                             QAction,QHeaderView,QMenu,QCheckBox,
+                             QHBoxLayout,QAbstractItemView,QProgressBar)
+from PyQt5.QtCore import (QSize,QRect,pyqtSlot,pyqtSignal,Qt,QTimer,QThread,
+                             QAbstractTableModel,QModelIndex,QSortFilterProxyModel)
+from PyQt5.QtGui import (QColor,QCursor,QBrush)
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 import matplotlib.pyplot as plt
 
 from . import logger
+from .dataIO import *
+from .catalog import *
 
 '''
    Results Window
@@ -36,14 +40,19 @@ from . import logger
 class ResultsWindow(QMainWindow):
     def __init__(self, parent=None):
         super(ResultsWindow, self).__init__(parent)
-        self.deviceID = np.zeros((0,1))
-        self.perfData = np.zeros((0,9))
+        self.deviceID = ""
+        self.perfData = np.zeros(0, dtype = perfDataDtype)
         self.JV = np.array([])
+        self.results = ResultStore()
+        self.saveQueue = SaveQueue()
+        self.csvLoader = None
+        self.catalogIndexer = None
         self.setupDataFrame()
         self.csvFolder = self.parent().config.csvSavingFolder
         self.initUI()
         self.initPlots(self.perfData)
         self.initJVPlot()
+        self.initLivePlots()
         self.show()
     
     # Define UI elements
@@ -119,25 +128,37 @@ class ResultsWindow(QMainWindow):
 
         self.resTableW = 1100
         self.resTableH = 145
-        self.resTableWidget = QTableWidget(self.centralwidget)
-        self.resTableWidget.setGeometry(QRect(20, 770, self.resTableW, self.resTableH))
-        self.resTableWidget.setColumnCount(10)
-        self.resTableWidget.setRowCount(0)
-        self.resTableWidget.setItem(0,0, QTableWidgetItem(""))
-        self.resTableWidget.setHorizontalHeaderItem(0,QTableWidgetItem("Device ID"))
-        self.resTableWidget.setHorizontalHeaderItem(1,QTableWidgetItem("Voc [V]"))
-        self.resTableWidget.setHorizontalHeaderItem(2,QTableWidgetItem(u"Jsc [mA/cm\u00B2]"))
-        self.resTableWidget.setHorizontalHeaderItem(3,QTableWidgetItem(u"VPP [V]"))
-        self.resTableWidget.setHorizontalHeaderItem(4,QTableWidgetItem(u"MPP [mW/cm\u00B2]"))
-        self.resTableWidget.setHorizontalHeaderItem(5,QTableWidgetItem("FF"))
-        self.resTableWidget.setHorizontalHeaderItem(6,QTableWidgetItem("PCE [%]"))
-        self.resTableWidget.setHorizontalHeaderItem(7,QTableWidgetItem("Tracking time [s]"))
-        self.resTableWidget.setHorizontalHeaderItem(8,QTableWidgetItem("Acq Date"))
-        self.resTableWidget.setHorizontalHeaderItem(9,QTableWidgetItem("Acq Time"))
-        self.resTableWidget.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.resTableWidget.setSelectionBehavior(QAbstractItemView.SelectRows)
-
-        self.resTableWidget.itemClicked.connect(self.onCellClick)
+        # Results are stored in resTableModel (rows in acquisition order).
+        # The view shows them through a proxy model for sorting and filtering.
+        self.resTableModel = ResultsTableModel(self)
+        self.resTableProxy = QSortFilterProxyModel(self)
+        self.resTableProxy.setSourceModel(self.resTableModel)
+        self.resTableProxy.setSortRole(Qt.UserRole)
+        self.resTableProxy.setFilterKeyColumn(0)
+        self.resTableProxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+        self.resFilterText = QLineEdit(self.centralwidget)
+        self.resFilterText.setGeometry(QRect(20, 745, 300, 22))
+        self.resFilterText.setPlaceholderText("Filter by Device ID")
+        self.resFilterText.setClearButtonEnabled(True)
+        self.resFilterText.textChanged.connect(self.resTableProxy.setFilterFixedString)
+
+        # Search of saved data in the catalog, matching files are loaded
+        self.catalogSearchText = QLineEdit(self.centralwidget)
+        self.catalogSearchText.setGeometry(QRect(340, 745, 500, 22))
+        self.catalogSearchText.setPlaceholderText("Search saved data (e.g. cell* pce>15 since:2026-09-01 tracking)")
+        self.catalogSearchText.setClearButtonEnabled(True)
+        self.catalogSearchText.returnPressed.connect(self.searchCatalog)
+
+        self.resTableView = QTableView(self.centralwidget)
+        self.resTableView.setGeometry(QRect(20, 770, self.resTableW, self.resTableH))
+        self.resTableView.setModel(self.resTableProxy)
+        self.resTableView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.resTableView.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.resTableView.setSortingEnabled(True)
+        self.resTableView.setSelectionBehavior(QAbstractItemView.SelectRows)
+
+        self.resTableView.clicked.connect(self.onCellClick)
         self.setCentralWidget(self.centralwidget)
 
         # Make Menu for plot related calls
@@ -151,11 +172,18 @@ class ResultsWindow(QMainWindow):
         self.saveAllMenu = QAction("&Save All", self)
         self.saveAllMenu.setShortcut("Ctrl+Shift+s")
         self.saveAllMenu.setStatusTip('Save all data into csv')
-        self.saveAllMenu.triggered.connect(lambda: self.selectDeviceSaveLocally(list(range(self.resTableWidget.rowCount()))))
+        self.saveAllMenu.triggered.connect(lambda: self.selectDeviceSaveLocally(list(range(self.resTableModel.rowCount()))))
+        self.saveArchiveMenu = QAction("Save All as &Archive...", self)
+        self.saveArchiveMenu.setShortcut("Ctrl+Shift+a")
+        self.saveArchiveMenu.setStatusTip('Save all data into a single archive (npz)')
+        self.saveArchiveMenu.triggered.connect(lambda: self.selectDeviceSaveArchive(list(range(self.resTableModel.rowCount()))))
         self.directoryMenu = QAction("&Set directory for saved files", self)
         self.directoryMenu.setShortcut("Ctrl+s")
         self.directoryMenu.setStatusTip('Set directory for saved files')
         self.directoryMenu.triggered.connect(self.set_dir_saved)
+        self.catalogMenu = QAction("&Update Catalog", self)
+        self.catalogMenu.setStatusTip('Add new and modified files in the directory for saved files to the catalog')
+        self.catalogMenu.triggered.connect(self.updateCatalog)
         
         self.clearMenu = QAction("&Clear Plots", self)
         self.clearMenu.setShortcut("Ctrl+x")
@@ -165,8 +193,10 @@ class ResultsWindow(QMainWindow):
         fileMenu = self.menuBar.addMenu('&File')
         fileMenu.addAction(self.loadMenu)
         fileMenu.addAction(self.saveAllMenu)
+        fileMenu.addAction(self.saveArchiveMenu)
         fileMenu.addSeparator()
         fileMenu.addAction(self.directoryMenu)
+        fileMenu.addAction(self.catalogMenu)
         plotMenu = self.menuBar.addMenu('&Plot')
         plotMenu.addAction(self.clearMenu)
         
@@ -175,13 +205,18 @@ class ResultsWindow(QMainWindow):
         self.statusbar = QStatusBar(self)
         self.statusbar.setObjectName("statusbar")
         self.setStatusBar(self.statusbar)
+        self.loadProgress = QProgressBar(self)
+        self.loadProgress.setMaximumWidth(300)
+        self.statusbar.addPermanentWidget(self.loadProgress)
+        self.loadProgress.hide()
 
     # Set directory for saved data
     def set_dir_saved(self):
-        self.csvFolder = str(QFileDialog.getExistingDirectory(self, "Select Directory"))
-        self.parent().config.conf['System']['csvSavingFolder'] = str(self.csvFolder)
-        self.parent().config.saveConfig(self.parent().config.configFile)
-        self.parent().config.readConfig(self.parent().config.configFile)
+        folder = str(QFileDialog.getExistingDirectory(self, "Select Directory"))
+        if folder == "":
+            return
+        self.csvFolder = folder
+        self.parent().config.set('csvSavingFolder', self.csvFolder)
         msg = "CSV Files will be saved in: "+self.csvFolder
         print(msg)
         logger.info(msg)
@@ -193,6 +228,11 @@ class ResultsWindow(QMainWindow):
     
     # Initialize Time-based plots
     def initPlots(self, data):
+        self.plotBackgrounds = {}
+        self.livePerfData = {}
+        self.liveDevice = None
+        self.liveDevicePinned = False
+        self.liveUpdated = False
         self.figureTJsc.clf()
         self.axTJsc = self.figureTJsc.add_subplot(111)
         self.plotSettings(self.axTJsc)
@@ -201,7 +241,7 @@ class ResultsWindow(QMainWindow):
         self.axTJsc.set_autoscale_on(True)
         self.axTJsc.autoscale_view(True,True,True)
         self.canvasTJsc.draw()
-        self.lineTJsc, = self.axTJsc.plot(data[:,0],data[:,2], '.-',linewidth=0.5)
+        self.lineTJsc, = self.axTJsc.plot(data['Time step'],data['Jsc'], '.-',linewidth=0.5)
         
         self.figureTVoc.clf()
         self.axTVoc = self.figureTVoc.add_subplot(111)
@@ -211,7 +251,7 @@ class ResultsWindow(QMainWindow):
         self.axTVoc.set_autoscale_on(True)
         self.axTVoc.autoscale_view(True,True,True)
         self.canvasTVoc.draw()
-        self.lineTVoc, = self.axTVoc.plot(data[:,0],data[:,1], '.-',linewidth=0.5)
+        self.lineTVoc, = self.axTVoc.plot(data['Time step'],data['Voc'], '.-',linewidth=0.5)
         
         self.figureMPP.clf()
         self.axMPP = self.figureMPP.add_subplot(111)
@@ -221,7 +261,7 @@ class ResultsWindow(QMainWindow):
         self.axMPP.set_autoscale_on(True)
         self.axMPP.autoscale_view(True,True,True)
         self.canvasMPP.draw()
-        self.lineMPP, = self.axMPP.plot(data[:,0],data[:,4], '.-',linewidth=0.5)
+        self.lineMPP, = self.axMPP.plot(data['Time step'],data['MPP'], '.-',linewidth=0.5)
     
     # Initialize JV and PV plots
     def initJVPlot(self):
@@ -241,39 +281,101 @@ class ResultsWindow(QMainWindow):
         self.canvasJVresp.draw()
         self.canvasPVresp.draw()
 
+    # Live update of time-based plots. New data is stored and the plots are
+    # redrawn by a timer, at most plotRefreshRate times per second.
+    def initLivePlots(self):
+        self.redrawingPlots = False
+        for canvas in [self.canvasTJsc, self.canvasTVoc, self.canvasMPP]:
+            canvas.mpl_connect('draw_event', self.onTimePlotDraw)
+        self.plotTimer = QTimer(self)
+        self.plotTimer.timeout.connect(self.refreshLivePlots)
+        self.plotTimer.start(int(1000/max(self.parent().config.plotRefreshRate, 0.1)))
+
+    # Latest data of each device for the time-based plots. One device is
+    # plotted: the one selected in the table (onCellClick), otherwise the
+    # latest device added (show), so that devices tracked at the same time
+    # do not overwrite each other.
+    def setLivePerfData(self, deviceID, perfData, show = False):
+        self.livePerfData[deviceID] = perfData
+        if show and not self.liveDevicePinned:
+            self.liveDevice = deviceID
+        if deviceID == self.liveDevice:
+            self.liveUpdated = True
+
+    # Redraw time-based plots with the latest data of liveDevice (if new)
+    def refreshLivePlots(self):
+        if not self.liveUpdated or self.liveDevice not in self.livePerfData:
+            return
+        self.liveUpdated = False
+        data = self.livePerfData[self.liveDevice]
+        self.plotTJsc(data)
+        self.plotTVoc(data)
+        self.plotMPP(data)
+
+    # A full redraw (resize, zoom, log/lin) invalidates the cached background
+    def onTimePlotDraw(self, event):
+        if not self.redrawingPlots:
+            self.plotBackgrounds.pop(event.canvas, None)
+
+    # Update a time-based plot by blitting: the background (axes, ticks) is
+    # cached and only the line is redrawn. The full canvas is redrawn only
+    # when the data leaves the axes limits (time axis with 25% headroom).
+    def blitPlot(self, ax, canvas, line, toolbar):
+        x, y = line.get_data()
+        xmin, xmax = ax.get_xlim()
+        ymin, ymax = ax.get_ylim()
+        inLimits = len(x) == 0 or (np.min(x) >= xmin and np.max(x) <= xmax and \
+                np.min(y) >= ymin and np.max(y) <= ymax and \
+                np.max(x) - np.min(x) >= 0.5*(xmax - xmin))
+        if canvas not in self.plotBackgrounds or not inLimits:
+            if not inLimits:
+                toolbar.update()
+                ax.relim()
+                ax.autoscale_view(True,True,True)
+                xmin, xmax = ax.get_xlim()
+                ax.set_xlim(xmin, xmax + 0.25*(xmax - xmin))
+            self.redrawingPlots = True
+            line.set_visible(False)
+            canvas.draw()
+            self.plotBackgrounds[canvas] = canvas.copy_from_bbox(ax.bbox)
+            line.set_visible(True)
+            self.redrawingPlots = False
+        else:
+            canvas.restore_region(self.plotBackgrounds[canvas])
+        ax.draw_artist(line)
+        canvas.blit(ax.bbox)
+
     # Plot Transient Jsc
     def plotTJsc(self, data):
-        self.toolbarTJsc.update()
-        self.lineTJsc.set_data(data[:,2].astype(float), data[:,4].astype(float))
-        self.axTJsc.relim()
-        self.axTJsc.autoscale_view(True,True,True)
-        self.canvasTJsc.draw()
+        self.lineTJsc.set_data(data['Time step'], data['Jsc'])
+        self.blitPlot(self.axTJsc, self.canvasTJsc, self.lineTJsc, self.toolbarTJsc)
     
     # Plot Transient Voc
     def plotTVoc(self, data):
-        self.toolbarTVoc.update()
-        self.lineTVoc.set_data(data[:,2].astype(float), data[:,3].astype(float))
-        self.axTVoc.relim()
-        self.axTVoc.autoscale_view(True,True,True)
-        self.canvasTVoc.draw()
+        self.lineTVoc.set_data(data['Time step'], data['Voc'])
+        self.blitPlot(self.axTVoc, self.canvasTVoc, self.lineTVoc, self.toolbarTVoc)
 
     # Plot MPP with tracking
     def plotMPP(self, data):
-        self.toolbarMPP.update()
-        self.lineMPP.set_data(data[:,2].astype(float), data[:,5].astype(float))
-        self.axMPP.relim()
-        self.axMPP.autoscale_view(True,True,True)
-        self.canvasMPP.draw()
+        self.lineMPP.set_data(data['Time step'], data['MPP'])
+        self.blitPlot(self.axMPP, self.canvasMPP, self.lineMPP, self.toolbarMPP)
     
     # Plot JV response
-    def plotJVresp(self, JV,init):
+    # draw: False to add the lines only (canvas redrawn with drawJVresp)
+    # Returns the lines (JV, PV) of the device
+    def plotJVresp(self, JV, init, draw = True):
         if init is True:
             self.initJVPlot()
+        lines = (self.axJVresp.plot(JV[:,0],JV[:,1], '-',linewidth=1)[0],
+            self.axPVresp.plot(JV[:,0],JV[:,0]*JV[:,1], '-',linewidth=1,
+            color='orange')[0])
+        if draw:
+            self.drawJVresp()
+        return lines
+
+    def drawJVresp(self):
         self.toolbarJVresp.update()
         self.toolbarPVresp.update()
-        self.axJVresp.plot(JV[:,0],JV[:,1], '-',linewidth=1)
-        self.axPVresp.plot(JV[:,0],JV[:,0]*JV[:,1], '-',linewidth=1,
-            color='orange')
         self.figureJVresp.tight_layout()
         self.figurePVresp.tight_layout()
         self.canvasJVresp.draw()
@@ -281,8 +383,8 @@ class ResultsWindow(QMainWindow):
 
     # Clear all plots and fields
     def clearPlots(self, includeTable,includeJVplot):
-        self.deviceID = np.zeros((0,1))
-        self.perfData = np.zeros((0,8))
+        self.deviceID = ""
+        self.perfData = np.zeros(0, dtype = perfDataDtype)
         self.JV = np.array([])
         if includeJVplot is True:
             self.figureJVresp.clf()
@@ -290,46 +392,57 @@ class ResultsWindow(QMainWindow):
             self.canvasJVresp.draw()
             self.canvasPVresp.draw()
             self.initJVPlot()
+            self.jvLines = [None]*len(self.jvLines)
         self.initPlots(self.perfData)
         if includeTable is True:
-            self.resTableWidget.setRowCount(0)
+            self.resTableModel.clear()
             self.setupDataFrame()
         QApplication.processEvents()
     
     # Action upon selecting a row in the table.
-    @pyqtSlot()
-    def onCellClick(self):
-        row = self.resTableWidget.selectedItems()[0].row()
-        for j in range(self.resTableWidget.columnCount()):
-            for i in range(self.resTableWidget.rowCount()):
-                self.resTableWidget.item(i,j).setBackground(QColor(255,255,255))
-        for j in range(self.resTableWidget.columnCount()):
-            self.resTableWidget.item(row,j).setBackground(QColor(0,255,0))
+    @pyqtSlot(QModelIndex)
+    def onCellClick(self, index):
+        row = self.resTableProxy.mapToSource(index).row()
+        self.resTableModel.setHighlightedRow(row)
 
         for line in self.axJVresp.get_lines():
             line.set_linewidth(0.5)
         for line in self.axPVresp.get_lines():
             line.set_linewidth(0.5)
-        self.axJVresp.get_lines()[row+2].set_linewidth(2)
-        self.axPVresp.get_lines()[row+2].set_linewidth(2)
+        if self.jvLines[row] is not None:
+            for line in self.jvLines[row]:
+                line.set_linewidth(2)
         self.canvasJVresp.draw()
         self.canvasPVresp.draw()
 
+        # time-based plots follow the selected device
+        deviceID = self.resTableModel.data(self.resTableModel.index(row, 0), Qt.UserRole)
+        key = self.resTableModel.key(row)
+        if key is not None:
+            self.livePerfData[deviceID] = self.results.get(key).perfData
+        if deviceID in self.livePerfData:
+            self.liveDevice = deviceID
+            self.liveDevicePinned = True
+            self.liveUpdated = True
+
+    # Rows in resTableModel of the rows selected in the table view
+    def selectedResultRows(self):
+        return sorted(set([self.resTableProxy.mapToSource(i).row() \
+                for i in self.resTableView.selectionModel().selectedRows()]))
+
     # Process Key Events
     def keyPressEvent(self, event):
-        if self.resTableWidget.rowCount() > 0:
+        if self.resTableModel.rowCount() > 0:
             if event.key() == Qt.Key_Delete:
-                selectedRows = list(set([ i.row() for i in self.resTableWidget.selectedItems()]))
-                for row in selectedRows[::-1]:
-                    self.selectDeviceRemove(row)
+                self.selectDeviceRemove(self.selectedResultRows())
 
     # Enable right click on substrates for saving locally and delete
     def contextMenuEvent(self, event):
         self.menu = QMenu(self)
-        rPos = self.resTableWidget.mapFromGlobal(QCursor.pos())
+        rPos = self.resTableView.mapFromGlobal(QCursor.pos())
         if rPos.x()>0 and rPos.x()<self.resTableW and \
                 rPos.y()>0 and rPos.y()<self.resTableH and \
-                self.resTableWidget.rowCount() > 0 :
+                self.resTableModel.rowCount() > 0 :
             
             selectCellLoadAction = QAction("&Load from csv...", self)
             selectCellLoadAction.setShortcut("Ctrl+o")
@@ -338,6 +451,7 @@ class ResultsWindow(QMainWindow):
             selectCellSaveAction.setShortcut("Ctrl+s")
             selectCellSaveAllAction = QAction('Save All...', self)
             selectCellSaveAllAction.setShortcut("Ctrl+Shift+s")
+            selectCellSaveArchiveAction = QAction('Save as archive...', self)
             selectCellRemoveAction = QAction('Remove...', self)
             selectCellRemoveAction.setShortcut("Del")
             selectRemoveAllAction = QAction('Remove All...', self)
@@ -348,173 +462,413 @@ class ResultsWindow(QMainWindow):
             self.menu.addAction(selectCellLoadAction)
             self.menu.addAction(selectCellSaveAction)
             self.menu.addAction(selectCellSaveAllAction)
+            self.menu.addAction(selectCellSaveArchiveAction)
             self.menu.popup(QCursor.pos())
             QApplication.processEvents()
             
             selectCellLoadAction.triggered.connect(self.read_csv)
-            selectedRows = list(set([ i.row() for i in self.resTableWidget.selectedItems()]))
-            #for row in selectedRows[::-1]:
+            selectedRows = self.selectedResultRows()
             selectCellSaveAction.triggered.connect(lambda: self.selectDeviceSaveLocally(selectedRows))
-            selectCellSaveAllAction.triggered.connect(lambda: self.selectDeviceSaveLocally(list(range(self.resTableWidget.rowCount()))))
+            selectCellSaveAllAction.triggered.connect(lambda: self.selectDeviceSaveLocally(list(range(self.resTableModel.rowCount()))))
+            selectCellSaveArchiveAction.triggered.connect(lambda: self.selectDeviceSaveArchive(selectedRows))
             selectCellRemoveAction.triggered.connect(lambda: self.selectDeviceRemove(selectedRows))
             selectRemoveAllAction.triggered.connect(lambda: self.clearPlots(True,True))
 
     # Logic to save locally selected devices from results table
     def selectDeviceSaveLocally(self, selectedRows):
         folder = str(QFileDialog.getExistingDirectory(self, "Select directory where to save..."))
+        if folder == "":
+            return
         for row in selectedRows:
-            print(self.dfTotDeviceID.iat[0,row])
-            self.save_csv(self.dfTotDeviceID.iat[0,row],
-                self.dfTotAcqParams.iloc[[row]],
-                self.dfTotPerfData.iat[0,row],
-                self.dfTotJV.iat[0,row][0], folder)
+            key = self.resTableModel.key(row)
+            if key is None:
+                continue
+            result = self.results.get(key)
+            self.save_csv(result.deviceID, self.results.dfAcqParams(key),
+                result.perfData, result.JV, folder)
+
+    # Save selected devices from results table into a single archive
+    def selectDeviceSaveArchive(self, selectedRows):
+        filename = str(QFileDialog.getSaveFileName(self, "Save archive",
+                        self.csvFolder, "*.npz")[0])
+        if filename == "":
+            return
+        if not filename.endswith(".npz"):
+            filename += ".npz"
+        keys = [self.resTableModel.key(row) for row in selectedRows]
+        try:
+            writeArchive(filename, [self.results.get(k) for k in keys if k is not None])
+            self.printMsg(" Data of "+str(len(keys))+" devices saved on: "+filename)
+        except Exception as e:
+            self.printMsg(" Archive not saved: "+str(e))
 
     # Logic to remove data from devices selected from results table
+    # Rows are removed from the last, so that the others keep their index.
+    # JV plots are redrawn once, after all rows are removed.
     def selectDeviceRemove(self, selectedRows):
-        for row in selectedRows:
-            self.dfTotDeviceID.drop(self.dfTotDeviceID.columns[row], axis=1)
-            self.dfTotPerfData.drop(self.dfTotPerfData.columns[row], axis=1)
-            self.dfTotJV.drop(self.dfTotJV.columns[row], axis=1)
-            try:
-                self.axPVresp.get_lines()[row+2].remove()
-                self.axJVresp.get_lines()[row+2].remove()
-                print(" Removed acquisition from table: ",str(self.dfTotDeviceID.iat[0,row]))
-            except:
-                print(" Removing substrates failed")
+        for row in sorted(selectedRows, reverse=True):
+            key = self.resTableModel.key(row)
+            if key is not None:
+                self.results.remove(key)
+            if self.jvLines[row] is not None:
+                for line in self.jvLines[row]:
+                    line.remove()
+            print(" Removed acquisition from table: ",
+                self.resTableModel.data(self.resTableModel.index(row,0)))
+            self.resTableModel.removeRow(row)
+            del self.jvLines[row]
+            self.deviceRows = {k : r-1 if r > row else r \
+                    for k, r in self.deviceRows.items() if r != row}
+        if len(selectedRows) > 0:
             self.canvasJVresp.draw()
             self.canvasPVresp.draw()
-            self.resTableWidget.removeRow(row)
 
     # Add row and initialize it within the table
     def setupResultTable(self):
-        self.resTableWidget.insertRow(self.resTableWidget.rowCount())
-        self.resTableWidget.setItem(self.resTableWidget.rowCount()-1,0,
-                                        QTableWidgetItem())
-        for j in range(self.resTableWidget.columnCount()):
-            self.resTableWidget.setItem(self.resTableWidget.rowCount(),j,
-                                        QTableWidgetItem())
-        self.lastRowInd = self.resTableWidget.rowCount()-1
-        for f in range(9):
-            self.resTableWidget.setItem(self.lastRowInd, 0,QTableWidgetItem())
-
-    # Create internal dataframe with all the data. This is needed for plotting data after acquisition
+        self.lastRowInd = self.resTableModel.addRow()
+        self.jvLines.append(None)
+
+    # Select the row assigned to a device being tracked (added if new).
+    # Needed when several devices are acquired at the same time.
+    def selectResultRow(self, deviceID):
+        if deviceID in self.deviceRows:
+            self.lastRowInd = self.deviceRows[deviceID]
+        else:
+            self.setupResultTable()
+            self.deviceRows[deviceID] = self.lastRowInd
+
+    # Release the row of a device, once its tracking is complete
+    def releaseResultRow(self, deviceID):
+        self.deviceRows.pop(deviceID, None)
+
+    # Reset the internal store with all the data. This is needed for saving data after acquisition
     def setupDataFrame(self):
-        self.dfTotDeviceID = pd.DataFrame()
-        self.dfTotPerfData = pd.DataFrame()
-        self.dfTotAcqParams = pd.DataFrame()
-        self.dfTotJV = pd.DataFrame()
+        self.results.clear()
+        self.deviceRows = {}
+        # JV and PV lines of each row (None if not plotted)
+        self.jvLines = []
     
     # Process data from devices
-    def processDeviceData(self, deviceID, dfAcqParams, perfData, JV, flag):
-        
+    # plotJV: False for tracking updates, where JV does not change
+    # partialFile: streamed tracking data, removed once the data is saved
+    def processDeviceData(self, deviceID, dfAcqParams, perfData, JV, flag, plotJV = True,
+                partialFile = None):
+        row = self.lastRowInd
         # create numpy arrays for all devices as well as dataframes for csv and jsons
-        self.deviceID = np.vstack((self.deviceID, np.array([deviceID])))
+        self.deviceID = deviceID
         self.perfData = perfData
         self.JV = JV
 
         # Populate table.
         self.fillTableData(deviceID, self.perfData)
-        QApplication.processEvents()
         # Plot results
-        self.plotData(self.deviceID,self.perfData, JV, False)
-        QApplication.processEvents()
+        self.plotData(self.deviceID,self.perfData, JV, False, plotJV)
 
         if flag is True:
-            # Save to internal dataFrame
-            self.makeInternalDataFrames(self.lastRowInd,
-                self.deviceID,self.perfData, dfAcqParams, self.JV)
+            # Save to internal store
+            self.storeResult(row, deviceID, self.perfData, dfAcqParams, self.JV)
 
             # Enable/disable saving to file
             # Using ALT with Start Acquisition button overrides the config settings.
             if self.parent().config.saveLocalCsv == True or \
                     self.parent().acquisition.modifiers == Qt.AltModifier:
-                self.save_csv(deviceID, dfAcqParams, self.perfData, self.JV,self.csvFolder)
+                self.save_csv(deviceID, dfAcqParams, self.perfData, self.JV,self.csvFolder,
+                        partialFile)
 
     # Plot data from devices
-    def plotData(self, deviceID, perfData, JV, init):
-        self.plotJVresp(JV, init)
-        self.plotTVoc(perfData)
-        self.plotMPP(perfData)
-        self.plotTJsc(perfData)
-        self.show()
+    # Time-based plots are updated by the plot timer (refreshLivePlots)
+    def plotData(self, deviceID, perfData, JV, init, plotJV = True):
+        if plotJV:
+            self.jvLines[self.lastRowInd] = self.plotJVresp(JV, init)
+        self.setLivePerfData(deviceID, perfData, show = plotJV)
+        if not self.isVisible():
+            self.show()
     
-    # Create internal dataframe with all the data. This is needed for plotting data after acquisition
-    def makeInternalDataFrames(self, index,deviceID,perfData,dfAcqParams,JV):
-        self.dfTotDeviceID[index] = [deviceID]
-        self.dfTotPerfData[index] = [perfData]
-        self.dfTotAcqParams = self.dfTotAcqParams.append(dfAcqParams)
-        self.dfTotJV[index] = [JV]
+    # Add data of a device to the internal store, linked to its row in the table
+    def storeResult(self, row, deviceID, perfData, dfAcqParams, JV):
+        self.resTableModel.setKey(row, self.results.add(deviceID, perfData, JV, dfAcqParams))
     
-    # Create DataFrames for saving csv and jsons
-    def makeDFPerfData(self,perfData):
-        dfPerfData = pd.DataFrame({'Time step': perfData[:,2], 'Voc': perfData[:,3],
-                        'Jsc': perfData[:,4], 'VPP': perfData[:,5],'MPP': perfData[:,6],
-                        'FF': perfData[:,7], 'effic': perfData[:,8],
-                        'Acq Date': perfData[:,0], 'Acq Time': perfData[:,1]})
-        dfPerfData = dfPerfData[['Acq Date','Acq Time','Time step', 'Voc',
-                                     'Jsc', 'VPP','MPP','FF','effic']]
-        return dfPerfData
-    
-    def makeDFJV(self,JV):
-        dfJV = pd.DataFrame({'V':JV[:,0], 'J':JV[:,1]})
-        dfJV = dfJV[['V', 'J']]
-        return dfJV
-    
-    ### Save device acquisition as csv
-    def save_csv(self,deviceID, dfAcqParams, perfData, JV, folder):
-        dfPerfData = self.makeDFPerfData(perfData)
-        dfJV = self.makeDFJV(JV)
-    
-        dfDeviceID = pd.DataFrame({'Device':[deviceID]})
-        dfTot = pd.concat([dfDeviceID, dfPerfData], axis = 1)
-        dfTot = pd.concat([dfTot,dfJV], axis = 1)
-        dfTot = pd.concat([dfTot,dfAcqParams], axis = 1)
-        
-        dateTimeTag = str(datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
-        csvFilename = deviceID+"_"+dateTimeTag
-        if dfPerfData['MPP'].count() < 2:
-            csvFilename +=".csv"
-        else:
-            csvFilename +="_tracking.csv"
-        try:
-            dfTot.to_csv(folder+"/"+csvFilename, sep=',', index=False)
-            msg=" Device data saved on: "+folder+"/"+csvFilename
-        except:
-            msg=" Device data not saved"
-        print(msg)
-        logger.info(msg)
-
-    ### Load data from saved CSV
+    ### Save device acquisition (csv or npz, from configuration: saveFormat)
+    # Data is saved in the background by saveQueue
+    def save_csv(self,deviceID, dfAcqParams, perfData, JV, folder, partialFile = None):
+        self.saveQueue.put(deviceID, dfAcqParams, perfData, JV, folder,
+                    self.parent().config.saveFormat, partialFile)
+
+    # Wait until all data is saved (on exit)
+    def flushSaveQueue(self):
+        if self.saveQueue.pending() > 0:
+            self.printMsg("Saving pending data ("+str(self.saveQueue.pending())+" devices)...")
+        self.saveQueue.close()
+
+    ### Load data from saved CSV or archives (npz)
+    # Files are parsed in the background (CsvLoader). Table and internal
+    # store are filled in batches, plots are redrawn once at the end.
     def read_csv(self):
         filenames = QFileDialog.getOpenFileNames(self,
-                        "Open csv data", "","*.csv")
+                        "Open saved data", "","Device data (*.csv *.npz)")[0]
+        self.loadDataFiles(filenames)
+
+    def loadDataFiles(self, filenames):
+        if len(filenames) == 0 or self.csvLoader is not None or \
+                self.catalogIndexer is not None:
+            return
+        self.printMsg("Loading saved device data from "+str(len(filenames))+" files...")
+        self.loadMenu.setEnabled(False)
+        self.loadProgress.setRange(0, len(filenames))
+        self.loadProgress.setValue(0)
+        self.loadProgress.show()
+        self.csvLoader = CsvLoader(filenames, parent = self)
+        self.csvLoader.batchLoaded.connect(self.addLoadedData)
+        self.csvLoader.progress.connect(self.loadProgress.setValue)
+        self.csvLoader.Msg.connect(self.printMsg)
+        self.csvLoader.finished.connect(self.endLoadCsv)
+        self.csvLoader.start()
+
+    # Add a batch of devices loaded from csv
+    def addLoadedData(self, batch):
+        for filename, (deviceID, perfData, JV, dfAcqParams) in batch:
+            print("Open saved device data from: ", filename)
+            self.setupResultTable()
+            self.jvLines[self.lastRowInd] = self.plotJVresp(JV, False, draw = False)
+            self.fillTableData(deviceID, perfData)
+            self.storeResult(self.lastRowInd, deviceID, perfData, dfAcqParams, JV)
+            self.setLivePerfData(deviceID, perfData, show = True)
+
+    def endLoadCsv(self):
+        self.drawJVresp()
+        if not self.isVisible():
+            self.show()
+        self.printMsg(" Loaded "+str(self.csvLoader.numLoaded)+" of "+ \
+                str(len(self.csvLoader.filenames))+" files")
+        self.loadProgress.hide()
+        self.loadMenu.setEnabled(True)
+        self.csvLoader = None
+
+    # Load the saved data matching the search (see catalog.parseQuery)
+    def searchCatalog(self):
         try:
-            for filename in filenames[0]:
-                print("Open saved device data from: ", filename)
-                dftot = pd.read_csv(filename, na_filter=False)
-                deviceID = dftot.at[0,'Device']
-                perfData = dftot.values[range(0,np.count_nonzero(dftot['Acq Date']))][:,range(1,10)]
-                JV = dftot.values[range(0,np.count_nonzero(dftot['V']))][:,np.arange(10,12)].astype(float)
-                dfAcqParams = dftot.loc[0:1, 'Acq Min Voltage':'Comments']
-                self.plotData(deviceID, perfData, JV, False)
-                self.setupResultTable()
-                self.fillTableData(deviceID, perfData)
-                self.makeInternalDataFrames(self.lastRowInd, deviceID, perfData, dfAcqParams, np.array([JV]))
-        except:
-            print("Loading files failed")
+            rows = getCatalog().query(**parseQuery(self.catalogSearchText.text()))
+        except Exception as e:
+            self.printMsg(" Search failed: "+str(e))
+            return
+        filenames = list(dict.fromkeys([r['path'] for r in rows if os.path.isfile(r['path'])]))
+        self.printMsg("Search: "+str(len(rows))+" measurements in "+str(len(filenames))+" files")
+        self.loadDataFiles(filenames)
+
+    # Index the directory for saved files into the catalog (in background)
+    def updateCatalog(self):
+        if self.csvLoader is not None or self.catalogIndexer is not None:
+            return
+        self.printMsg("Updating catalog with: "+self.csvFolder)
+        self.catalogMenu.setEnabled(False)
+        self.loadProgress.setValue(0)
+        self.loadProgress.show()
+        self.catalogIndexer = CatalogIndexer(self.csvFolder, parent = self)
+        self.catalogIndexer.progress.connect(self.setLoadProgress)
+        self.catalogIndexer.Msg.connect(self.printMsg)
+        self.catalogIndexer.finished.connect(self.endUpdateCatalog)
+        self.catalogIndexer.start()
+
+    def setLoadProgress(self, done, total):
+        self.loadProgress.setRange(0, total)
+        self.loadProgress.setValue(done)
+
+    def endUpdateCatalog(self):
+        self.loadProgress.hide()
+        self.catalogMenu.setEnabled(True)
+        self.catalogIndexer = None
+
+    # Stop loading of csv files (pending files are not loaded)
+    def stopLoadCsv(self):
+        if self.csvLoader is not None:
+            self.csvLoader.stop()
+            self.csvLoader.wait()
+        if self.catalogIndexer is not None:
+            self.catalogIndexer.wait()
+
+    def printMsg(self, msg):
+        print(msg)
+        logger.info(msg)
 
     # Populate result table.
     def fillTableData(self, deviceID, obj):
-        self.resTableWidget.setItem(self.lastRowInd, 0,QTableWidgetItem(deviceID))
-        for i in range(1,7,1):
-            self.resTableWidget.setItem(self.lastRowInd, i,QTableWidgetItem("{0:0.3f}".format(np.mean(obj[:,i+2].astype(float)))))
-        #self.resTableWidget.setItem(self.lastRowInd, 7,QTableWidgetItem("{0:0.3f}".format(np.mean(obj[:,2].astype(float)))))
-        self.resTableWidget.setItem(self.lastRowInd, 8,QTableWidgetItem(obj[0,0]))
-        self.resTableWidget.setItem(self.lastRowInd, 9,QTableWidgetItem(obj[0,1]))
-        if float(obj[0,2]) == 0.:
-            self.resTableWidget.setItem(self.lastRowInd, 7,QTableWidgetItem("None")) #track_time
-        else:
-            self.resTableWidget.setItem(self.lastRowInd, 7,QTableWidgetItem("{0:0.3f}".format(float(obj[0,2])))) #track_time
+        self.resTableModel.setRow(self.lastRowInd, deviceID, obj)
+
+####################################################################
+#   Model of the results table
+####################################################################
+resultsTableHeaders = ["Device ID", "Voc [V]", u"Jsc [mA/cm\u00B2]", u"VPP [V]",
+                u"MPP [mW/cm\u00B2]", "FF", "PCE [%]", "Tracking time [s]",
+                "Acq Date", "Acq Time"]
+trackTimeColumn = 7
+
+'''
+   ResultsTableModel
+   Results of the devices, stored by column (one list per column).
+   Rows are in acquisition order, as the JV lines of the rows in
+   ResultsWindow.jvLines. Each row has the key of its data in ResultStore
+   (None while tracking is in progress). The highlighted row is shown
+   through the background role, the raw values (for sorting) through
+   Qt.UserRole.
+'''
+class ResultsTableModel(QAbstractTableModel):
+    def __init__(self, parent = None):
+        super(ResultsTableModel, self).__init__(parent)
+        self.columns = [[] for h in resultsTableHeaders]
+        self.keys = []
+        self.highlightedRow = None
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns[0])
+
+    def columnCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return resultsTableHeaders[section]
+        return super(ResultsTableModel, self).headerData(section, orientation, role)
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self.columns[index.column()][index.row()]
+        if role == Qt.DisplayRole:
+            if value is None:
+                return ""
+            if isinstance(value, float):
+                if index.column() == trackTimeColumn and value == 0.:
+                    return "None"
+                return "{0:0.3f}".format(value)
+            return value
+        elif role == Qt.UserRole:
+            return value
+        elif role == Qt.BackgroundRole and index.row() == self.highlightedRow:
+            return QBrush(QColor(0,255,0))
+        return None
+
+    # Add an empty row at the end. Returns its index.
+    def addRow(self):
+        row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row)
+        for column in self.columns:
+            column.append(None)
+        self.keys.append(None)
+        self.endInsertRows()
+        return row
+
+    # Set the values of a row from perfData (averages over tracking)
+    def setRow(self, row, deviceID, perfData):
+        acqDate, acqTime = dateTimeStrings(perfData[0]['timestamp'])
+        values = [str(deviceID)] + \
+                [float(np.mean(perfData[k])) for k in perfDataColumns[3:]] + \
+                [float(perfData[0]['Time step']), acqDate, acqTime]
+        for column, value in zip(self.columns, values):
+            column[row] = value
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount()-1))
+
+    def removeRows(self, row, count, parent = QModelIndex()):
+        if row < 0 or count < 1 or row+count > self.rowCount():
+            return False
+        self.beginRemoveRows(parent, row, row+count-1)
+        for column in self.columns:
+            del column[row:row+count]
+        del self.keys[row:row+count]
+        if self.highlightedRow is not None and self.highlightedRow >= row:
+            if self.highlightedRow < row+count:
+                self.highlightedRow = None
+            else:
+                self.highlightedRow -= count
+        self.endRemoveRows()
+        return True
+
+    def clear(self):
+        self.beginResetModel()
+        self.columns = [[] for h in resultsTableHeaders]
+        self.keys = []
+        self.highlightedRow = None
+        self.endResetModel()
+
+    # Key in ResultStore of the data of a row (None if not stored yet)
+    def key(self, row):
+        return self.keys[row]
+
+    def setKey(self, row, key):
+        self.keys[row] = key
+
+    # Highlight a row (None: no highlighting)
+    def setHighlightedRow(self, row):
+        rows = [r for r in [self.highlightedRow, row] if r is not None]
+        self.highlightedRow = row
+        for r in rows:
+            self.dataChanged.emit(self.index(r, 0),
+                    self.index(r, self.columnCount()-1), [Qt.BackgroundRole])
+
+'''
+   CsvLoader
+   Loads device data from csv files and archives (readDataFile) in
+   the background.
+   Files are parsed by a pool of threads and sent to the GUI in batches
+   of (filename, (deviceID, perfData, JV, dfAcqParams)), in the same
+   order of the files.
+'''
+class CsvLoader(QThread):
+    batchLoaded = pyqtSignal(list)
+    progress = pyqtSignal(int)
+    Msg = pyqtSignal(str)
+
+    def __init__(self, filenames, batchSize = 50, parent = None):
+        super(CsvLoader, self).__init__(parent)
+        self.filenames = filenames
+        self.batchSize = batchSize
+        self.numLoaded = 0
+        self.stopped = False
+
+    def run(self):
+        batch = []
+        with ThreadPoolExecutor(max_workers = min(8, os.cpu_count() or 1)) as pool:
+            futures = [pool.submit(readDataFile, f) for f in self.filenames]
+            for i, (filename, future) in enumerate(zip(self.filenames, futures)):
+                if self.stopped:
+                    for f in futures[i:]:
+                        f.cancel()
+                    break
+                try:
+                    batch.extend([(filename, d) for d in future.result()])
+                    self.numLoaded += 1
+                except Exception as e:
+                    self.Msg.emit(" Loading "+filename+" failed: "+str(e))
+                if len(batch) >= self.batchSize:
+                    self.batchLoaded.emit(batch)
+                    batch = []
+                self.progress.emit(i+1)
+        if len(batch) > 0:
+            self.batchLoaded.emit(batch)
+
+    def stop(self):
+        self.stopped = True
+
+'''
+   CatalogIndexer
+   Indexes new and modified data files of a folder into the catalog
+   in the background (Catalog.indexFolder).
+'''
+class CatalogIndexer(QThread):
+    progress = pyqtSignal(int, int)
+    Msg = pyqtSignal(str)
+
+    def __init__(self, folder, parent = None):
+        super(CatalogIndexer, self).__init__(parent)
+        self.folder = folder
+
+    def run(self):
+        try:
+            indexed, unchanged, removed = getCatalog().indexFolder(self.folder,
+                    onProgress = self.progress.emit)
+            self.Msg.emit(" Catalog updated. Files indexed: {0:d}, unchanged: {1:d}, removed: {2:d}". \
+                    format(indexed, unchanged, removed))
+        except Exception as e:
+            self.Msg.emit(" Catalog not updated: "+str(e))
 
 ####################################################################
 #   Custom Toolbar with linear/log button
@@ -17,8 +17,7 @@ import time
 from PyQt5.QtCore import (QRect,QObject, QThread, pyqtSlot, pyqtSignal)
 from PyQt5.QtWidgets import (QLabel, QLineEdit, QCheckBox, QWidget,
                              QMainWindow,QPushButton,QComboBox)
-from .modules.sourcemeter.keithley2400 import *
-from .modules.sourcemeter.agilent4155c import *
+from .instruments import *
 
 
 class SourcemeterWindow(QMainWindow):
@@ -63,8 +62,7 @@ class SourcemeterWindow(QMainWindow):
         self.instrumentCBox = QComboBox(self)
         self.instrumentCBox.setGeometry(QRect(100, 5, 150, 30))
         self.instrumentCBox.setObjectName("instrumentCBoxx")
-        self.instrumentCBox.addItem("Agilent 4155")
-        self.instrumentCBox.addItem("Keithley 2400")
+        self.instrumentCBox.addItems(sourcemeterNames)
 
     # Start the thread for connecting and collecting basic V,I data
     def startSourcemeter(self):
@@ -106,43 +104,50 @@ class sourcemeterThread(QThread):
     def __init__(self, parent=None):
         super(sourcemeterThread, self).__init__(parent)
         self.maxV = 10
+        self.runningFlag = True
 
     def __del__(self):
         self.wait()
 
+    # The loop ends at the next reading, the sourcemeter stays connected
     def stop(self):
         self.runningFlag = False
-        time.sleep(0.5)
-        self.sc.set_output(voltage = 0)
-        self.sc.off()
-        #del self.sc
-        self.terminate()
+        self.wait()
 
     def run(self):
         pvMode = self.parent().parent().acquisitionwind.pvModeBox.isChecked()
         deviceArea = float(self.parent().parent().deviceAreaText.text())
         try:
-            if self.parent().parent().sourcemeterwind.instrumentCBox.currentIndex() == 0:
-                self.sc = Agilent4155c(self.parent().parent().config.agilent4155cID)
-            else:
-                self.sc = Keithley2400(self.parent().parent().config.keithley2400ID)
-        
-            self.sc.set_limit(voltage=self.maxV, current=0.12)
-            self.runningFlag = True
-            while True:
-                voltageText = self.parent().sourcemeterVoltageText.text()
-                if voltageText == "" or voltageText == "-":
-                    pass
-                else:
-                    self.sc.on()
-                    voltage = float(voltageText)
-                    self.sc.set_output(voltage = voltage)
-                    if self.runningFlag is True:
-                        self.smResponse.emit("Voltage [V]: "+\
-                            str(self.sc.read_values(deviceArea, pvMode)[0]), \
-                            " Current [mA]: "+\
-                            str(self.sc.read_values(deviceArea,pvMode)[1]), True)
+            lease = instrumentManager.leaseSourcemeter(self.parent().instrumentCBox.currentIndex(),
+                    self.parent().parent().config, timeout = 1)
+        except InstrumentBusy:
+            self.smResponse.emit("","Sourcemeter in use by the acquisition", False)
+            return
+        except:
+            self.smResponse.emit("","Cannot connect to sourcemeter", False)
+            return
+        try:
+            with lease as self.sc:
+                self.sc.set_limit(voltage=self.maxV, current=0.12)
+                try:
+                    while self.runningFlag:
+                        try:
+                            voltage = float(self.parent().sourcemeterVoltageText.text())
+                        except ValueError:
+                            # Voltage being typed ("", "-", ...)
+                            voltage = None
+                        if voltage is not None:
+                            self.sc.on()
+                            self.sc.set_output(voltage = voltage)
+                            if self.runningFlag is True:
+                                # voltage and current from the same reading
+                                values = self.sc.read_values(deviceArea, pvMode)
+                                self.smResponse.emit("Voltage [V]: "+str(values[0]), \
+                                    " Current [mA]: "+str(values[1]), True)
+                            self.sc.off()
+                        time.sleep(0.5)
+                finally:
+                    self.sc.set_output(voltage = 0)
                     self.sc.off()
-                time.sleep(0.5)
         except:
             self.smResponse.emit("","Cannot connect to sourcemeter", False)
@@ -0,0 +1,48 @@
+'''
+startup.py
+-------------
+Startup timing report (--profile-startup): time of each startup step
+and heavy modules already imported when the main window is up.
+
+Copyright (C) 2017-2018 Nicola Ferralis <ferralis@mit.edu>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+'''
+import sys, time
+from . import logger
+
+# Modules expected to be imported only when needed
+heavyModules = ['matplotlib', 'cv2', 'visa', 'pyvisa', 'ThorlabsPM100', 'PIL', 'pandas']
+
+class StartupProfile():
+    # startTime: time.perf_counter() at the start of the program
+    def __init__(self, startTime = None):
+        self.startTime = startTime if startTime is not None else time.perf_counter()
+        self.lastTime = self.startTime
+        self.steps = []
+
+    # End of a startup step
+    def mark(self, step):
+        now = time.perf_counter()
+        self.steps.append((step, now - self.lastTime))
+        self.lastTime = now
+
+    def report(self):
+        lines = ["Startup profile:"]
+        for step, duration in self.steps:
+            lines.append("  {0:<28s} {1:7.3f} s".format(step, duration))
+        lines.append("  {0:<28s} {1:7.3f} s".format("Total", self.lastTime - self.startTime))
+        lines.append("  Heavy modules loaded: "+ \
+                (", ".join([m for m in heavyModules if m in sys.modules]) or "none"))
+        msg = "\n".join(lines)
+        print(msg)
+        logger.info(msg)
+
+    # Last step: the event loop is running (main window shown)
+    def endStartup(self):
+        self.mark("first event loop")
+        self.report()
@@ -3,10 +3,13 @@ from setuptools import setup, find_packages
 setup(
     name='SpecAnalyzer',
     packages=find_packages(),
-    install_requires=['numpy', 'matplotlib', 'pillow', 'PyQt5',
+    python_requires='>=3.7',
+    install_requires=['numpy>=1.17', 'matplotlib', 'pillow', 'PyQt5',
         'pyvisa', 'opencv-contrib-python', 'pandas',
         'ThorlabsPM100;platform_system=="Windows"',],
-    entry_points={'gui_scripts' : ['specanalyzer=SpecAnalyzer.__main__:main']},
+    entry_points={'gui_scripts' : ['specanalyzer=SpecAnalyzer.__main__:main'],
+        'console_scripts' : ['specanalyzer-batch=SpecAnalyzer.batch:main',
+            'specanalyzer-catalog=SpecAnalyzer.catalog:main']},
     version='1.1.0',
     description='Automated measurements of Current/Voltage profiles for photovoltaic solar cells',
     long_description= """ Control software for automated measurements of Current/Voltage profiles, device tracking for photovoltaic solar cells """,
@@ -21,8 +24,6 @@ setup(
      'Development Status :: 4 - Beta',
      'Programming Language :: Python :: Only',
      'Programming Language :: Python :: 3',
-     'Programming Language :: Python :: 3.5',
-     'Programming Language :: Python :: 3.6',
      'Programming Language :: Python :: 3.7',
      'Programming Language :: Python :: 3.8',
      'Programming Language :: Python :: 3.9',
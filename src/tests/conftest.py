@@ -0,0 +1,15 @@
+'''
+conftest.py
+-------------
+Common setup of the tests: the configuration, catalog and data folders
+are created in a temporary home folder, not in the user's home.
+
+Run from the src folder: python -m pytest -q
+
+'''
+import os, sys, tempfile
+
+testHome = tempfile.mkdtemp(prefix = "specanalyzer-tests-")
+os.environ['HOME'] = testHome
+os.environ['USERPROFILE'] = testHome
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
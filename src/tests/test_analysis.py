@@ -0,0 +1,50 @@
+'''
+Tests of the extraction of performance parameters (analysis.py)
+'''
+import numpy as np
+import pytest
+from SpecAnalyzer.specanalyzer import analysis
+
+# Linear JV (generator convention): Jsc = 20, Voc = 0.8, MPP at V = 0.4, J = 10
+def linearJV(vmin, vmax, step = 0.01):
+    V = np.arange(vmin, vmax + 1e-9, step)
+    return np.column_stack((V, 20. - 25.*V))
+
+def test_voc_jsc_from_zero_crossing():
+    voc, jsc = analysis.calculate_voc_jsc(linearJV(-0.2, 1.))
+    assert voc == pytest.approx(0.8)
+    assert jsc == pytest.approx(20.)
+
+def test_voc_jsc_unsorted_curve():
+    JV = linearJV(-0.2, 1.)[::-1]
+    assert analysis.calculate_voc_jsc(JV) == pytest.approx((0.8, 20.))
+
+# Voc is not extrapolated past the data
+def test_voc_without_zero_crossing():
+    voc, jsc = analysis.calculate_voc_jsc(linearJV(0., 0.7))
+    assert voc == 0.
+    assert jsc == pytest.approx(20.)
+
+def test_mpp():
+    Vpmax, Jpmax = analysis.calculate_mpp(linearJV(-0.2, 1.), 0.8, 20.)
+    assert Vpmax == pytest.approx(0.4, abs = 1e-6)
+    assert Jpmax == pytest.approx(10., abs = 1e-4)
+
+# The maximum is searched in the power quadrant only
+def test_mpp_power_quadrant():
+    JV = linearJV(-2., 2.)
+    Vpmax, Jpmax = analysis.calculate_mpp(JV, 0.8, 20.)
+    assert 0. <= Vpmax <= 0.8
+
+def test_analyseJV():
+    Voc, Jsc, Vpmax, Jpmax, FF, effic = analysis.analyseJV(linearJV(-0.2, 1.), 100.)
+    assert (Voc, Jsc) == pytest.approx((0.8, 20.))
+    assert FF == pytest.approx(0.25, abs = 1e-4)
+    assert effic == pytest.approx(4., abs = 1e-3)
+
+# Measured Voc, Jsc are used instead of the values from the curve
+def test_analyseJV_measured_voc_jsc():
+    Voc, Jsc, Vpmax, Jpmax, FF, effic = analysis.analyseJV(linearJV(0., 0.7), 100., 0.8, 20.)
+    assert (Voc, Jsc) == (0.8, 20.)
+    assert Vpmax == pytest.approx(0.4, abs = 1e-6)
+    assert FF == pytest.approx(0.25, abs = 1e-4)
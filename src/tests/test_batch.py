@@ -0,0 +1,28 @@
+'''
+Tests of the headless batch acquisition (batch.py) on the simulated sourcemeter
+'''
+import os
+from SpecAnalyzer.batch import *
+
+def recipe(instrument):
+    return {'instrument' : instrument,
+            'acquisition' : {'acqMinVoltage' : -0.2, 'acqMaxVoltage' : 1.,
+                'acqStepVoltage' : 0.02, 'acqHoldTime' : 0., 'acqDelBeforeMeas' : 0.},
+            'devices' : [{'device' : 'dev1', 'area' : 0.5}, {'device' : 'dev2'}]}
+
+def test_batch(tmp_path):
+    assert runBatch(recipe('Simulator'), str(tmp_path)) == 0
+    saved = os.listdir(tmp_path)
+    assert len(saved) == 8
+    assert len([f for f in saved if f.startswith('dev1_JV-forward')]) == 1
+
+def test_instrument_index():
+    assert getInstrument(recipe(2)) == sourcemeterNames.index('Simulator')
+    assert getInstrument({}) == sourcemeterNames.index('Keithley 2400')
+
+# Unknown instruments fail all devices, listing the valid names
+def test_unknown_instrument(tmp_path, capsys):
+    for instrument in ['Keithley2400', 5, True]:
+        assert runBatch(recipe(instrument), str(tmp_path)) == 2
+        assert "Valid instruments: "+", ".join(sourcemeterNames) in capsys.readouterr().out
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,88 @@
+'''
+Tests of Configuration (configuration.py): upgrade of configuration files
+missing keys, validation, listeners and deferred writes
+'''
+import os
+import pytest
+from SpecAnalyzer.specanalyzer.configuration import *
+
+@pytest.fixture
+def conf(tmp_path):
+    c = Configuration()
+    c.configFile = str(tmp_path / "SpecAnalyzer.ini")
+    c.saveDelay = 0.05
+    return c
+
+def writeIni(filename, text):
+    with open(filename, 'w') as f:
+        f.write(text)
+
+def readIni(filename):
+    fileConf = configparser.ConfigParser()
+    fileConf.optionxform = str
+    fileConf.read(filename)
+    return fileConf
+
+# Keys added in newer versions are set to their default, other values are kept
+def test_missing_keys_from_defaults(conf, tmp_path):
+    writeIni(conf.configFile, "[Devices]\ndeviceArea = 0.3\n\n"
+            "[Instruments]\nkeithley2400ID = GPIB0::5::INSTR\n\n"
+            "[System]\ncsvSavingFolder = /data/mine\n")
+    conf.readConfig(conf.configFile)
+    assert conf.deviceArea == 0.3
+    assert conf.keithley2400ID == "GPIB0::5::INSTR"
+    assert conf.csvSavingFolder == "/data/mine"
+    assert conf.irradiance1Sun == 4.5044
+    assert conf.acqVocJscFromJV is True
+    # the file is completed, not replaced
+    assert os.listdir(tmp_path) == ["SpecAnalyzer.ini"]
+    fileConf = readIni(conf.configFile)
+    defaults = conf.defaultConf()
+    assert fileConf['Devices']['deviceArea'] == "0.3"
+    for section in defaults.sections():
+        for key in defaults[section]:
+            assert key in fileConf[section]
+
+def test_default_configuration(conf):
+    conf.createConfig()
+    conf.readConfig(conf.configFile)
+    assert conf.deviceArea == 1.
+    assert conf.acqPVmode is True
+
+def test_invalid_value_from_default(conf):
+    conf.createConfig()
+    conf.conf['Instruments']['irradiance1Sun'] = "notanumber"
+    conf.conf['Devices']['deviceArea'] = "0.5"
+    conf.writeConfig(conf.configFile)
+    conf.readConfig(conf.configFile)
+    assert conf.irradiance1Sun == 4.5044
+    assert conf.deviceArea == 0.5
+
+def test_typed_values(conf):
+    conf.createConfig()
+    conf.readConfig(conf.configFile)
+    for key, (section, valueType) in configKeys.items():
+        assert isinstance(getattr(conf, key), valueType)
+
+# Nothing is changed if any of the values is not valid
+def test_update_invalid(conf):
+    conf.createConfig()
+    conf.readConfig(conf.configFile)
+    with pytest.raises(ValueError):
+        conf.update({'acqNumAvScans' : '3', 'acqPVmode' : 'maybe'})
+    assert conf.acqNumAvScans == 1
+    assert conf.conf['Acquisition']['acqNumAvScans'] == "1"
+
+def test_listeners_and_deferred_save(conf):
+    conf.createConfig()
+    conf.readConfig(conf.configFile)
+    changes = []
+    conf.addListener(lambda key, value: changes.append((key, value)))
+    conf.saveDelay = 10.
+    conf.set('deviceArea', '2')
+    conf.set('deviceArea', '0.25')
+    assert changes == [('deviceArea', 2.), ('deviceArea', 0.25)]
+    assert "deviceArea = 1" in open(conf.configFile).read()
+    conf.flush()
+    assert "deviceArea = 0.25" in open(conf.configFile).read()
+    assert not os.path.exists(conf.configFile+".tmp")
@@ -0,0 +1,157 @@
+'''
+Tests of dataIO.py: numeric buffers, streaming of tracking data,
+typed performance data, csv and npz files and background saving
+'''
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from SpecAnalyzer.specanalyzer.dataIO import *
+
+def perfData(timeStep = 0.):
+    return makePerfData(timeStep, 0.8, 20., 0.6, 9., 0.56, 9.)
+
+def partialFile(folder, numRows = 3):
+    writer = TrackingWriter("dev_tracking", str(folder))
+    for i in range(numRows):
+        writer.append(perfData(i)[0])
+    writer.close()
+    return writer.filename
+
+def test_growable_array():
+    array = GrowableArray(columns = 2, capacity = 2)
+    for i in range(5):
+        array.append([i, 2*i])
+    assert len(array) == 5
+    assert array.buffer.shape[0] == 8
+    assert np.array_equal(array.data[:, 1], 2*np.arange(5))
+
+def test_tracking_writer(tmp_path):
+    filename = partialFile(tmp_path)
+    assert filename.endswith(".csv.partial")
+    lines = open(filename).read().splitlines()
+    assert lines[0].split(",") == perfDataColumns
+    assert len(lines) == 4
+    # the file is kept on close: removed by the consumer once data is saved
+    assert os.path.exists(filename)
+
+def test_remove_partial_file(tmp_path):
+    filename = partialFile(tmp_path)
+    removePartialFile(filename)
+    assert not os.path.exists(filename)
+    removePartialFile(filename)
+    removePartialFile(None)
+
+def test_growable_array_records():
+    array = GrowableArray(perfDataDtype, capacity = 1)
+    for i in range(3):
+        array.append(perfData(i)[0])
+    assert array.data.dtype == perfDataDtype
+    assert np.array_equal(array.data['Time step'], np.arange(3))
+
+# Typed records are saved with the csv date and time columns
+def test_perf_data_dataframe():
+    data = np.concatenate([perfData(i) for i in range(3)])
+    df = makeDFPerfData(data)
+    assert list(df.columns) == perfDataColumns
+    assert df['Voc'].tolist() == [0.8]*3
+    restored = makePerfDataFromDF(df)
+    assert restored.dtype == perfDataDtype
+    assert np.array_equal(restored['Time step'], data['Time step'])
+    assert np.all(restored['timestamp'] == data['timestamp'].astype('datetime64[s]'))
+
+# Devices saved in an archive are read back with their types
+def test_archive(tmp_path):
+    JV = np.column_stack((np.linspace(0., 1., 11), np.linspace(20., -5., 11)))
+    data = np.concatenate([perfData(i) for i in range(3)])
+    results = [DeviceResult("dev"+str(i), data[:i+1], JV, {'Device Area' : 0.1*(i+1),
+            'Comments' : 'test'}) for i in range(2)]
+    filename = str(tmp_path / "session.npz")
+    writeArchive(filename, results)
+    with DataArchive(filename) as archive:
+        assert archive.deviceIDs() == ["dev0", "dev1"]
+        device = archive[1]
+        assert device.perfData.dtype == perfDataDtype
+        assert np.array_equal(device.perfData, data[:2])
+        assert np.array_equal(device.JV, JV)
+        assert device.acqParams['Device Area'] == 0.2
+    loaded = readDataFile(filename)
+    assert [d[0] for d in loaded] == ["dev0", "dev1"]
+    assert loaded[0][3].at[0, 'Comments'] == 'test'
+
+# Arrays of an archive are read only when accessed, one device at a time
+def test_archive_on_demand(tmp_path):
+    JV = np.column_stack((np.linspace(0., 1., 11), np.linspace(20., -5., 11)))
+    filename = str(tmp_path / "session.npz")
+    writeArchive(filename, [DeviceResult("dev"+str(i), perfData(i), JV, {}) for i in range(3)])
+    with DataArchive(filename) as archive:
+        read = []
+        npz = archive.file
+        class Recorder():
+            def __getitem__(self, key):
+                read.append(key)
+                return npz[key]
+        archive.file = Recorder()
+        assert archive.deviceIDs() == ["dev0", "dev1", "dev2"]
+        assert read == []
+        assert archive.perfData(2)['Time step'][0] == 2.
+        assert read == ['perfData2']
+        assert archive[1].deviceID == "dev1"
+        assert read == ['perfData2', 'perfData1', 'JV1']
+        with pytest.raises(IndexError):
+            archive.JV(3)
+        archive.file = npz
+
+# A device saved as csv is read back with its types
+def test_csv(tmp_path):
+    JV = np.column_stack((np.linspace(0., 1., 11), np.linspace(20., -5., 11)))
+    data = np.concatenate([perfData(i) for i in range(3)])
+    filename = saveCsv("dev", pd.DataFrame([{'Device Area' : 0.1, 'Comments' : 'test'}]),
+            data, JV, str(tmp_path))
+    deviceID, perfDataCsv, JVCsv, dfAcqParams = readDataFile(filename)[0]
+    assert deviceID == "dev"
+    assert np.allclose(perfDataCsv['Voc'], data['Voc'])
+    assert np.allclose(JVCsv, JV)
+    assert dfAcqParams.at[0, 'Device Area'] == 0.1
+
+# Queued data is saved in the writer thread
+def test_save_queue(tmp_path):
+    queue = SaveQueue(retries = 0)
+    for i in range(3):
+        queue.put("dev"+str(i), pd.DataFrame({'Comments' : ['']}), perfData(i),
+                np.zeros((2,2)), str(tmp_path), 'npz')
+    queue.flush()
+    assert queue.pending() == 0
+    queue.close()
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".npz")]) == 3
+
+# Saving is retried, then given up without stopping the writer thread
+def test_save_queue_failure(tmp_path):
+    queue = SaveQueue(retries = 1, retryDelay = 0.01)
+    queue.put("dev", pd.DataFrame({'Comments' : ['']}), perfData(),
+            np.zeros((2,2)), str(tmp_path / "missing"), 'csv')
+    queue.put("dev", pd.DataFrame({'Comments' : ['']}), perfData(),
+            np.zeros((2,2)), str(tmp_path), 'csv')
+    queue.flush()
+    queue.close()
+    assert len(os.listdir(tmp_path)) == 1
+
+# The partial file is removed once the data is saved, kept otherwise
+def test_save_queue_removes_partial_file(tmp_path):
+    filename = partialFile(tmp_path)
+    queue = SaveQueue(retries = 0)
+    queue.put("dev_tracking", pd.DataFrame({'Comments' : ['']}), perfData(),
+            np.zeros((2,2)), str(tmp_path), 'csv', filename)
+    queue.flush()
+    queue.close()
+    assert not os.path.exists(filename)
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".csv")]) == 1
+
+def test_save_queue_keeps_partial_file_on_failure(tmp_path):
+    filename = partialFile(tmp_path)
+    queue = SaveQueue(retries = 0)
+    queue.put("dev_tracking", pd.DataFrame({'Comments' : ['']}), perfData(),
+            np.zeros((2,2)), str(tmp_path / "missing"), 'csv', filename)
+    queue.flush()
+    queue.close()
+    assert os.path.exists(filename)
@@ -0,0 +1,129 @@
+'''
+Tests of the acquisition engine (engine.py) on the simulated sourcemeter
+'''
+import os
+import numpy as np
+import pytest
+from SpecAnalyzer.specanalyzer.engine import *
+from SpecAnalyzer.specanalyzer.dataIO import removePartialFile
+from SpecAnalyzer.specanalyzer.modules.sourcemeter.simulator import SimulatedSourcemeter
+
+def simulator(irradiance = 0.1):
+    sm = SimulatedSourcemeter(noise = 0., hysteresis = 0., latency = 0., timescale = 0.,
+            irradiance = irradiance)
+    sm.set_limit(voltage = 20., current = 1.)
+    sm.on()
+    return sm
+
+# powerIn: irradiance of the simulated device [W/cm2]
+def acqParameters(powerIn = 0.1, **values):
+    params = {'Acq Min Voltage' : -0.2, 'Acq Max Voltage' : 1., 'Acq Start Voltage' : 0.,
+            'Acq Step Voltage' : 0.01, 'Acq Gate Voltage' : 0., 'Acq Hold Time' : 0.,
+            'Acq Num Aver Scans' : 1, 'Delay Before Meas' : 0., 'Num Track Points' : 3,
+            'PV mode' : True, 'Voc Jsc from JV' : True, 'Track Interval' : 0.,
+            'Track MPPT' : 'Perturb and Observe', 'Track MPPT Step' : 0.01,
+            'Track Voc Jsc Every' : 10, 'Device Area' : 1., 'Comments' : ''}
+    params.update(values)
+    return makeAcqParameters(params, deviceID = "dev", enableTracking = True, powerIn = powerIn)
+
+def runEngine(params):
+    engine = AcquisitionEngine(params, simulator(params.powerIn), onMsg = lambda msg: None)
+    return engine, {r.deviceID : r for r in engine.results()}
+
+# Sweeps, JV and tracking results of the full sequence
+def test_results():
+    engine, results = runEngine(acqParameters())
+    assert engine.JVOKflag
+    assert sorted(results) == ['dev_JV-backward', 'dev_JV-forward', 'dev_sweep-back',
+            'dev_sweep-forw', 'dev_tracking']
+    sweep = results['dev_sweep-forw']
+    assert sweep.JV[0, 0] == pytest.approx(-0.2)
+    assert sweep.JV[-1, 0] == pytest.approx(1.)
+    assert np.all(np.diff(sweep.JV[:, 0]) > 0)
+    assert 0.5 < sweep.perfData[0]['Voc'] < 1.
+    tracking = results['dev_tracking']
+    assert tracking.saveData and tracking.setupTable
+    assert len(tracking.perfData) == 3
+
+# The JV for performance parameters stops at the measured Voc: measured
+# Voc and Jsc are used, consistent with the full sweep
+def test_jv_voc_jsc_measured():
+    engine, results = runEngine(acqParameters())
+    voc, jsc = engine.measure_voc_jsc()
+    perfData = results['dev_JV-forward'].perfData[0]
+    assert perfData['Voc'] == pytest.approx(voc)
+    assert perfData['Jsc'] == pytest.approx(jsc)
+    sweep = results['dev_sweep-forw'].perfData[0]
+    assert perfData['Voc'] == pytest.approx(sweep['Voc'], abs = 0.01)
+    assert 0. < perfData['FF'] < 1.
+
+# run() passes the results to the callbacks
+def test_run_callbacks():
+    jv, tracking = [], []
+    engine = AcquisitionEngine(acqParameters(), simulator(), onMsg = lambda msg: None,
+            onJVComplete = lambda *args: jv.append(args[2]),
+            onTracking = lambda *args: tracking.append(args[4]))
+    assert engine.run()
+    assert len(jv) == 4
+    assert tracking == [False, False, True]
+
+# Tracking samples are streamed to disk. The partial file is passed with
+# the final result and kept until removed
+def test_tracking_partial_file(tmp_path):
+    engine = AcquisitionEngine(acqParameters(), simulator(), onMsg = lambda msg: None,
+            streamFolder = str(tmp_path))
+    final = [r for r in engine.results() if r.deviceID == 'dev_tracking'][-1]
+    assert final.saveData is True
+    assert os.path.exists(final.partialFile)
+    assert len(open(final.partialFile).read().splitlines()) == 1 + len(final.perfData)
+    removePartialFile(final.partialFile)
+    assert os.listdir(tmp_path) == []
+
+# A cancelled acquisition stops with the output off
+def test_cancel():
+    sm = simulator()
+    token = CancelToken()
+    token.cancel()
+    engine = AcquisitionEngine(acqParameters(), sm, onMsg = lambda msg: None,
+            cancelToken = token)
+    assert not engine.run()
+    assert not sm.output
+
+# Cancelled during tracking: the samples streamed so far are kept on disk
+def test_cancel_tracking(tmp_path):
+    sm = simulator()
+    token = CancelToken()
+    engine = AcquisitionEngine(acqParameters(), sm, onMsg = lambda msg: None,
+            onTracking = lambda *args: token.cancel(), streamFolder = str(tmp_path),
+            cancelToken = token)
+    assert not engine.run()
+    assert not sm.output
+    partial = os.listdir(tmp_path)
+    assert len(partial) == 1
+    assert len(open(str(tmp_path / partial[0])).read().splitlines()) == 3
+
+# Start voltage outside [min, max], or min above max, stops the acquisition
+@pytest.mark.parametrize('values', [{'Acq Start Voltage' : 1.5},
+        {'Acq Start Voltage' : -0.5}, {'Acq Min Voltage' : 1.2}])
+def test_voltage_range(values):
+    engine = AcquisitionEngine(acqParameters(**values), simulator(), onMsg = lambda msg: None)
+    with pytest.raises(ValueError):
+        engine.run()
+
+# Current density (A/cm2, as read from the instruments) does not depend
+# on the device area
+@pytest.mark.parametrize('area', [0.1, 1., 4.])
+def test_simulator_device_area(area):
+    engine, results = runEngine(acqParameters(**{'Device Area' : area}))
+    perfData = results['dev_JV-forward'].perfData[0]
+    assert perfData['Jsc'] == pytest.approx(0.02, rel = 0.01)
+
+# The photocurrent follows the irradiance, the PCE is the output power
+# over the irradiance
+@pytest.mark.parametrize('powerIn', [0.05, 0.1, 0.2])
+def test_simulator_irradiance(powerIn):
+    engine, results = runEngine(acqParameters(powerIn))
+    perfData = results['dev_JV-forward'].perfData[0]
+    assert perfData['Jsc'] == pytest.approx(0.2*powerIn, rel = 0.01)
+    assert perfData['effic'] == pytest.approx(100*perfData['MPP']/powerIn)
+    assert 10. < perfData['effic'] < 20.